@@ -0,0 +1,31 @@
+"""add_order_listing_indexes
+
+Revision ID: 3f8a6d2c91b4
+Revises: c7d3a9e15f42
+Create Date: 2026-10-18 15:02:11.406173
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f8a6d2c91b4'
+down_revision: Union[str, None] = 'c7d3a9e15f42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 订单列表按 id 倒序做游标分页；订单项按订单关联
+    op.create_index('ix_orders_user_id_id', 'orders', ['user_id', 'id'], unique=False)
+    op.create_index('ix_orders_order_status_id', 'orders', ['order_status', 'id'], unique=False)
+    op.create_index('ix_order_items_order_id_id', 'order_items', ['order_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_order_items_order_id_id', table_name='order_items')
+    op.drop_index('ix_orders_order_status_id', table_name='orders')
+    op.drop_index('ix_orders_user_id_id', table_name='orders')
@@ -0,0 +1,45 @@
+"""add_cart_items_user_product_unique
+
+Revision ID: 4a9c2e7d5f10
+Revises: e2b7f5a0c813
+Create Date: 2026-10-18 19:26:47.218305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4a9c2e7d5f10'
+down_revision: Union[str, None] = 'e2b7f5a0c813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 并发加购可能留下同一商品的重复行：合并到 id 最小的一行（数量和总价相加），再删除其余行
+    op.execute("""
+        UPDATE cart_items c
+        SET quantity = d.quantity, price = d.price
+        FROM (
+            SELECT min(id) AS id, sum(quantity) AS quantity, sum(price) AS price
+            FROM cart_items
+            GROUP BY user_id, product_id
+            HAVING count(*) > 1
+        ) d
+        WHERE c.id = d.id
+    """)
+    op.execute("""
+        DELETE FROM cart_items c
+        USING cart_items k
+        WHERE c.user_id = k.user_id
+          AND c.product_id = k.product_id
+          AND c.id > k.id
+    """)
+    op.create_index('uq_cart_items_user_id_product_id', 'cart_items', ['user_id', 'product_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('uq_cart_items_user_id_product_id', table_name='cart_items')
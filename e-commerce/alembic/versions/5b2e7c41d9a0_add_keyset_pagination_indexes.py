@@ -0,0 +1,31 @@
+"""add_keyset_pagination_indexes
+
+Revision ID: 5b2e7c41d9a0
+Revises: a37abed7f4a8
+Create Date: 2026-10-18 09:12:40.118522
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2e7c41d9a0'
+down_revision: Union[str, None] = 'a37abed7f4a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 游标分页：(排序键, id) 复合索引
+    op.create_index('ix_products_created_at_id', 'products', ['created_at', 'id'], unique=False)
+    op.create_index('ix_products_price_id', 'products', ['price', 'id'], unique=False)
+    op.create_index('ix_wishlist_user_id_product_id', 'wishlist', ['user_id', 'product_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_wishlist_user_id_product_id', table_name='wishlist')
+    op.drop_index('ix_products_price_id', table_name='products')
+    op.drop_index('ix_products_created_at_id', table_name='products')
@@ -0,0 +1,32 @@
+"""add_knowledge_base_sync_columns
+
+Revision ID: 7b3e9d1f4c28
+Revises: 4a9c2e7d5f10
+Create Date: 2026-10-18 21:08:35.590412
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b3e9d1f4c28'
+down_revision: Union[str, None] = '4a9c2e7d5f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 知识库增量同步按 updated_at 提取变化的商品和评论；已有评论以创建时间作为更新时间
+    op.add_column('reviews', sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False))
+    op.execute("UPDATE reviews SET updated_at = created_at")
+    op.create_index('ix_reviews_updated_at', 'reviews', ['updated_at'], unique=False)
+    op.create_index('ix_products_updated_at', 'products', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_updated_at', table_name='products')
+    op.drop_index('ix_reviews_updated_at', table_name='reviews')
+    op.drop_column('reviews', 'updated_at')
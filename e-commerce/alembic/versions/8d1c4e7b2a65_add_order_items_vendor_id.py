@@ -0,0 +1,40 @@
+"""add_order_items_vendor_id
+
+Revision ID: 8d1c4e7b2a65
+Revises: 3f8a6d2c91b4
+Create Date: 2026-10-18 15:37:48.251930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d1c4e7b2a65'
+down_revision: Union[str, None] = '3f8a6d2c91b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('order_items', sa.Column('vendor_id', sa.Integer(), nullable=True))
+    # 从商品回填商家ID
+    op.execute("""
+        UPDATE order_items
+        SET vendor_id = products.vendor_id
+        FROM products
+        WHERE products.id = order_items.product_id
+    """)
+    op.alter_column('order_items', 'vendor_id', nullable=False)
+    op.create_foreign_key('order_items_vendor_id_fkey', 'order_items', 'users', ['vendor_id'], ['id'])
+    # 商家订单：(商家, 订单) 定位，INCLUDE 订单项字段，查询只需扫描索引
+    op.create_index('ix_order_items_vendor_id_order_id', 'order_items', ['vendor_id', 'order_id'], unique=False,
+                    postgresql_include=['id', 'product_id', 'quantity', 'price'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_order_items_vendor_id_order_id', table_name='order_items')
+    op.drop_constraint('order_items_vendor_id_fkey', 'order_items', type_='foreignkey')
+    op.drop_column('order_items', 'vendor_id')
@@ -0,0 +1,37 @@
+"""add_outbox_dead_letter
+
+Revision ID: 9d4f1b6e2a57
+Revises: 7b3e9d1f4c28
+Create Date: 2026-10-18 23:14:02.118530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4f1b6e2a57'
+down_revision: Union[str, None] = '7b3e9d1f4c28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 达到最大投递次数的事件标记为死信，移出待投递索引；
+    # 已经卡在索引中的事件会再被领取一次，失败后标记为死信
+    op.add_column('outbox', sa.Column('dead_at', sa.TIMESTAMP(), nullable=True))
+    op.drop_index('ix_outbox_pending', table_name='outbox')
+    op.create_index('ix_outbox_pending', 'outbox', ['available_at', 'id'], unique=False,
+                    postgresql_where=sa.text('dispatched_at IS NULL AND dead_at IS NULL'))
+    op.create_index('ix_outbox_dead', 'outbox', ['dead_at'], unique=False,
+                    postgresql_where=sa.text('dead_at IS NOT NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_outbox_dead', table_name='outbox')
+    op.drop_index('ix_outbox_pending', table_name='outbox')
+    op.create_index('ix_outbox_pending', 'outbox', ['available_at', 'id'], unique=False,
+                    postgresql_where=sa.text('dispatched_at IS NULL'))
+    op.drop_column('outbox', 'dead_at')
@@ -0,0 +1,55 @@
+"""add_deleted_documents
+
+Revision ID: b6e2d8a41c93
+Revises: 9d4f1b6e2a57
+Create Date: 2026-10-19 10:26:47.302915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e2d8a41c93'
+down_revision: Union[str, None] = '9d4f1b6e2a57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 删除商品或主评论时由触发器记录（包括级联删除），知识库增量同步据此删除对应的向量
+    op.create_table(
+        'deleted_documents',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('doc_type', sa.String(length=20), nullable=False),
+        sa.Column('doc_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_deleted_documents_deleted_at', 'deleted_documents', ['deleted_at'], unique=False)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION record_deleted_document() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO deleted_documents (doc_type, doc_id) VALUES (TG_ARGV[0], OLD.id);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_products_deleted_document AFTER DELETE ON products
+        FOR EACH ROW EXECUTE FUNCTION record_deleted_document('product')
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_reviews_deleted_document AFTER DELETE ON reviews
+        FOR EACH ROW WHEN (OLD.parent_review_id IS NULL) EXECUTE FUNCTION record_deleted_document('review')
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_reviews_deleted_document ON reviews")
+    op.execute("DROP TRIGGER IF EXISTS trg_products_deleted_document ON products")
+    op.execute("DROP FUNCTION IF EXISTS record_deleted_document()")
+    op.drop_index('ix_deleted_documents_deleted_at', table_name='deleted_documents')
+    op.drop_table('deleted_documents')
@@ -0,0 +1,51 @@
+"""add_product_stats
+
+Revision ID: c7d3a9e15f42
+Revises: 9e4f1a6c2b37
+Create Date: 2026-10-18 14:26:51.307114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d3a9e15f42'
+down_revision: Union[str, None] = '9e4f1a6c2b37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+STAR_COLUMNS = [f"stars_{star}" for star in range(6)]
+
+
+def upgrade() -> None:
+    op.create_table(
+        'product_stats',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('positive_count', sa.Integer(), server_default='0', nullable=False),
+        *[sa.Column(column, sa.Integer(), server_default='0', nullable=False) for column in STAR_COLUMNS],
+        sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('product_id')
+    )
+    # 用现有主评论回填（追评沿用主评论评分，不计入）
+    op.execute(f"""
+        INSERT INTO product_stats (product_id, rating_sum, rating_count, positive_count, {", ".join(STAR_COLUMNS)})
+        SELECT product_id,
+               sum(rating),
+               count(*),
+               count(*) FILTER (WHERE rating >= 4),
+               {", ".join(f"count(*) FILTER (WHERE rating = {star})" for star in range(6))}
+        FROM reviews
+        WHERE parent_review_id IS NULL
+        GROUP BY product_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('product_stats')
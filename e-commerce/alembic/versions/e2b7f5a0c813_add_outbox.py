@@ -0,0 +1,44 @@
+"""add_outbox
+
+Revision ID: e2b7f5a0c813
+Revises: 8d1c4e7b2a65
+Create Date: 2026-10-18 16:08:23.574102
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b7f5a0c813'
+down_revision: Union[str, None] = '8d1c4e7b2a65'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'outbox',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('event_type', sa.String(length=100), nullable=False),
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('idempotency_key', sa.String(length=200), nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('available_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('dispatched_at', sa.TIMESTAMP(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('idempotency_key')
+    )
+    # 只索引未投递的事件
+    op.create_index('ix_outbox_pending', 'outbox', ['available_at', 'id'], unique=False,
+                    postgresql_where=sa.text('dispatched_at IS NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_outbox_pending', table_name='outbox', postgresql_where=sa.text('dispatched_at IS NULL'))
+    op.drop_table('outbox')
@@ -10,6 +10,7 @@ from typing import Dict, List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.config.settings import settings
 from app.services.vector_store_service import VectorStoreService
+from app.services.rag_resources import get_vector_store
 from app.services.product_service import ProductService
 from app.services.cart_item_service import CartService
 from app.services.review_service import ReviewService
@@ -27,7 +28,7 @@ class ProductAgent:
         """初始化Agent"""
         self.llm = None
         self.agent_executor = None
-        self.vector_store = VectorStoreService()
+        self.vector_store = get_vector_store()
         self._initialize_llm()
         self._initialize_agent()
     
@@ -9,6 +9,7 @@ from sqlalchemy.future import select
 # 可选导入，如果依赖未安装则提供友好错误
 try:
     from app.services.vector_store_service import VectorStoreService
+    from app.services.rag_resources import get_vector_store
     VECTOR_STORE_AVAILABLE = True
 except ImportError:
     VECTOR_STORE_AVAILABLE = False
@@ -19,8 +20,11 @@ from app.services.cart_item_service import CartService
 from app.services.review_service import ReviewService
 from app.models.product import Product
 from app.models.review import Review
+from app.models.product_stats import ProductStats
+from app.services.product_stats_service import ProductStatsService
 from app.models.user import User
-from app.schemas.cart_item import CartItemCreate
+from app.schemas.cart_item import CartBatchRequest, CartBatchLine
+from app.schemas.product import ProductSnapshot
 import json
 import httpx
 
@@ -40,14 +44,19 @@ class RAGAgent:
     使用向量检索 + Deepseek API实现智能商品推荐
     """
     
-    def __init__(self):
-        """初始化Agent"""
+    def __init__(self, vector_store: Optional["VectorStoreService"] = None):
+        """
+        初始化Agent
+
+        Args:
+            vector_store: 向量数据库服务，默认使用进程内共享的实例
+        """
         if not VECTOR_STORE_AVAILABLE:
             raise ImportError(
                 "VectorStoreService is not available. Please install dependencies: "
                 "pip install chromadb sentence-transformers"
             )
-        self.vector_store = VectorStoreService()
+        self.vector_store = vector_store or get_vector_store()
         self.api_key = DEEPSEEK_API_KEY
         self.api_base = DEEPSEEK_API_BASE
     
@@ -69,27 +78,26 @@ class RAGAgent:
             Dict: 包含回复和推荐商品
         """
         # 1. 使用向量搜索查找相关商品
-        search_results = self.vector_store.search(user_query, n_results=10)
+        #    查询编码由批量推理执行器完成，检索在线程中执行，不阻塞事件循环
+        search_results = await self.vector_store.asearch(user_query, n_results=10)
         
         # 2. 获取商品详细信息
         product_ids = [int(r["metadata"].get("product_id", r["id"])) for r in search_results if r["metadata"].get("type") == "product"]
         
+        # 只处理前5个：商品走实体缓存批量读取，评分直接读 product_stats 聚合
+        product_ids = product_ids[:5]
+        products = await ProductService.get_products_by_ids(db, product_ids)
+        stats_by_product = await ProductStatsService.get_stats(db, products)
+
         products_info = []
-        for product_id in product_ids[:5]:  # 只处理前5个
-            product_query = await db.execute(
-                select(Product).where(Product.id == product_id)
-            )
-            product = product_query.scalars().first()
+        for product_id in product_ids:
+            product = products.get(product_id)
             
             if product:
-                # 获取评论
-                reviews_query = await db.execute(
-                    select(Review).where(Review.product_id == product_id)
-                )
-                reviews = reviews_query.scalars().all()
+                stats = stats_by_product.get(product_id)
                 
                 # 计算性价比
-                value_score = self._calculate_value_score(product, reviews)
+                value_score = self._calculate_value_score(product, stats)
                 
                 products_info.append({
                     "id": product.id,
@@ -97,8 +105,8 @@ class RAGAgent:
                     "description": product.description,
                     "price": product.price,
                     "stock": product.stock,
-                    "rating": sum(r.rating for r in reviews) / len(reviews) if reviews else 0,
-                    "review_count": len(reviews),
+                    "rating": stats.average_rating if stats else 0,
+                    "review_count": stats.rating_count if stats else 0,
                     "value_score": value_score
                 })
         
@@ -114,31 +122,31 @@ class RAGAgent:
             "total_found": len(products_info)
         }
     
-    def _calculate_value_score(self, product: Product, reviews: List[Review]) -> float:
+    def _calculate_value_score(self, product: ProductSnapshot, stats: Optional[ProductStats]) -> float:
         """
         计算性价比分数
         
         Args:
             product: 商品对象
-            reviews: 评论列表
+            stats: 商品评分聚合（没有评论时为None）
         
         Returns:
             float: 性价比分数（0-1）
         """
-        if not reviews:
+        if not stats or not stats.rating_count:
             return 0.0
         
         # 平均评分（归一化到0-1）
-        avg_rating = sum(r.rating for r in reviews) / len(reviews) / 5.0
+        avg_rating = stats.average_rating / 5.0
         
         # 价格优势（价格越低分数越高，假设1000元为基准）
         price_score = min(1000 / max(product.price, 1), 1.0)
         
         # 评论数量（归一化，假设50条评论为满分）
-        review_count_score = min(len(reviews) / 50.0, 1.0)
+        review_count_score = min(stats.rating_count / 50.0, 1.0)
         
         # 好评率（4星以上）
-        positive_rate = sum(1 for r in reviews if r.rating >= 4) / len(reviews)
+        positive_rate = stats.positive_rate
         
         # 综合分数
         value_score = (
@@ -239,12 +247,9 @@ class RAGAgent:
             Dict: 操作结果
         """
         try:
-            cart_item_data = CartItemCreate(
-                product_id=product_id,
-                quantity=quantity
-            )
-            
-            result = await CartService.create_cart_item(cart_item_data, db, user)
+            batch = CartBatchRequest(items=[CartBatchLine(product_id=product_id, quantity=quantity)])
+            cart = await CartService.update_cart_batch(batch, db, user)
+            result = next(item for item in cart if item.product_id == product_id)
             
             return {
                 "success": True,
@@ -5,6 +5,7 @@ Agent工具定义
 from typing import List, Dict, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.services.vector_store_service import VectorStoreService
+from app.services.rag_resources import get_vector_store
 from app.services.product_service import ProductService
 from app.services.cart_item_service import CartService
 from app.schemas.cart_item import CartItemCreate
@@ -18,7 +19,7 @@ def init_vector_store():
     """初始化向量存储服务"""
     global vector_store
     if vector_store is None:
-        vector_store = VectorStoreService()
+        vector_store = get_vector_store()
     return vector_store
 
 
@@ -35,6 +36,7 @@ def search_products_by_semantic(query: str, n_results: int = 10) -> str:
     """
     try:
         store = init_vector_store()
+        # 查询向量先查缓存（见 VectorStoreService.search）
         results = store.search(query, n_results=n_results)
         
         # 格式化结果
@@ -23,6 +23,48 @@ class Settings(BaseSettings):
   # Celery配置
   CELERY_BROKER_URL: str = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
   CELERY_RESULT_BACKEND: str = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
+  # 进程内缓存（L1）配置
+  LOCAL_CACHE_MAX_BYTES: int = int(os.getenv("LOCAL_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+  LOCAL_CACHE_MAX_TTL: int = int(os.getenv("LOCAL_CACHE_MAX_TTL", 300))
+  # 缓存编码：json（优先使用orjson）/ msgpack；压缩：zlib / lz4 / none
+  CACHE_CODEC: str = os.getenv("CACHE_CODEC", "json")
+  CACHE_COMPRESSION: str = os.getenv("CACHE_COMPRESSION", "zlib")
+  CACHE_COMPRESS_MIN_BYTES: int = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", 4096))
+  # 浏览量计数：同一IP的去重窗口、回写数据库的间隔（秒）
+  VIEW_COUNT_DEDUP_WINDOW: int = int(os.getenv("VIEW_COUNT_DEDUP_WINDOW", 1800))
+  VIEW_COUNT_FLUSH_INTERVAL: int = int(os.getenv("VIEW_COUNT_FLUSH_INTERVAL", 10))
+  # 订单支付超时（秒），超时未支付的订单由清理任务取消并归还库存
+  ORDER_PAYMENT_TIMEOUT: int = int(os.getenv("ORDER_PAYMENT_TIMEOUT", 1800))
+  # 超时订单清理间隔（秒）、每批订单数
+  ORDER_EXPIRY_SWEEP_INTERVAL: int = int(os.getenv("ORDER_EXPIRY_SWEEP_INTERVAL", 30))
+  ORDER_EXPIRY_BATCH_SIZE: int = int(os.getenv("ORDER_EXPIRY_BATCH_SIZE", 500))
+  # 秒杀商品库存对账间隔（秒）
+  INVENTORY_RECONCILE_INTERVAL: int = int(os.getenv("INVENTORY_RECONCILE_INTERVAL", 10))
+  # 发件箱分发：轮询间隔（秒）、每批事件数、最大投递次数（之后标记为死信）、
+  # 领取租约（秒，领取后这段时间内没有标记结果的事件会被重新领取）
+  OUTBOX_DISPATCH_INTERVAL: float = float(os.getenv("OUTBOX_DISPATCH_INTERVAL", 1))
+  OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", 100))
+  OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 10))
+  OUTBOX_LEASE_SECONDS: int = int(os.getenv("OUTBOX_LEASE_SECONDS", 60))
+  # 购物车存储：db（cart_items 表）或 redis（Redis哈希 + 定期回写 cart_items）
+  CART_BACKEND: str = os.getenv("CART_BACKEND", "db")
+  # Redis购物车的过期时间（秒，过期后从 cart_items 重新载入）、回写间隔（秒）
+  CART_TTL: int = int(os.getenv("CART_TTL", 30 * 24 * 3600))
+  CART_FLUSH_INTERVAL: float = float(os.getenv("CART_FLUSH_INTERVAL", 5))
+  # 幂等请求：结果保留时间（秒）、重复请求等待首个请求完成的最长时间（秒）
+  IDEMPOTENCY_TTL: int = int(os.getenv("IDEMPOTENCY_TTL", 86400))
+  IDEMPOTENCY_WAIT_TIMEOUT: float = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", 30))
+  # 启动时在后台预热RAG资源（Embedding模型、向量数据库）
+  RAG_WARMUP: bool = os.getenv("RAG_WARMUP", "false").lower() in ("1", "true", "yes")
+  # Embedding模型（查询向量缓存按模型名区分，换模型后不会读到旧模型的向量）
+  EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+  # 查询编码的微批处理：等待窗口（毫秒）、每批最多查询数
+  EMBEDDING_BATCH_WINDOW_MS: float = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", 5))
+  EMBEDDING_MAX_BATCH: int = int(os.getenv("EMBEDDING_MAX_BATCH", 32))
+  # 查询向量缓存：进程内缓存字节数上限、缓存时间（秒）、存储精度（float16 / float32）
+  EMBEDDING_CACHE_MAX_BYTES: int = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+  EMBEDDING_CACHE_TTL: int = int(os.getenv("EMBEDDING_CACHE_TTL", 7 * 24 * 3600))
+  EMBEDDING_CACHE_DTYPE: str = os.getenv("EMBEDDING_CACHE_DTYPE", "float16")
   # Deepseek API配置
   DEEPSEEK_API_KEY: str = os.getenv("DEEPSEEK_API_KEY", "")
   DEEPSEEK_API_BASE: str = os.getenv("DEEPSEEK_API_BASE", "https://api.deepseek.com/v1")
@@ -2,4 +2,6 @@ import redis.asyncio as aioredis
 from app.config.settings import settings
 
 
-redis_connection = aioredis.from_url(settings.REDIS_SESSION_URL, decode_responses=True)
\ No newline at end of file
+redis_connection = aioredis.from_url(settings.REDIS_SESSION_URL, decode_responses=True)
+# 缓存帧为二进制数据（见 app/utils/cache_codec.py），不能按字符串解码
+redis_binary_connection = aioredis.from_url(settings.REDIS_SESSION_URL, decode_responses=False)
@@ -1,4 +1,5 @@
 import logging
+from contextlib import asynccontextmanager
 from urllib.parse import urlparse
 from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
@@ -8,7 +9,9 @@ from app.config.settings import settings
 
 
 logger = logging.getLogger(__name__)
-engine = create_async_engine(settings.DATABASE_URL, echo=False, isolation_level="AUTOCOMMIT")
+# 使用 PostgreSQL 默认的 READ COMMITTED 事务，写操作需要显式提交：
+# commit() 之后再执行的写入处于新的隐式事务中，会话关闭时被回滚，附带的写入（如评分聚合）必须在提交之前执行
+engine = create_async_engine(settings.DATABASE_URL, echo=False)
 AsyncSessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 
 
@@ -20,6 +23,18 @@ async def get_db():
       await session.close()
 
 
+@asynccontextmanager
+async def transaction():
+  """
+  工作单元：一个会话、一个事务（BEGIN ... COMMIT）
+  修改在提交时统一 flush（同一张表的 INSERT 合并为批量语句），正常退出时提交，抛出异常时回滚；
+  需要局部回滚时在会话上使用 begin_nested()（SAVEPOINT）
+  """
+  async with AsyncSessionLocal() as session:
+    async with session.begin():
+      yield session
+
+
 async def initialize_db():
   url_parts = urlparse(settings.DATABASE_URL)
   db_name = url_parts.path.lstrip("/")
@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -7,6 +8,13 @@ from fastapi.responses import RedirectResponse
 
 from app.models.base import Base
 from app.database.session import engine, initialize_db
+from app.utils.cache import run_invalidation_listener
+from app.services.view_counter_service import run_view_count_flusher
+from app.services.inventory_ledger_service import run_inventory_reconciler
+from app.services.outbox_service import run_outbox_dispatcher
+from app.services.order_expiry_service import run_order_expiry_sweeper
+from app.services.redis_cart_service import run_cart_flusher
+from app.services.rag_resources import run_rag_warmup, shutdown as shutdown_rag_resources
 from app.routers.wishlists import router as wishlists_router
 from app.routers import categories
 # from app.middleware.rate_limitter import AdvancedMiddleware  # 速率限制已禁用
@@ -18,7 +26,29 @@ async def lifespan(app: FastAPI):
     await initialize_db()
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    # 订阅缓存失效消息，同步各worker的进程内缓存
+    invalidation_listener = asyncio.create_task(run_invalidation_listener())
+    # 定期把Redis中累计的浏览量批量写回数据库
+    view_count_flusher = asyncio.create_task(run_view_count_flusher())
+    # 处理到期的秒杀库存预留，并把Redis中的库存写回数据库
+    inventory_reconciler = asyncio.create_task(run_inventory_reconciler())
+    # 把发件箱中的事件（订单、支付邮件）投递到Celery
+    outbox_dispatcher = asyncio.create_task(run_outbox_dispatcher())
+    # 取消超时未支付的订单并归还库存
+    order_expiry_sweeper = asyncio.create_task(run_order_expiry_sweeper())
+    # 把Redis购物车的修改回写到 cart_items
+    cart_flusher = asyncio.create_task(run_cart_flusher())
+    # 预热RAG资源（RAG_WARMUP=true 时），第一个对话请求不再等待模型加载
+    rag_warmup = asyncio.create_task(run_rag_warmup())
     yield
+    invalidation_listener.cancel()
+    view_count_flusher.cancel()
+    inventory_reconciler.cancel()
+    outbox_dispatcher.cancel()
+    order_expiry_sweeper.cancel()
+    cart_flusher.cancel()
+    rag_warmup.cancel()
+    shutdown_rag_resources()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -8,6 +8,9 @@ from app.models.wishlist import Wishlist
 from app.models.cart_item import CartItem
 from app.models.order_item import OrderItem
 from app.models.category import Category
+from app.models.product_stats import ProductStats
+from app.models.outbox_event import OutboxEvent
+from app.models.deleted_document import DeletedDocument
 
 
 __all__ = [
@@ -20,5 +23,8 @@ __all__ = [
     'Payment',
     'Wishlist',
     'Category',
+    'ProductStats',
+    'OutboxEvent',
+    'DeletedDocument',
     'Base'
 ]
\ No newline at end of file
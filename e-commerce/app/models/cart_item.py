@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, Float
+from sqlalchemy import Column, Integer, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 from app.models.base import Base
 
@@ -12,5 +12,10 @@ class CartItem(Base):
   product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
   quantity = Column(Integer, nullable=False, default=1)
 
+  __table_args__ = (
+    # 每个用户的每件商品只有一行，批量加购用 ON CONFLICT (user_id, product_id) 合并
+    Index("uq_cart_items_user_id_product_id", "user_id", "product_id", unique=True),
+  )
+
   user = relationship("User", back_populates="cart_items")
   product = relationship("Product", back_populates="cart_items")
\ No newline at end of file
@@ -0,0 +1,38 @@
+from sqlalchemy import Column, BigInteger, Integer, String, TIMESTAMP, Index, DDL, event
+from sqlalchemy.sql import func
+from app.models.base import Base
+
+
+class DeletedDocument(Base):
+  """
+  知识库文档的删除记录：删除商品或主评论时由触发器写入（包括级联删除），
+  增量同步只读取高水位之后的删除记录，不需要逐个核对向量库中的文档
+  """
+  __tablename__ = "deleted_documents"
+
+  id = Column(BigInteger, primary_key=True, autoincrement=True)
+  doc_type = Column(String(20), nullable=False)  # product / review
+  doc_id = Column(Integer, nullable=False)
+  deleted_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+
+  __table_args__ = (
+    Index("ix_deleted_documents_deleted_at", "deleted_at"),
+  )
+
+
+# 删除触发器：已有数据库由迁移创建，这里保证 create_all 新建的表同样具备
+DELETED_DOCUMENT_DDL = [
+  "CREATE OR REPLACE FUNCTION record_deleted_document() RETURNS trigger AS $$ "
+  "BEGIN INSERT INTO deleted_documents (doc_type, doc_id) VALUES (TG_ARGV[0], OLD.id); RETURN NULL; END "
+  "$$ LANGUAGE plpgsql",
+  "DROP TRIGGER IF EXISTS trg_products_deleted_document ON products",
+  "CREATE TRIGGER trg_products_deleted_document AFTER DELETE ON products "
+  "FOR EACH ROW EXECUTE FUNCTION record_deleted_document('product')",
+  "DROP TRIGGER IF EXISTS trg_reviews_deleted_document ON reviews",
+  "CREATE TRIGGER trg_reviews_deleted_document AFTER DELETE ON reviews "
+  "FOR EACH ROW WHEN (OLD.parent_review_id IS NULL) EXECUTE FUNCTION record_deleted_document('review')",
+]
+
+# 触发器依赖 products、reviews 两张表，在所有表创建之后执行
+for statement in DELETED_DOCUMENT_DDL:
+  event.listen(Base.metadata, "after_create", DDL(statement).execute_if(dialect="postgresql"))
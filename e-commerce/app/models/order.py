@@ -1,5 +1,5 @@
 import enum
-from sqlalchemy import Column, Integer, Float, ForeignKey, TIMESTAMP, Enum, String
+from sqlalchemy import Column, Integer, Float, ForeignKey, TIMESTAMP, Enum, String, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.models.base import Base
@@ -24,6 +24,12 @@ class Order(Base):
   created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
   updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False)
 
+  __table_args__ = (
+    # 订单列表按 id 倒序做游标分页：用户订单、按状态筛选
+    Index("ix_orders_user_id_id", "user_id", "id"),
+    Index("ix_orders_order_status_id", "order_status", "id"),
+  )
+
   user = relationship("User", back_populates="orders")
   order_items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
   payments = relationship("Payment", back_populates="order", cascade="all, delete-orphan")
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, Float
+from sqlalchemy import Column, Integer, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 from app.models.base import Base
 
@@ -11,6 +11,16 @@ class OrderItem(Base):
   product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
   quantity = Column(Integer, nullable=False)
   price = Column(Float, nullable=False)
+  # 下单时从商品复制的商家ID，商家查询订单时不再关联 products
+  vendor_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+  __table_args__ = (
+    # 按订单取订单项
+    Index("ix_order_items_order_id_id", "order_id", "id"),
+    # 商家订单：按 (商家, 订单) 定位，INCLUDE 订单项字段，查询只需扫描索引
+    Index("ix_order_items_vendor_id_order_id", "vendor_id", "order_id",
+          postgresql_include=["id", "product_id", "quantity", "price"]),
+  )
 
   order = relationship("Order", back_populates="order_items")
   product = relationship("Product", back_populates="order_items")
\ No newline at end of file
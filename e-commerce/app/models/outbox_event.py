@@ -0,0 +1,31 @@
+from sqlalchemy import Column, BigInteger, Integer, String, Text, TIMESTAMP, Index
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+from app.models.base import Base
+
+
+class OutboxEvent(Base):
+  """
+  事务外发件箱：副作用事件（邮件等）与业务数据在同一个事务中写入，
+  由 OutboxService 的分发任务异步投递到 Celery
+  """
+  __tablename__ = "outbox"
+
+  id = Column(BigInteger, primary_key=True, autoincrement=True)
+  event_type = Column(String(100), nullable=False)
+  payload = Column(JSONB, nullable=False)
+  # 投递时作为 Celery task_id，消费端据此去重
+  idempotency_key = Column(String(200), nullable=False, unique=True)
+  attempts = Column(Integer, nullable=False, default=0, server_default="0")
+  available_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)  # 重试退避：此时间之后才投递
+  dispatched_at = Column(TIMESTAMP, nullable=True)
+  dead_at = Column(TIMESTAMP, nullable=True)  # 达到最大投递次数，不再投递（死信）
+  last_error = Column(Text, nullable=True)
+  created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+
+  __table_args__ = (
+    # 只索引待投递的事件（未投递且不是死信），分发任务按 (available_at, id) 取批次
+    Index("ix_outbox_pending", "available_at", "id",
+          postgresql_where=(dispatched_at.is_(None) & dead_at.is_(None))),
+    Index("ix_outbox_dead", "dead_at", postgresql_where=dead_at.isnot(None)),
+  )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Text, TIMESTAMP, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Text, TIMESTAMP, Boolean, ForeignKey, Index, DDL, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.models.base import Base
@@ -20,10 +20,33 @@ class Product(Base):
   image_url = Column(String, nullable=True)
   view_count = Column(Integer, default=0)
 
+  __table_args__ = (
+    # 游标分页按 (排序键, id) 定位
+    Index("ix_products_created_at_id", "created_at", "id"),
+    Index("ix_products_price_id", "price", "id"),
+    # 知识库增量同步按 updated_at 提取变化的商品
+    Index("ix_products_updated_at", "updated_at"),
+  )
+
   # 与Category的关系
   category_obj = relationship("Category", back_populates="products")
   
   order_items = relationship("OrderItem", back_populates="product", cascade="all, delete-orphan")
   cart_items = relationship("CartItem", back_populates="product", cascade="all, delete-orphan")
   reviews = relationship("Review", back_populates="product", cascade="all, delete-orphan")
-  wishlist = relationship("Wishlist", back_populates="product", cascade="all, delete-orphan")
\ No newline at end of file
+  wishlist = relationship("Wishlist", back_populates="product", cascade="all, delete-orphan")
+
+
+# PostgreSQL 全文检索：search_vector 生成列 + GIN 索引，name/description 三元组索引
+# 已有数据库由迁移创建，这里保证 create_all 新建的表同样具备
+SEARCH_VECTOR_DDL = [
+  "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+  "ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector "
+  "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(description, ''))) STORED",
+  "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING gin (search_vector)",
+  "CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (name gin_trgm_ops)",
+  "CREATE INDEX IF NOT EXISTS ix_products_description_trgm ON products USING gin (description gin_trgm_ops)",
+]
+
+for statement in SEARCH_VECTOR_DDL:
+  event.listen(Product.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
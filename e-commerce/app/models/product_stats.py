@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, ForeignKey, TIMESTAMP
+from sqlalchemy.sql import func
+from app.models.base import Base
+
+
+class ProductStats(Base):
+  """
+  商品评分聚合（只统计主评论，追评沿用主评论评分不重复计数）
+  由 ReviewService 增量维护，可通过 ProductStatsService.rebuild 一条SQL重建
+  """
+  __tablename__ = "product_stats"
+
+  product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+  rating_sum = Column(Integer, nullable=False, default=0, server_default="0")
+  rating_count = Column(Integer, nullable=False, default=0, server_default="0")
+  positive_count = Column(Integer, nullable=False, default=0, server_default="0")  # 4星及以上
+  stars_0 = Column(Integer, nullable=False, default=0, server_default="0")  # 评分允许0星
+  stars_1 = Column(Integer, nullable=False, default=0, server_default="0")
+  stars_2 = Column(Integer, nullable=False, default=0, server_default="0")
+  stars_3 = Column(Integer, nullable=False, default=0, server_default="0")
+  stars_4 = Column(Integer, nullable=False, default=0, server_default="0")
+  stars_5 = Column(Integer, nullable=False, default=0, server_default="0")
+  updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+  @property
+  def average_rating(self) -> float:
+    return self.rating_sum / self.rating_count if self.rating_count else 0.0
+
+  @property
+  def positive_rate(self) -> float:
+    return self.positive_count / self.rating_count if self.rating_count else 0.0
+
+  @property
+  def histogram(self) -> dict:
+    return {0: self.stars_0, 1: self.stars_1, 2: self.stars_2, 3: self.stars_3, 4: self.stars_4, 5: self.stars_5}
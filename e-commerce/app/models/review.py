@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, Text, TIMESTAMP, CheckConstraint
+from sqlalchemy import Column, Integer, ForeignKey, Text, TIMESTAMP, CheckConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.models.base import Base
@@ -16,9 +16,12 @@ class Review(Base):
   likes_count = Column(Integer, nullable=False, default=0)
   dislikes_count = Column(Integer, nullable=False, default=0)
   created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+  updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False)
 
   __table_args__ = (
     CheckConstraint('likes_count >= 0'),
+    # 知识库增量同步按 updated_at 提取变化的评论
+    Index("ix_reviews_updated_at", "updated_at"),
   )
 
   user = relationship("User", back_populates="reviews")
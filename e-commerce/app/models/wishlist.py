@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, Text, TIMESTAMP
+from sqlalchemy import Column, Integer, ForeignKey, Text, TIMESTAMP, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.models.base import Base
@@ -13,5 +13,9 @@ class Wishlist(Base):
   description = Column(Text, nullable=True)
   created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
 
+  __table_args__ = (
+    Index("ix_wishlist_user_id_product_id", "user_id", "product_id"),
+  )
+
   user = relationship("User", back_populates="wishlist")
   product = relationship("Product", back_populates="wishlist")
\ No newline at end of file
@@ -170,4 +170,26 @@ for_analytics = {**default_responses,
       }
     }
   }
-}
\ No newline at end of file
+}
+
+for_cache_stats = {**default_responses,
+  status.HTTP_200_OK: {
+    "description": "Success",
+    "content": {
+      "application/json": {
+        "example": {
+          "namespaces": {
+            "products:list": {"l1_hits": 800, "l2_hits": 150, "misses": 50, "stale": 5, "refreshes": 50,
+                              "coalesced": 12, "l1_hit_ratio": 0.8, "l2_hit_ratio": 0.75, "hit_ratio": 0.95},
+            "search:products": {"l1_hits": 200, "l2_hits": 100, "misses": 100, "stale": 0, "refreshes": 100,
+                                "coalesced": 3, "l1_hit_ratio": 0.5, "l2_hit_ratio": 0.5, "hit_ratio": 0.75}
+          },
+          "local_cache": {"entries": 420, "bytes": 5242880, "max_bytes": 67108864, "evictions": 0},
+          "codec": {"codec": "json", "compression": "zlib", "compress_min_bytes": 4096},
+          "invalidations": 12,
+          "invalidations_by_tag": {"catalog": 8, "category:3": 4}
+        }
+      }
+    }
+  }
+}
@@ -17,6 +17,9 @@ for_create = {
       }
     }
   },
+  status.HTTP_304_NOT_MODIFIED: {
+    "description": "Not Modified (If-None-Match matches the current ETag)"
+  },
   status.HTTP_403_FORBIDDEN: {
     "description": "Forbidden",
     "content": {
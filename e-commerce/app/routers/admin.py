@@ -7,7 +7,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.database.session import get_db
 from app.models.user import User
 from app.responses.admin_responses import (for_user, for_order, for_sales,
-                                           for_review, for_analytics)
+                                           for_review, for_analytics, for_cache_stats)
 from app.schemas.user import UserCreate, UserResponse
 from app.services.admin_service import AdminService
 from app.utils.token import get_current_admin
@@ -63,6 +63,73 @@ async def get_analytics(
   except Exception as e:
     return JSONResponse(content={"message": str(e)}, status_code=status.HTTP_400_BAD_REQUEST)
 
+@router.get("/cache-stats", responses=for_cache_stats)
+async def get_cache_stats(
+        _: User = Depends(get_current_admin)):
+  try:
+    stats = await AdminService.get_cache_stats()
+    return stats
+  except HTTPException as exc:
+    return JSONResponse(content={"message": str(exc)}, status_code=exc.status_code)
+  except Exception as e:
+    return JSONResponse(content={"message": str(e)}, status_code=status.HTTP_400_BAD_REQUEST)
+
+@router.get("/outbox-stats")
+async def get_outbox_stats(
+        db: AsyncSession = Depends(get_db),
+        _: User = Depends(get_current_admin)):
+  try:
+    return await AdminService.get_outbox_stats(db)
+  except HTTPException as exc:
+    return JSONResponse(content={"message": str(exc)}, status_code=exc.status_code)
+  except Exception as e:
+    return JSONResponse(content={"message": str(e)}, status_code=status.HTTP_400_BAD_REQUEST)
+
+@router.post("/product-stats/rebuild")
+async def rebuild_product_stats(
+        db: AsyncSession = Depends(get_db),
+        _: User = Depends(get_current_admin)):
+  try:
+    return await AdminService.rebuild_product_stats(db)
+  except HTTPException as exc:
+    return JSONResponse(content={"message": str(exc)}, status_code=exc.status_code)
+  except Exception as e:
+    return JSONResponse(content={"message": str(e)}, status_code=status.HTTP_400_BAD_REQUEST)
+
+@router.post("/orders/expire")
+async def expire_pending_orders(
+        _: User = Depends(get_current_admin)):
+  try:
+    return await AdminService.expire_pending_orders()
+  except HTTPException as exc:
+    return JSONResponse(content={"message": str(exc)}, status_code=exc.status_code)
+  except Exception as e:
+    return JSONResponse(content={"message": str(e)}, status_code=status.HTTP_400_BAD_REQUEST)
+
+@router.post("/flash-sale/{product_id}")
+async def enable_flash_sale(
+        product_id: int,
+        db: AsyncSession = Depends(get_db),
+        _: User = Depends(get_current_admin)):
+  try:
+    return await AdminService.enable_flash_sale(db, product_id)
+  except HTTPException as exc:
+    return JSONResponse(content={"message": str(exc)}, status_code=exc.status_code)
+  except Exception as e:
+    return JSONResponse(content={"message": str(e)}, status_code=status.HTTP_400_BAD_REQUEST)
+
+@router.delete("/flash-sale/{product_id}")
+async def disable_flash_sale(
+        product_id: int,
+        db: AsyncSession = Depends(get_db),
+        _: User = Depends(get_current_admin)):
+  try:
+    return await AdminService.disable_flash_sale(db, product_id)
+  except HTTPException as exc:
+    return JSONResponse(content={"message": str(exc)}, status_code=exc.status_code)
+  except Exception as e:
+    return JSONResponse(content={"message": str(e)}, status_code=status.HTTP_400_BAD_REQUEST)
+
 @router.post("/users", response_model=UserResponse, responses=for_user)
 async def create_user(
         user_data: UserCreate,
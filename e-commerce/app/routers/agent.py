@@ -15,6 +15,7 @@ from app.models.user import User
 # 可选导入RAGAgent
 try:
     from app.agent.rag_agent import RAGAgent
+    from app.services.rag_resources import aget_vector_store
     RAG_AGENT_AVAILABLE = True
 except ImportError as e:
     RAG_AGENT_AVAILABLE = False
@@ -52,7 +53,8 @@ async def chat_with_agent(
         )
     
     try:
-        agent = RAGAgent()
+        # 共享进程内的Embedding模型和向量数据库，不再每个请求重新加载
+        agent = RAGAgent(await aget_vector_store())
         result = await agent.chat(
             user_query=request.query,
             user=current_user,
@@ -84,7 +86,8 @@ async def recommend_products(
         )
     
     try:
-        agent = RAGAgent()
+        # 共享进程内的Embedding模型和向量数据库，不再每个请求重新加载
+        agent = RAGAgent(await aget_vector_store())
         result = await agent.chat(
             user_query=query,
             user=current_user,
@@ -118,7 +121,8 @@ async def agent_add_to_cart(
         )
     
     try:
-        agent = RAGAgent()
+        # 共享进程内的Embedding模型和向量数据库，不再每个请求重新加载
+        agent = RAGAgent(await aget_vector_store())
         result = await agent.add_to_cart(
             product_id=request.product_id,
             quantity=request.quantity,
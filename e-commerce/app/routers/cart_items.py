@@ -7,7 +7,7 @@ from fastapi import APIRouter, HTTPException, status, Depends
 from app.database.session import get_db
 from app.utils.token import get_current_user
 from app.services.cart_item_service import CartService
-from app.schemas.cart_item import CartItemCreate, CartItemUpdate, CartItemResponse
+from app.schemas.cart_item import CartItemCreate, CartItemUpdate, CartItemResponse, CartBatchRequest
 from app.responses.cart_item_response import cart_item_post_response, delete_response
 
 
@@ -28,6 +28,22 @@ async def create_cart_item(
   except Exception as e:
     return JSONResponse(content={"message": str(e)}, status_code=status.HTTP_400_BAD_REQUEST)
 
+@router.post('/batch', response_model=List[CartItemResponse])
+async def update_cart_batch(
+  batch: CartBatchRequest,
+  db: AsyncSession = Depends(get_db),
+  current_user=Depends(get_current_user)):
+  """
+  批量加购/修改数量/删除（如"加购套餐"），返回更新后的整个购物车
+  """
+  try:
+    cart = await CartService.update_cart_batch(batch, db, current_user)
+    return cart
+  except HTTPException as exc:
+      return JSONResponse(content={"message": str(exc)}, status_code=exc.status_code)
+  except Exception as e:
+    return JSONResponse(content={"message": str(e)}, status_code=status.HTTP_400_BAD_REQUEST)
+
 @router.get('/', response_model=List[CartItemResponse])
 async def get_cart_items(
   db: AsyncSession=Depends(get_db),
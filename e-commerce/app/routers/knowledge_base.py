@@ -13,6 +13,7 @@ import asyncio
 # 可选导入
 try:
     from app.services.vector_store_service import VectorStoreService
+    from app.services.rag_resources import aget_vector_store, rag_status
     from init_knowledge_base import init_knowledge_base
     KNOWLEDGE_BASE_AVAILABLE = True
 except ImportError as e:
@@ -27,7 +28,7 @@ router = APIRouter(prefix="/knowledge-base", tags=["Knowledge Base"])
 @router.get("/status")
 async def get_knowledge_base_status():
     """
-    获取知识库状态
+    获取知识库状态（包括Embedding模型和向量数据库的就绪状态）
     """
     if not KNOWLEDGE_BASE_AVAILABLE:
         return JSONResponse(
@@ -39,12 +40,13 @@ async def get_knowledge_base_status():
         )
     
     try:
-        vector_store = VectorStoreService()
+        vector_store = await aget_vector_store()
         info = vector_store.get_collection_info()
         return {
             "status": "active",
             "collection_name": info["name"],
             "document_count": info["count"],
+            "resources": rag_status(),
             "message": "知识库运行正常" if info["status"] == "active" else f"知识库状态: {info['status']}"
         }
     except Exception as e:
@@ -88,7 +90,7 @@ async def update_knowledge_base(
         current_user=Depends(get_current_admin)):
     """
     增量更新知识库（仅管理员）
-    只添加新的商品和评论
+    只为上次同步后新增或内容变化的商品和评论生成向量，并删除已下架或已删除的文档
     """
     if not KNOWLEDGE_BASE_AVAILABLE:
         return JSONResponse(
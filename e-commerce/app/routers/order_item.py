@@ -1,9 +1,12 @@
+from typing import Optional
+
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
 
 from app.database.session import get_db
 from app.utils.token import get_current_user
+from app.utils.idempotency import idempotent, IDEMPOTENCY_HEADER
 from app.services.order_item_service import OrderItemService
 from app.responses.order_item_response import order_item_responses
 
@@ -12,11 +15,22 @@ router =  APIRouter(prefix="/order_items", tags=['Order items'])
 
 @router.post("/", responses=order_item_responses)
 async def create_order_item(
+        request: Request,
+        idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
         db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)):
+  """
+  下单接口
+  携带 Idempotency-Key 时，重试和重复点击返回首次下单的响应，不会重复下单
+  """
+  async def checkout():
+    try:
+      return await OrderItemService.create_order_item(db, current_user)
+    except HTTPException as exc:
+      return JSONResponse(content={"message": str(exc)}, status_code=exc.status_code)
+
   try:
-    new_order_item = await OrderItemService.create_order_item(db, current_user)
-    return new_order_item
+    return await idempotent(request, f"checkout:{current_user.id}", idempotency_key, checkout)
   except HTTPException as exc:
       return JSONResponse(content={"message": str(exc)}, status_code=exc.status_code)
   except Exception as e:
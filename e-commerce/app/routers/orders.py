@@ -1,9 +1,9 @@
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 
 from app.database.session import get_db
-from app.schemas.order import OrderResponse, ShipOrderRequest
+from app.schemas.order import OrderResponse, OrderFilter, ShipOrderRequest
 from app.utils.token import get_current_user, get_current_admin, get_current_vendor
 from app.services.order_service import OrderService
 from app.responses.order_responses import order_responses
@@ -56,10 +56,11 @@ async def confirm_receipt(
   
 @router.get("/")
 async def list_orders(
+        filters: OrderFilter = Query(...),
         db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)):
   try:
-    orders = await OrderService.list_orders(db, current_user)
+    orders = await OrderService.list_orders(db, current_user, filters)
     return orders
   except HTTPException as exc:
       return JSONResponse(content={"message": str(exc)}, status_code=exc.status_code)
@@ -69,10 +70,11 @@ async def list_orders(
 @router.get("/status/{order_status}")
 async def list_orders_by_status(
         order_status: str,
+        filters: OrderFilter = Query(...),
         current_user=Depends(get_current_user),
         db: AsyncSession = Depends(get_db)):
   try:
-    order_by_status = await OrderService.get_order_by_status(order_status, current_user, db)
+    order_by_status = await OrderService.get_order_by_status(order_status, current_user, db, filters)
     return order_by_status
   except HTTPException as exc:
       return JSONResponse(content={"message": str(exc)}, status_code=exc.status_code)
@@ -1,11 +1,14 @@
+from typing import Optional
+
 from sqlalchemy import select
 from starlette.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
 
 from app.models.payment import Payment
 from app.database.session import get_db
 from app.utils.token import get_current_user
+from app.utils.idempotency import idempotent, IDEMPOTENCY_HEADER
 from app.schemas.payment import PaymentCreate, PaymentStatus
 from app.services.payment_service import PaymentServiceMock
 from app.responses.payment_response import payment_post_response, stripe_webhook_response
@@ -16,28 +19,47 @@ router = APIRouter(prefix="/payments", tags=["Payments"])
 @router.post("/checkout", responses=payment_post_response)
 async def create_payment_session(
         request: PaymentCreate,
+        http_request: Request,
+        idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
         db: AsyncSession = Depends(get_db),
         current_user = Depends(get_current_user)):
-  """创建Mock支付会话"""
+  """创建Mock支付会话（支持 Idempotency-Key，重试时返回同一个支付会话）"""
+  async def checkout():
+    try:
+      return await PaymentServiceMock.create_checkout_session(request, db, current_user)
+    except HTTPException as exc:
+      return JSONResponse(content={"message": str(exc)}, status_code=exc.status_code)
+
   try:
-    checkout_session = await PaymentServiceMock.create_checkout_session(request, db, current_user)
-    return checkout_session
+    return await idempotent(http_request, f"payment:{current_user.id}", idempotency_key, checkout)
   except HTTPException as exc:
     return JSONResponse(content={"message": str(exc)}, status_code=exc.status_code)
   except Exception as e:
     return JSONResponse(content={"message": str(e)}, status_code=status.HTTP_400_BAD_REQUEST)
 
 @router.get("/mock-success")
-async def mock_payment_success(session_id: str, db: AsyncSession = Depends(get_db)):
-  """Mock支付成功 - 模拟支付完成"""
-  try:
-    payment = await PaymentServiceMock.mock_payment_success(session_id, db)
+async def mock_payment_success(
+        session_id: str,
+        request: Request,
+        idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
+        db: AsyncSession = Depends(get_db)):
+  """Mock支付成功 - 模拟支付完成（支持 Idempotency-Key，重复回调返回首次的结果）"""
+  async def complete():
+    try:
+      payment = await PaymentServiceMock.mock_payment_success(session_id, db)
+    except HTTPException as exc:
+      return JSONResponse(content={"message": str(exc)}, status_code=status.HTTP_400_BAD_REQUEST)
     return JSONResponse(content={
       "message": "Payment successful (Mock)", 
       "order_id": payment.order_id,
       "amount": payment.amount,
       "status": payment.status
     })
+
+  try:
+    return await idempotent(request, f"payment-success:{session_id}", idempotency_key, complete)
+  except HTTPException as exc:
+    return JSONResponse(content={"message": str(exc)}, status_code=exc.status_code)
   except Exception as e:
     return JSONResponse(content={"message": str(e)}, status_code=status.HTTP_400_BAD_REQUEST)
 
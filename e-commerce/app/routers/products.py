@@ -1,11 +1,15 @@
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import APIRouter, Depends, status, HTTPException, Request, Query
 
 from app.database.session import get_db
-from app.utils.token import get_current_user
+from app.utils.token import get_current_user, get_client_ip
 from app.services.product_service import ProductService
+from app.services.view_counter_service import ViewCounterService
 from app.utils.image_utils import generate_mock_image_url
+from app.utils.http_cache import make_etag, cache_headers, not_modified
+from app.utils.cache import is_versioned, cached_digest
+from app.utils.cache_codec import content_digest
 from app.responses.product_responses import for_create, for_get
 from app.schemas.product import ProductCreate, ProductFilter, ProductUpdate
 
@@ -14,14 +18,29 @@ router = APIRouter(prefix="/products", tags=['Products'])
 
 @router.get("/", responses=for_get)
 async def get_all_products(
+        request: Request,
         filters: ProductFilter = Query(...),
         db: AsyncSession = Depends(get_db)):
   try:
-    products = await ProductService.get_all_products(db, filters)
-    if not products:
-      return {"message": "Products not found"}
-    print(products)
-    return {"products": products}
+    # ETag = 带版本号的缓存键 + 缓存内容摘要：客户端缓存仍有效时直接返回304，只读取缓存帧头，不查询数据库
+    cache_key = await ProductService.get_products_cache_key(filters)
+    # 版本号读取失败（Redis不可用）时不使用ETag：数据变化后版本号不变，会把旧内容误判为未修改
+    versioned = is_versioned(cache_key)
+    if versioned:
+      digest = await cached_digest(cache_key)
+      if digest is not None:
+        cached = not_modified(request, make_etag(cache_key, digest))
+        if cached is not None:
+          return cached
+
+    # 缓存中保存的是编码好的JSON，直接拼接成响应体
+    products = await ProductService.get_all_products(db, filters, raw=True, cache_key=cache_key)
+    if not versioned:
+      return Response(content=b'{"products":' + products + b'}', media_type="application/json",
+                      headers={"Cache-Control": "no-store"})
+    etag = make_etag(cache_key, content_digest(products).hex())
+    return Response(content=b'{"products":' + products + b'}', media_type="application/json",
+                    headers=cache_headers(etag))
   except HTTPException as exc:
     return JSONResponse(content={"message": str(exc)}, status_code=exc.status_code)
   except Exception as e:
@@ -53,8 +72,8 @@ async def search_products(
   支持搜索商品名称和描述
   """
   try:
-    result = await ProductService.search_products(db, q, page, size)
-    return result
+    result = await ProductService.search_products(db, q, page, size, raw=True)
+    return Response(content=result, media_type="application/json")
   except HTTPException as exc:
     return JSONResponse(content={"message": str(exc)}, status_code=exc.status_code)
   except Exception as e:
@@ -66,7 +85,9 @@ async def get_product(
         product_id: int,
         db: AsyncSession = Depends(get_db)):
   try:
-    product = await ProductService.get_product_by_id(request, db, product_id)
+    product = await ProductService.get_product_snapshot(db, product_id)
+    # 浏览量只写Redis，由后台任务批量回写数据库
+    await ViewCounterService.record_view(product_id, get_client_ip(request))
     return product
   except HTTPException as exc:
     return JSONResponse(content={"message": str(exc)}, status_code=exc.status_code)
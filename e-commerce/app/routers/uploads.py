@@ -8,6 +8,8 @@ from app.database.session import get_db
 from app.utils.token import get_current_user
 from app.utils.file_upload import save_uploaded_file, delete_file
 from app.models.product import Product
+from app.services.product_service import ProductService
+from app.utils.cache import invalidate_tags, product_tags
 from app.models.user import User
 from app.schemas.user import Role
 
@@ -56,6 +58,8 @@ async def upload_product_image(
     product.image_url = image_url
     await db.commit()
     await db.refresh(product)
+    await invalidate_tags(*product_tags(product.category_id))
+    await ProductService.invalidate_products(product.id)
     
     return {
       "message": "Product image uploaded successfully",
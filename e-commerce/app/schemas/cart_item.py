@@ -1,3 +1,6 @@
+from enum import Enum
+from typing import List
+
 from fastapi import HTTPException, status
 from pydantic import BaseModel, ConfigDict, Field, field_validator
 
@@ -42,6 +45,36 @@ class CartItemUpdate(BaseModel):
   quantity: int = Field(..., gt=0)
 
 
+class CartBatchAction(str, Enum):
+  add = "add"        # 在购物车现有数量上累加
+  set = "set"        # 设置为指定数量
+  remove = "remove"  # 从购物车删除
+
+
+class CartBatchLine(BaseModel):
+  product_id: int = Field(..., gt=0)
+  quantity: int = Field(1, gt=0)
+  action: CartBatchAction = CartBatchAction.add
+
+
+class CartBatchRequest(BaseModel):
+  """
+  批量购物车操作：一次请求加购、修改数量或删除多件商品
+  """
+  items: List[CartBatchLine] = Field(..., min_length=1, max_length=100)
+
+  @field_validator("items")
+  @classmethod
+  def validate_unique_products(cls, items: List[CartBatchLine]) -> List[CartBatchLine]:
+    product_ids = [item.product_id for item in items]
+    if len(product_ids) != len(set(product_ids)):
+      raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Each product can appear only once in a batch."
+      )
+    return items
+
+
 class CartItemResponse(CartItemBase):
   id: int
   price: float
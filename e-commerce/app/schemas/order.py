@@ -53,6 +53,23 @@ class OrderResponse(OrderBase):
   tracking_number: Optional[str] = None  # 快递单号
   order_items: Optional[List[OrderItemResponse]] = None  # 订单项列表（包含商品信息）
 
+class OrderFilter(BaseModel):
+  """
+  订单列表的游标分页参数：按订单ID倒序（最新的订单在前）
+  """
+  size: int = 20
+  cursor: Optional[str] = None
+
+  @field_validator("size", mode="before")
+  @classmethod
+  def validate_size(cls, size: int) -> int:
+    if not 1 <= int(size) <= 100:
+      raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid pagination parameters. Size must be between 1 and 100."
+      )
+    return size
+
 class ShipOrderRequest(BaseModel):
   """商家发货时需要提供的快递单号"""
   tracking_number: str = Field(..., min_length=5, max_length=100,
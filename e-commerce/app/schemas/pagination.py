@@ -0,0 +1,47 @@
+from typing import Optional
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel, field_validator
+
+
+PAGINATION_MODES = ("offset", "cursor")
+KEYSET_SORT_KEYS = ("created_at", "price")
+TOTAL_MODES = ("exact", "cached", "estimated", "none")
+
+
+class CursorPagination(BaseModel):
+  """
+  游标分页（keyset）参数
+  pagination=cursor 时启用，按 (sort_by, id) 定位，不再使用 OFFSET
+  """
+  pagination: str = "offset"
+  cursor: Optional[str] = None
+  sort_by: str = "created_at"
+  total_mode: str = "none"  # 仅游标分页生效：exact / cached / estimated / none
+
+  @field_validator('pagination', mode='before')
+  @classmethod
+  def validate_pagination(cls, value: str) -> str:
+    if value not in PAGINATION_MODES:
+      raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"pagination must be one of {', '.join(PAGINATION_MODES)}.")
+    return value
+
+  @field_validator('sort_by', mode='before')
+  @classmethod
+  def validate_sort_by(cls, value: str) -> str:
+    if value not in KEYSET_SORT_KEYS:
+      raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"sort_by must be one of {', '.join(KEYSET_SORT_KEYS)}.")
+    return value
+
+  @field_validator('total_mode', mode='before')
+  @classmethod
+  def validate_total_mode(cls, value: str) -> str:
+    if value not in TOTAL_MODES:
+      raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"total_mode must be one of {', '.join(TOTAL_MODES)}.")
+    return value
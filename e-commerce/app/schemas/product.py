@@ -4,6 +4,8 @@ from typing import Optional
 from fastapi import HTTPException, status
 from pydantic import BaseModel, ConfigDict, Field, field_validator
 
+from app.schemas.pagination import CursorPagination
+
 class ProductBase(BaseModel):
   name: str = Field(..., max_length=100)
   description: Optional[str] = Field(None, max_length=500)
@@ -63,6 +65,26 @@ class ProductResponse(ProductBase):
 
   model_config = ConfigDict(from_attributes=True)
 
+class ProductSnapshot(BaseModel):
+  """
+  商品实体缓存中保存的只读快照（不做输入校验）
+  updated_at 作为版本戳：商品写操作会删除缓存，回源时重新生成
+  """
+  id: int
+  name: str
+  description: Optional[str] = None
+  price: float
+  stock: int
+  category_id: Optional[int] = None
+  vendor_id: int
+  is_active: bool
+  image_url: Optional[str] = None
+  view_count: Optional[int] = 0
+  created_at: datetime
+  updated_at: Optional[datetime] = None
+
+  model_config = ConfigDict(from_attributes=True)
+
 class ProductUpdate(BaseModel):
   name: Optional[str] = Field(None, max_length=100)
   description: Optional[str] = Field(None, max_length=500)
@@ -102,13 +124,24 @@ class ProductUpdate(BaseModel):
       raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Stock must be positive")
     return value
   
-class ProductFilter(BaseModel):
+class ProductFilter(CursorPagination):
   page: int = 1
   size: int = 10
   category_id: Optional[int] = None  # 使用分类ID
   min_price: Optional[float] = None
   max_price: Optional[float] = None
   availability: Optional[bool] = None
+  min_rating: Optional[float] = None  # 平均评分下限（基于 product_stats）
+
+  @field_validator('min_rating', mode="before")
+  @classmethod
+  def validate_min_rating(cls, value: Optional[float]) -> Optional[float]:
+    if value is not None and not 0 <= float(value) <= 5:
+      raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="min_rating must be between 0 and 5."
+        )
+    return value
 
   @field_validator('min_price', 'max_price', mode="before")
   @classmethod
@@ -4,6 +4,8 @@ from datetime import datetime
 from fastapi import HTTPException, status
 from pydantic import BaseModel,ConfigDict, Field, field_validator
 
+from app.schemas.pagination import CursorPagination
+
 class WishlistBase(BaseModel):
   id: Optional[int] = Field(default=None)
   description: Optional[str] = Field(max_length=500, default=None)
@@ -71,7 +73,7 @@ class WishlistUpdate(BaseModel):
     return value
 
 
-class WishlistFilter(BaseModel):
+class WishlistFilter(CursorPagination):
   page: int = 1
   size: int = 10
   min_price: Optional[float] = None
@@ -10,6 +10,11 @@ from app.utils.hashing import pwd_context
 from app.models.order_item import OrderItem
 from app.schemas.user import UserResponse, UserCreate
 from app.services.email_service import EmailService
+from app.utils.cache import RATINGS_TAG, cache_stats, invalidate_tags
+from app.services.product_stats_service import ProductStatsService
+from app.services.inventory_ledger_service import InventoryLedgerService
+from app.services.order_expiry_service import OrderExpiryService
+from app.services.outbox_service import OutboxService
 
 class AdminService:
   @staticmethod
@@ -114,3 +119,38 @@ class AdminService:
       'most_active_user': most_active_user,
       'most_viewed_product': most_viewed_product
     }
+
+  @staticmethod
+  async def get_cache_stats():
+    # 进程内计数，多worker部署时每个worker独立统计
+    return cache_stats.snapshot()
+
+  @staticmethod
+  async def get_outbox_stats(db: AsyncSession):
+    # 发件箱积压和死信数量
+    return await OutboxService.stats(db)
+
+  @staticmethod
+  async def rebuild_product_stats(db: AsyncSession):
+    # 从 reviews 表重建评分聚合，并失效依赖评分的商品列表缓存
+    await ProductStatsService.rebuild(db)
+    await invalidate_tags(RATINGS_TAG)
+    return {"message": "Product stats rebuilt successfully."}
+
+  @staticmethod
+  async def expire_pending_orders():
+    # 立即执行一次超时订单清理（与后台任务并行也不会重复取消）
+    report = await OrderExpiryService.sweep()
+    return {"message": "Expired orders canceled.", **report}
+
+  @staticmethod
+  async def enable_flash_sale(db: AsyncSession, product_id: int):
+    # 商品库存转入Redis台账，下单时在Redis中原子扣减
+    stock = await InventoryLedgerService.enable(db, product_id)
+    return {"message": "Flash sale enabled.", "product_id": product_id, "stock": stock}
+
+  @staticmethod
+  async def disable_flash_sale(db: AsyncSession, product_id: int):
+    # 剩余库存写回数据库，之后恢复数据库扣减
+    stock = await InventoryLedgerService.disable(db, product_id)
+    return {"message": "Flash sale disabled.", "product_id": product_id, "stock": stock}
@@ -1,71 +1,196 @@
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import and_, delete
 from sqlalchemy.future import select
 from fastapi  import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import insert
 
-from app.models.product import Product
+from app.config.settings import settings
+from app.services.product_service import ProductService
+from app.services.redis_cart_service import RedisCartService
 from app.models.cart_item import CartItem
-from app.schemas.cart_item import CartItemCreate, CartItemResponse
+from app.models.product import Product
+from app.schemas.cart_item import CartItemCreate, CartItemResponse, CartBatchRequest, CartBatchLine, CartBatchAction
 
 
 class CartService:
+  """
+  购物车服务；CART_BACKEND=redis 时读写 Redis 购物车（见 app/services/redis_cart_service.py），
+  此时购物车项ID即商品ID
+  """
   @staticmethod
   async def create_cart_item(
           cart_item_data: CartItemCreate,
           db: AsyncSession, current_user):
+    # 单件加购即只有一行 add 的批量操作：累加在数据库（或Redis脚本）中完成，并发加购不会丢失数量
+    batch = CartBatchRequest(items=[CartBatchLine(**cart_item_data.model_dump())])
+    cart = await CartService.update_cart_batch(batch, db, current_user)
+    return next(item for item in cart if item.product_id == cart_item_data.product_id)
+
+  @staticmethod
+  def _resolve_batch(batch: CartBatchRequest, products: Dict[int, Any],
+                     in_cart: Dict[int, int]) -> Dict[int, Tuple[int, float]]:
+    """
+    校验批量操作中的商品和库存，计算每件商品的最终数量
 
-    # 1. 检查商品是否存在且有效
-    product_query = select(Product).where(Product.id == cart_item_data.product_id)
-    product_result = await db.execute(product_query)
-    product_item = product_result.scalars().first()
+    Args:
+      batch: 批量操作
+      products: 商品ID -> 商品（需要 price、stock、is_active）
+      in_cart: 商品ID -> 购物车中的现有数量
 
-    if not product_item or product_item.is_active == False:
+    Returns:
+      {商品ID: (数量, 单价)}，不包含删除的商品
+    """
+    lines = [line for line in batch.items if line.action != CartBatchAction.remove]
+    missing = [line.product_id for line in lines
+               if line.product_id not in products or not products[line.product_id].is_active]
+    if missing:
       raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                          detail='Product not found')
-
-    # 2. 检查购物车中是否已存在该商品
-    existing_cart_item_query = select(CartItem).where(
-        CartItem.user_id == current_user.id,
-        CartItem.product_id == cart_item_data.product_id
-    )
-    existing_cart_item_result = await db.execute(existing_cart_item_query)
-    existing_cart_item = existing_cart_item_result.scalars().first()
-
-    if existing_cart_item:
-      # 如果已存在，累加数量
-      new_quantity = existing_cart_item.quantity + cart_item_data.quantity
-      
-      # 检查库存是否足够
-      if product_item.stock < new_quantity:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f'Product stock exceeded. Available stock: {product_item.stock}, current in cart: {existing_cart_item.quantity}')
-      
-      # 更新数量和价格
-      existing_cart_item.quantity = new_quantity
-      existing_cart_item.price = product_item.price * new_quantity
-      
-      await db.commit()
-      await db.refresh(existing_cart_item)
-      return CartItemResponse.model_validate(existing_cart_item)
-    
-    else:
-      # 如果不存在，创建新记录
-      if product_item.stock < cart_item_data.quantity:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                            detail=f'Product stock exceeded. Available stock: {product_item.stock}')
-
-      cart_item_dict = cart_item_data.model_dump()
-      cart_item_dict['user_id'] = current_user.id
-      cart_item_dict['price'] = product_item.price * cart_item_data.quantity
-      
-      cart_item = CartItem(**cart_item_dict)
-      db.add(cart_item)
-      await db.commit()
-      await db.refresh(cart_item)
-      return CartItemResponse.model_validate(cart_item)
+                          detail=f"Products not found: {missing}")
+
+    resolved, exceeded = {}, []
+    for line in lines:
+      product = products[line.product_id]
+      quantity = line.quantity
+      if line.action == CartBatchAction.add:
+        quantity += in_cart.get(line.product_id, 0)
+      if quantity > product.stock:
+        exceeded.append(f"{line.product_id} (available stock: {product.stock})")
+      resolved[line.product_id] = (quantity, product.price)
+    if exceeded:
+      raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                          detail=f"Product stock exceeded: {', '.join(exceeded)}")
+    return resolved
+
+  @staticmethod
+  async def update_cart_batch(
+          batch: CartBatchRequest,
+          db: AsyncSession, current_user) -> List[CartItemResponse]:
+    """
+    批量加购、修改数量和删除，返回更新后的整个购物车
+    一条查询校验所有商品和库存（同时取出购物车中的现有数量），
+    INSERT ... ON CONFLICT (user_id, product_id) DO UPDATE 写入：set 行直接覆盖数量，
+    add 行在数据库中累加（quantity = cart_items.quantity + EXCLUDED.quantity，并在SQL中校验库存），
+    同一商品并发加购时由唯一索引合并为一行，数量也不会丢失
+
+    Args:
+      batch: 批量操作，每件商品最多出现一次
+      db: 数据库会话
+      current_user: 当前用户
+
+    Returns:
+      购物车中的全部商品
+    """
+    if settings.CART_BACKEND == "redis":
+      return await CartService._update_cart_batch_redis(batch, db, current_user)
+
+    removed = [line.product_id for line in batch.items if line.action == CartBatchAction.remove]
+    product_ids = [line.product_id for line in batch.items if line.action != CartBatchAction.remove]
+
+    if product_ids:
+      result = await db.execute(
+        select(Product.id, Product.price, Product.stock, Product.is_active, CartItem.quantity.label("in_cart"))
+        .outerjoin(CartItem, and_(CartItem.product_id == Product.id, CartItem.user_id == current_user.id))
+        .where(Product.id.in_(product_ids))
+      )
+      rows = result.all()
+      resolved = CartService._resolve_batch(
+        batch, {row.id: row for row in rows}, {row.id: row.in_cart for row in rows if row.in_cart})
+
+      lines = {line.product_id: line for line in batch.items}
+      set_rows = [
+        {"user_id": current_user.id, "product_id": product_id, "quantity": quantity, "price": price * quantity}
+        for product_id, (quantity, price) in resolved.items() if lines[product_id].action == CartBatchAction.set
+      ]
+      # add 行只写入增量，由 ON CONFLICT 在数据库中累加（读取的现有数量只用于上面的提示性校验）
+      add_rows = [
+        {"user_id": current_user.id, "product_id": product_id,
+         "quantity": lines[product_id].quantity, "price": price * lines[product_id].quantity}
+        for product_id, (_, price) in resolved.items() if lines[product_id].action == CartBatchAction.add
+      ]
+
+      if set_rows:
+        stmt = insert(CartItem).values(set_rows)
+        stmt = stmt.on_conflict_do_update(
+          index_elements=[CartItem.user_id, CartItem.product_id],
+          set_={"quantity": stmt.excluded.quantity, "price": stmt.excluded.price})
+        await db.execute(stmt)
+
+      if add_rows:
+        # 子查询引用冲突行（cart_items），不把 cart_items 加入子查询的 FROM
+        stock = (select(Product.stock).where(Product.id == CartItem.product_id)
+                 .correlate_except(Product).scalar_subquery())
+        unit_price = (select(Product.price).where(Product.id == CartItem.product_id)
+                      .correlate_except(Product).scalar_subquery())
+        stmt = insert(CartItem).values(add_rows)
+        new_quantity = CartItem.quantity + stmt.excluded.quantity
+        stmt = stmt.on_conflict_do_update(
+          index_elements=[CartItem.user_id, CartItem.product_id],
+          set_={"quantity": new_quantity, "price": new_quantity * unit_price},
+          # 累加后超过库存的行不更新，也不出现在 RETURNING 中
+          where=new_quantity <= stock
+        ).returning(CartItem.product_id)
+        applied = set((await db.execute(stmt)).scalars().all())
+        exceeded = [row["product_id"] for row in add_rows if row["product_id"] not in applied]
+        if exceeded:
+          await db.rollback()
+          raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                              detail=f"Product stock exceeded: {exceeded}")
+
+    if removed:
+      await db.execute(
+        delete(CartItem).where(CartItem.user_id == current_user.id, CartItem.product_id.in_(removed)))
+
+    cart_result = await db.execute(
+      select(CartItem).where(CartItem.user_id == current_user.id).order_by(CartItem.id))
+    cart = [CartItemResponse.model_validate(item) for item in cart_result.scalars().all()]
+    await db.commit()
+    return cart
+
+  @staticmethod
+  async def _update_cart_batch_redis(
+          batch: CartBatchRequest,
+          db: AsyncSession, current_user) -> List[CartItemResponse]:
+    """
+    Redis购物车的批量操作：商品从实体缓存读取，库存在下单时由数据库再次校验
+    """
+    in_cart = await RedisCartService.get_quantities(current_user.id)
+    products = await ProductService.get_products_by_ids(
+      db, [line.product_id for line in batch.items if line.action != CartBatchAction.remove])
+    resolved = CartService._resolve_batch(
+      batch, products, {product_id: quantity for product_id, (quantity, _) in in_cart.items()})
+    lines = {}
+    for line in batch.items:
+      if line.action == CartBatchAction.remove:
+        lines[line.product_id] = ("set", 0, 0, 0)
+      elif line.action == CartBatchAction.add:
+        # 增量在Redis脚本中累加，上面读取的现有数量只用于提示性校验
+        product = products[line.product_id]
+        lines[line.product_id] = ("add", line.quantity, product.price, product.stock)
+      else:
+        quantity, price = resolved[line.product_id]
+        lines[line.product_id] = ("set", quantity, price, 0)
+
+    exceeded = await RedisCartService.apply(current_user.id, lines)
+    if exceeded:
+      raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                          detail=f"Product stock exceeded: {exceeded}")
+    return await RedisCartService.get_cart(current_user.id)
+
+  @staticmethod
+  async def _redis_line(product_id: int, current_user) -> CartItemResponse:
+    cart = await RedisCartService.get_cart(current_user.id)
+    cart_item = next((item for item in cart if item.product_id == product_id), None)
+    if not cart_item:
+      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Cart Item not found')
+    return cart_item
 
   @staticmethod
   async def get_cart_items(db: AsyncSession, current_user):
+    if settings.CART_BACKEND == "redis":
+      return await RedisCartService.get_cart(current_user.id)
+
     cart_query = select(CartItem).where(CartItem.user_id == current_user.id)
     cart_items_result = await db.execute(cart_query)
     cart_items = cart_items_result.scalars().all()
@@ -75,6 +200,9 @@ class CartService:
 
   @staticmethod
   async def get_cart_item_by_id(cart_item_id: int, db: AsyncSession, current_user):
+    if settings.CART_BACKEND == "redis":
+      return await CartService._redis_line(cart_item_id, current_user)
+
     cart_item_query = select(CartItem).where(CartItem.id == cart_item_id)
     cart_item_result = await db.execute(cart_item_query)
     cart_item = cart_item_result.scalar_one_or_none()
@@ -89,6 +217,13 @@ class CartService:
 
   @staticmethod
   async def update_cart_item(cart_item_id: int, cart_item, db: AsyncSession, current_user):
+    if settings.CART_BACKEND == "redis":
+      await CartService._redis_line(cart_item_id, current_user)
+      batch = CartBatchRequest(items=[CartBatchLine(
+        product_id=cart_item_id, quantity=cart_item.quantity, action=CartBatchAction.set)])
+      cart = await CartService._update_cart_batch_redis(batch, db, current_user)
+      return next(item for item in cart if item.product_id == cart_item_id)
+
     # 查询购物车项（用于权限验证）
     cart_item_query = select(CartItem).where(CartItem.id == cart_item_id)
     cart_item_db_result = await db.execute(cart_item_query)
@@ -101,8 +236,10 @@ class CartService:
       raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
 
     # 检查商品库存
-    product_result = await db.execute(select(Product).where(Product.id == cart_item_db.product_id))
-    product = product_result.scalar_one_or_none()
+    products = await ProductService.get_products_by_ids(db, [cart_item_db.product_id])
+    product = products.get(cart_item_db.product_id)
+    if not product:
+      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Product not found')
     if cart_item.quantity > product.stock:
       raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                           detail=f"Product stock exceeded. Available stock: {product.stock}")
@@ -119,6 +256,11 @@ class CartService:
 
   @staticmethod
   async def delete_cart_item(cart_item_id: int, db: AsyncSession, current_user):
+    if settings.CART_BACKEND == "redis":
+      await CartService._redis_line(cart_item_id, current_user)
+      await RedisCartService.apply(current_user.id, {cart_item_id: ("set", 0, 0, 0)})
+      return {"message": "Cart item deleted successfully"}
+
     cart_item_query = select(CartItem).where(CartItem.id == cart_item_id)
     cart_item_result = await db.execute(cart_item_query)
     cart_item = cart_item_result.scalar_one_or_none()
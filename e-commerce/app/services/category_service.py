@@ -5,50 +5,56 @@ from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.category import Category
+from app.utils.cache import CATEGORY_TREE_TAG, versioned_key, invalidate_tags, cached_call
 from app.schemas.category import CategoryCreate, CategoryUpdate, CategoryResponse
 
 
 class CategoryService:
   @staticmethod
   async def get_all_categories(db: AsyncSession, include_inactive: bool = False):
-    """获取所有分类（树形结构）"""
-    query = select(Category)
-    if not include_inactive:
-      query = query.where(Category.is_active == True)
-    query = query.order_by(Category.level, Category.id)
-    
-    result = await db.execute(query)
-    all_categories = result.scalars().all()
-    
-    # 构建树形结构
-    category_dict = {cat.id: CategoryResponse(
-      id=cat.id,
-      name=cat.name,
-      description=cat.description,
-      parent_id=cat.parent_id,
-      level=cat.level,
-      is_active=cat.is_active,
-      created_at=cat.created_at,
-      updated_at=cat.updated_at,
-      children=None
-    ) for cat in all_categories}
-    
-    # 构建父子关系
-    root_categories = []
-    for cat in all_categories:
-      category_response = category_dict[cat.id]
-      if cat.parent_id is None:
-        # 一级分类
-        root_categories.append(category_response)
-      else:
-        # 二级分类，添加到父分类的children中
-        if cat.parent_id in category_dict:
-          parent = category_dict[cat.parent_id]
-          if parent.children is None:
-            parent.children = []
-          parent.children.append(category_response)
-    
-    return root_categories
+    """获取所有分类（树形结构，带缓存）"""
+    cache_key = await versioned_key("categories:tree", [CATEGORY_TREE_TAG], f"inactive:{include_inactive}")
+
+    async def load_category_tree():
+      query = select(Category)
+      if not include_inactive:
+        query = query.where(Category.is_active == True)
+      query = query.order_by(Category.level, Category.id)
+    
+      result = await db.execute(query)
+      all_categories = result.scalars().all()
+    
+      # 构建树形结构
+      category_dict = {cat.id: CategoryResponse(
+        id=cat.id,
+        name=cat.name,
+        description=cat.description,
+        parent_id=cat.parent_id,
+        level=cat.level,
+        is_active=cat.is_active,
+        created_at=cat.created_at,
+        updated_at=cat.updated_at,
+        children=None
+      ) for cat in all_categories}
+    
+      # 构建父子关系
+      root_categories = []
+      for cat in all_categories:
+        category_response = category_dict[cat.id]
+        if cat.parent_id is None:
+          # 一级分类
+          root_categories.append(category_response)
+        else:
+          # 二级分类，添加到父分类的children中
+          if cat.parent_id in category_dict:
+            parent = category_dict[cat.parent_id]
+            if parent.children is None:
+              parent.children = []
+            parent.children.append(category_response)
+    
+      return [category.model_dump() for category in root_categories]
+
+    return await cached_call("categories:tree", cache_key, load_category_tree, ttl=3600)
 
   @staticmethod
   async def get_category_by_id(db: AsyncSession, category_id: int):
@@ -129,6 +135,7 @@ class CategoryService:
     db.add(category)
     await db.commit()
     await db.refresh(category)
+    await invalidate_tags(CATEGORY_TREE_TAG)
     
     # 手动构建响应对象，避免访问未加载的关系属性
     return CategoryResponse(
@@ -161,6 +168,7 @@ class CategoryService:
     
     await db.commit()
     await db.refresh(category)
+    await invalidate_tags(CATEGORY_TREE_TAG)
     
     # 如果需要返回子分类，需要查询
     children_query = await db.execute(
@@ -237,6 +245,7 @@ class CategoryService:
     
     await db.delete(category)
     await db.commit()
+    await invalidate_tags(CATEGORY_TREE_TAG)
     
     return {"message": "Category deleted successfully"}
 
@@ -0,0 +1,158 @@
+"""
+查询向量缓存
+相同的查询（忽略大小写、全半角和多余空白）不再重复编码：
+  - L1：进程内LRU（按字节限制容量）
+  - L2：Redis，多个worker共享
+缓存键为 emb:{模型名}:{精度}:{规范化查询的sha1}，值为向量的原始字节（默认 float16，384维占768字节）。
+未命中时编码结果按缓存精度量化后再返回，命中与未命中得到完全相同的向量，检索结果不会因缓存而变化
+"""
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Awaitable, Callable, Dict, Optional
+
+import redis
+
+from app.config.settings import settings
+from app.utils.local_cache import LocalCache
+from app.database.redis_session import redis_binary_connection
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+KEY_PREFIX = "emb:"
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """
+    规范化查询：NFKC（全角转半角）、小写、合并空白
+    """
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip().lower()
+
+
+class EmbeddingCache:
+    """
+    查询向量的两级缓存（线程安全：同步检索可能在线程中执行）
+    """
+
+    def __init__(self, model_name: str, max_bytes: int, ttl: int, dtype: str = "float16", use_redis: bool = True):
+        """
+        Args:
+            model_name: Embedding模型名称（不同模型的向量不能混用）
+            max_bytes: 进程内缓存的字节数上限
+            ttl: 缓存时间（秒）
+            dtype: 存储精度，float16 或 float32
+            use_redis: 是否使用Redis作为二级缓存
+        """
+        self.model_name = model_name
+        self.use_redis = use_redis
+        self.ttl = ttl
+        self.dtype = np.dtype(dtype)
+        self.local = LocalCache(max_bytes=max_bytes, max_ttl=ttl)
+        self.counters = Counter()
+        self._lock = threading.Lock()
+        self._sync_redis: Optional[redis.Redis] = None
+
+    def key(self, text: str) -> str:
+        digest = hashlib.sha1(normalize_query(text).encode("utf-8")).hexdigest()
+        return f"{KEY_PREFIX}{self.model_name}:{self.dtype.name}:{digest}"
+
+    def _redis(self) -> redis.Redis:
+        if self._sync_redis is None:
+            self._sync_redis = redis.Redis.from_url(settings.REDIS_SESSION_URL, decode_responses=False)
+        return self._sync_redis
+
+    def _quantize(self, embedding) -> bytes:
+        return np.asarray(embedding, dtype=self.dtype).tobytes()
+
+    def _decode(self, data: bytes):
+        return np.frombuffer(data, dtype=self.dtype).astype(np.float32)
+
+    def _get_local(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self.local.get(key)
+            if data is not None:
+                self.counters["l1_hit"] += 1
+            return data
+
+    def _record(self, event: str, key: Optional[str] = None, data: Optional[bytes] = None):
+        with self._lock:
+            self.counters[event] += 1
+            if data is not None:
+                self.local.set(key, data, len(data), self.ttl)
+
+    def embed(self, text: str, encode: Callable):
+        """
+        查询向量（同步）：L1 -> Redis -> encode
+
+        Args:
+            text: 查询文本
+            encode: 未命中时调用的编码函数，参数为查询文本
+        """
+        key = self.key(text)
+        data = self._get_local(key)
+        if data is None:
+            try:
+                data = self._redis().get(key) if self.use_redis else None
+            except Exception:
+                data = None
+            if data is not None:
+                self._record("l2_hit", key, data)
+            else:
+                data = self._quantize(encode(text))
+                self._record("miss", key, data)
+                try:
+                    if self.use_redis:
+                        self._redis().set(key, data, ex=self.ttl)
+                except Exception:
+                    pass
+        return self._decode(data)
+
+    async def aembed(self, text: str, encode: Callable[[str], Awaitable]):
+        """
+        查询向量（异步）：L1 -> Redis -> encode，Redis不可用时直接编码
+        """
+        key = self.key(text)
+        data = self._get_local(key)
+        if data is None:
+            try:
+                data = await redis_binary_connection.get(key) if self.use_redis else None
+            except Exception:
+                data = None
+            if data is not None:
+                self._record("l2_hit", key, data)
+            else:
+                data = self._quantize(await encode(text))
+                self._record("miss", key, data)
+                try:
+                    if self.use_redis:
+                        await redis_binary_connection.set(key, data, ex=self.ttl)
+                except Exception:
+                    pass
+        return self._decode(data)
+
+    def stats(self) -> Dict:
+        """
+        命中统计（进程内计数，每个worker独立）
+        """
+        with self._lock:
+            l1_hits = self.counters["l1_hit"]
+            l2_hits = self.counters["l2_hit"]
+            misses = self.counters["miss"]
+            local = self.local.stats()
+        total = l1_hits + l2_hits + misses
+        return {
+            "l1_hits": l1_hits,
+            "l2_hits": l2_hits,
+            "misses": misses,
+            "hit_ratio": round((l1_hits + l2_hits) / total, 4) if total else 0.0,
+            "l1_hit_ratio": round(l1_hits / total, 4) if total else 0.0,
+            "dtype": self.dtype.name,
+            "local_cache": local,
+        }
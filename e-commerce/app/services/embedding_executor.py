@@ -0,0 +1,99 @@
+"""
+Embedding批量推理执行器
+请求中的查询编码不在事件循环上执行：调用方拿到一个 future，
+后台任务把短时间窗口内（EMBEDDING_BATCH_WINDOW_MS）到达的查询合并，
+最多 EMBEDDING_MAX_BATCH 条一起在推理线程中调用一次 model.encode，再把结果分发给各个 future
+  - 事件循环只负责排队和分发，对话请求不再阻塞同一worker上的其他接口
+  - 并发查询合并成一次前向计算，比逐条编码的吞吐更高
+推理线程只有一个：模型在进程内共享且逐个执行推理（见 EmbeddingService.encode），
+PyTorch 计算时会释放GIL，事件循环不受影响
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+
+class EmbeddingBatcher:
+    """
+    查询编码的微批处理队列
+    """
+
+    def __init__(self, service_factory: Callable, max_batch_size: int = 32, max_wait: float = 0.005):
+        """
+        Args:
+            service_factory: 返回 EmbeddingService 的函数（在推理线程中调用，模型加载也不占用事件循环）
+            max_batch_size: 每批最多的查询数
+            max_wait: 收到第一条查询后等待更多查询的时间（秒）
+        """
+        self.service_factory = service_factory
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def _ensure_worker(self):
+        # 队列和后台任务绑定到当前事件循环（脚本中多次 asyncio.run 时重新创建）
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def encode(self, text: str):
+        """
+        编码一条查询
+
+        Returns:
+            np.ndarray: 向量，形状为 (embedding_dim,)
+        """
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self._queue.put_nowait((text, future))
+        return await future
+
+    async def encode_many(self, texts: List[str]) -> list:
+        """
+        编码多条查询（与其他请求的查询一起批处理）
+        """
+        return list(await asyncio.gather(*(self.encode(text) for text in texts)))
+
+    def _drain(self, batch: list):
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+    def _encode_batch(self, texts: List[str]):
+        return self.service_factory().encode(texts, batch_size=len(texts), show_progress_bar=False)
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            self._drain(batch)
+            if len(batch) < self.max_batch_size:
+                await asyncio.sleep(self.max_wait)
+                self._drain(batch)
+
+            # 调用方已取消（如客户端断开）的查询不再计算
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if not batch:
+                continue
+            try:
+                embeddings = await self._loop.run_in_executor(
+                    self._executor, self._encode_batch, [text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+
+    def close(self):
+        """
+        停止后台任务和推理线程（应用关闭时调用）
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
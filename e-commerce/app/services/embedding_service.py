@@ -4,6 +4,7 @@ Embedding服务
 """
 from typing import List, Optional
 import os
+import threading
 
 # 可选导入sentence_transformers，如果未安装或PyTorch DLL加载失败则提供友好的错误提示
 try:
@@ -18,13 +19,16 @@ except (ImportError, OSError) as e:
     IMPORT_ERROR = str(e)
 
 
+DEFAULT_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
 class EmbeddingService:
     """
     Embedding服务
     使用sentence-transformers生成文本向量
     """
     
-    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME):
         """
         初始化Embedding服务
         
@@ -39,6 +43,8 @@ class EmbeddingService:
         
         self.model_name = model_name
         self.model = None
+        # 模型在进程内共享（见 app/services/rag_resources.py），推理不保证线程安全，逐个执行
+        self._encode_lock = threading.Lock()
         self._load_model()
     
     def _load_model(self):
@@ -51,19 +57,22 @@ class EmbeddingService:
             # 尝试使用默认模型
             try:
                 self.model = SentenceTransformer("all-MiniLM-L6-v2")
+                # 缓存等按模型名区分的数据使用实际加载的模型
+                self.model_name = DEFAULT_MODEL_NAME
             except Exception as e2:
                 raise ImportError(
                     f"无法加载Embedding模型: {e2}. "
                     "请检查sentence-transformers和PyTorch是否正确安装。"
                 )
     
-    def encode(self, texts: List[str], batch_size: int = 32):
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = True):
         """
         将文本列表转换为向量
         
         Args:
             texts: 文本列表
             batch_size: 批处理大小
+            show_progress_bar: 是否显示进度条（请求中的查询编码不显示）
         
         Returns:
             np.ndarray: 向量数组，形状为 (len(texts), embedding_dim)
@@ -77,12 +86,13 @@ class EmbeddingService:
         if self.model is None:
             raise RuntimeError("Embedding模型未加载")
         
-        embeddings = self.model.encode(
-            texts,
-            batch_size=batch_size,
-            show_progress_bar=True,
-            convert_to_numpy=True
-        )
+        with self._encode_lock:
+            embeddings = self.model.encode(
+                texts,
+                batch_size=batch_size,
+                show_progress_bar=show_progress_bar,
+                convert_to_numpy=True
+            )
         
         return embeddings
     
@@ -96,7 +106,7 @@ class EmbeddingService:
         Returns:
             np.ndarray: 向量，形状为 (embedding_dim,)
         """
-        return self.encode([text])[0]
+        return self.encode([text], show_progress_bar=False)[0]
     
     @property
     def embedding_dim(self) -> int:
@@ -0,0 +1,353 @@
+"""
+秒杀商品库存台账（Redis）
+被设为秒杀模式的商品，可售库存保存在 Redis（inventory:stock:{product_id}），
+下单时用Lua脚本原子扣减，不再竞争 products 表的同一行：
+  - 每个订单的预留记录保存在 inventory:reservation:{order_id}，按支付超时时间登记到有序集合
+  - 订单取消或超时未支付时归还预留；支付成功后只删除预留记录
+  - 对账任务定期把 Redis 中的库存写回 products.stock，并处理到期的预留
+"""
+import asyncio
+import time
+from typing import Dict, List, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import Boolean, Integer, case, column, func, update, values
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.order import Order, OrderStatus
+from app.models.product import Product
+from app.config.settings import settings
+from app.database.session import AsyncSessionLocal
+from app.database.redis_session import redis_connection
+from app.services.inventory_service import InventoryService
+from app.services.product_service import ProductService
+from app.utils.cache import invalidate_tags, product_tags
+
+
+FLASH_SKUS_KEY = "inventory:flash"
+STOCK_PREFIX = "inventory:stock:"
+RESERVATION_PREFIX = "inventory:reservation:"
+RESERVATION_DEADLINES_KEY = "inventory:reservations"
+# 因台账库存归零被对账任务自动下架的商品；只有这些商品在库存恢复后由对账任务重新上架
+AUTO_INACTIVE_KEY = "inventory:auto_inactive"
+RECONCILE_BATCH_SIZE = 500
+# 预留记录在到期后再保留一段时间，保证对账任务一定能读到
+RESERVATION_GRACE = 24 * 3600
+
+# 全部商品库存充足才扣减（全有或全无）
+# KEYS: 秒杀商品集合, 预留记录, 预留到期有序集合
+# ARGV: 订单ID, 到期时间, 预留记录TTL, 商品ID1, 数量1, 商品ID2, 数量2 ...
+# 返回: {1} 成功；{0, 商品ID, 可售库存} 库存不足；{-1, 商品ID} 不是秒杀商品
+RESERVE_SCRIPT = """
+local n = (#ARGV - 3) / 2
+for i = 1, n do
+  local product_id = ARGV[2 + 2 * i]
+  local qty = tonumber(ARGV[3 + 2 * i])
+  if redis.call('SISMEMBER', KEYS[1], product_id) == 0 then
+    return {-1, product_id}
+  end
+  local stock = tonumber(redis.call('GET', 'inventory:stock:' .. product_id) or '0')
+  if stock < qty then
+    return {0, product_id, stock}
+  end
+end
+for i = 1, n do
+  local product_id = ARGV[2 + 2 * i]
+  local qty = tonumber(ARGV[3 + 2 * i])
+  redis.call('DECRBY', 'inventory:stock:' .. product_id, qty)
+  redis.call('HINCRBY', KEYS[2], product_id, qty)
+end
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+redis.call('ZADD', KEYS[3], ARGV[2], ARGV[1])
+return {1}
+"""
+
+# 归还预留：仍是秒杀商品的加回 Redis，已退出秒杀模式的返回给调用方写回数据库
+# KEYS: 预留记录, 预留到期有序集合, 秒杀商品集合；ARGV: 订单ID
+RELEASE_SCRIPT = """
+local items = redis.call('HGETALL', KEYS[1])
+local fallback = {}
+for i = 1, #items, 2 do
+  if redis.call('SISMEMBER', KEYS[3], items[i]) == 1 then
+    redis.call('INCRBY', 'inventory:stock:' .. items[i], items[i + 1])
+  else
+    table.insert(fallback, items[i])
+    table.insert(fallback, items[i + 1])
+  end
+end
+redis.call('DEL', KEYS[1])
+redis.call('ZREM', KEYS[2], ARGV[1])
+return {items, fallback}
+"""
+
+# 开启秒杀模式：以数据库库存初始化台账（已开启时不覆盖）
+ENABLE_SCRIPT = """
+redis.call('SET', KEYS[2], ARGV[2], 'NX')
+redis.call('SADD', KEYS[1], ARGV[1])
+return tonumber(redis.call('GET', KEYS[2]))
+"""
+
+# 商品信息中的库存被修改：秒杀商品以修改后的库存为台账的可售库存（不是秒杀商品时不处理）
+# KEYS: 秒杀商品集合, 台账库存, 自动下架集合；ARGV: 商品ID, 库存
+SET_STOCK_SCRIPT = """
+redis.call('SREM', KEYS[3], ARGV[1])
+if redis.call('SISMEMBER', KEYS[1], ARGV[1]) == 0 then
+  return 0
+end
+redis.call('SET', KEYS[2], ARGV[2])
+return 1
+"""
+
+# 关闭秒杀模式：取出剩余库存并删除台账
+DISABLE_SCRIPT = """
+local stock = redis.call('GET', KEYS[2])
+redis.call('SREM', KEYS[1], ARGV[1])
+redis.call('DEL', KEYS[2])
+return stock
+"""
+
+
+def _pairs(flat: List) -> Dict[int, int]:
+  return {int(flat[i]): int(flat[i + 1]) for i in range(0, len(flat), 2)}
+
+
+class InventoryLedgerService:
+  @staticmethod
+  def _reservation_key(order_id: int) -> str:
+    return f"{RESERVATION_PREFIX}{order_id}"
+
+  @staticmethod
+  async def flash_products(product_ids) -> List[int]:
+    """
+    筛选出处于秒杀模式的商品
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+      return []
+    try:
+      members = await redis_connection.smismember(FLASH_SKUS_KEY, product_ids)
+    except Exception:
+      # 无法确定库存以哪里为准，不能降级到数据库扣减
+      raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Inventory service unavailable")
+    return [product_id for product_id, member in zip(product_ids, members) if member]
+
+  @staticmethod
+  async def reserve(order_id: int, quantities: Dict[int, int]):
+    """
+    为订单原子预留秒杀商品库存，预留在订单支付超时后由对账任务处理
+
+    Raises:
+      HTTPException: 库存不足，或商品已退出秒杀模式
+    """
+    deadline = int(time.time()) + settings.ORDER_PAYMENT_TIMEOUT
+    args = [order_id, deadline, settings.ORDER_PAYMENT_TIMEOUT + RESERVATION_GRACE]
+    for product_id, qty in sorted(quantities.items()):
+      args.extend([product_id, qty])
+
+    result = await redis_connection.eval(
+      RESERVE_SCRIPT, 3,
+      FLASH_SKUS_KEY, InventoryLedgerService._reservation_key(order_id), RESERVATION_DEADLINES_KEY,
+      *args)
+    if int(result[0]) == 1:
+      return
+    product_id = int(result[1])
+    if int(result[0]) == 0:
+      raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Insufficient stock for product {product_id}. Available: {int(result[2])}, Requested: {quantities[product_id]}")
+    raise HTTPException(
+      status_code=status.HTTP_409_CONFLICT,
+      detail=f"Product {product_id} is no longer on flash sale. Please try again.")
+
+  @staticmethod
+  async def reserved_items(order_ids: List[int]) -> Dict[int, Dict[int, int]]:
+    """
+    订单在台账中预留的商品，一次往返读取多个订单
+
+    Returns:
+      订单ID -> {商品ID: 数量}，只包含有秒杀商品的订单
+    """
+    async with redis_connection.pipeline(transaction=False) as pipe:
+      for order_id in order_ids:
+        pipe.hgetall(InventoryLedgerService._reservation_key(order_id))
+      results = await pipe.execute()
+    return {
+      order_id: {int(product_id): int(qty) for product_id, qty in items.items()}
+      for order_id, items in zip(order_ids, results) if items
+    }
+
+  @staticmethod
+  async def release(db: AsyncSession, order_id: int) -> Dict[int, int]:
+    """
+    归还订单的预留（订单取消、超时或下单事务失败）
+    在订单状态提交之后调用：提交失败时预留仍然有效，由对账任务处理
+
+    Returns:
+      商品ID -> 归还数量（订单没有秒杀商品时为空）
+    """
+    items, fallback = await redis_connection.eval(
+      RELEASE_SCRIPT, 3,
+      InventoryLedgerService._reservation_key(order_id), RESERVATION_DEADLINES_KEY, FLASH_SKUS_KEY,
+      order_id)
+    fallback = _pairs(fallback)
+    if fallback:
+      # 已退出秒杀模式的商品，库存以数据库为准
+      restored = await InventoryService.release_stock(db, fallback)
+      await db.commit()
+      await InventoryLedgerService._invalidate(restored)
+    return _pairs(items)
+
+  @staticmethod
+  async def confirm(order_id: int):
+    """
+    订单已支付：库存正式扣除，删除预留记录
+    """
+    async with redis_connection.pipeline(transaction=True) as pipe:
+      pipe.delete(InventoryLedgerService._reservation_key(order_id))
+      pipe.zrem(RESERVATION_DEADLINES_KEY, order_id)
+      await pipe.execute()
+
+  @staticmethod
+  async def enable(db: AsyncSession, product_id: int) -> int:
+    """
+    将商品切换为秒杀模式，返回台账中的可售库存
+    """
+    product = (await db.execute(select(Product).where(Product.id == product_id))).scalars().first()
+    if not product:
+      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found.")
+    stock = await redis_connection.eval(
+      ENABLE_SCRIPT, 2, FLASH_SKUS_KEY, f"{STOCK_PREFIX}{product_id}", product_id, product.stock)
+    return int(stock)
+
+  @staticmethod
+  async def disable(db: AsyncSession, product_id: int) -> int:
+    """
+    退出秒杀模式：剩余库存写回数据库，之后的下单走数据库扣减
+    未完成订单的预留在归还时直接写回数据库
+    """
+    stock = await redis_connection.eval(
+      DISABLE_SCRIPT, 2, FLASH_SKUS_KEY, f"{STOCK_PREFIX}{product_id}", product_id)
+    if stock is None:
+      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product is not on flash sale.")
+    await InventoryLedgerService._sync_stock(db, {product_id: int(stock)})
+    # 退出秒杀模式后对账任务不再管理该商品的上下架
+    await redis_connection.srem(AUTO_INACTIVE_KEY, product_id)
+    return int(stock)
+
+  @staticmethod
+  async def set_stock(product_id: int, stock: int) -> bool:
+    """
+    商品库存被手动修改后调用：秒杀商品的台账库存改为修改后的值，避免下一次对账把修改覆盖回去；
+    手动修改后不再视为自动下架
+
+    Returns:
+      是否为秒杀商品
+    """
+    result = await redis_connection.eval(
+      SET_STOCK_SCRIPT, 3, FLASH_SKUS_KEY, f"{STOCK_PREFIX}{product_id}", AUTO_INACTIVE_KEY, product_id, stock)
+    return result == 1
+
+  @staticmethod
+  async def _sync_stock(db: AsyncSession, stocks: Dict[int, int]):
+    """
+    把台账库存写回 products.stock（一条 UPDATE ... FROM (VALUES ...)，只更新有变化的行）
+    上下架：库存归零时下架（并记入自动下架集合）；只有自动下架的商品在库存恢复后重新上架，
+    商家或管理员手动下架的商品保持下架
+    """
+    auto_inactive = {int(product_id) for product_id in await redis_connection.smembers(AUTO_INACTIVE_KEY)}
+    lines = values(column("product_id", Integer), column("stock", Integer), column("auto_inactive", Boolean),
+                   name="v").data(
+      [(product_id, stock, product_id in auto_inactive) for product_id, stock in sorted(stocks.items())])
+    # 更新前的上下架状态（UPDATE 的 RETURNING 只能读到更新后的值）
+    products = Product.__table__.alias("previous_products")
+    previous = (select(products.c.id, products.c.is_active.label("was_active"))
+                .where(products.c.id.in_(list(stocks))).subquery("previous"))
+    is_active = case((lines.c.stock <= 0, False), (lines.c.auto_inactive, True), else_=Product.is_active)
+    rows = (await db.execute(
+      update(Product)
+      .where(Product.id == lines.c.product_id, Product.id == previous.c.id, Product.stock != lines.c.stock)
+      .values(stock=lines.c.stock,
+              is_active=is_active,
+              # 只在上下架变化时更新 updated_at（知识库增量同步的高水位），库存变化不触发重新同步
+              updated_at=case((is_active != Product.is_active, func.now()), else_=Product.updated_at))
+      .returning(Product.id, Product.category_id, Product.is_active, previous.c.was_active)
+      .execution_options(synchronize_session=False)
+    )).all()
+    await db.commit()
+
+    deactivated = [row.id for row in rows if row.was_active and not row.is_active]
+    reactivated = [row.id for row in rows if row.is_active and row.id in auto_inactive]
+    if deactivated or reactivated:
+      async with redis_connection.pipeline(transaction=False) as pipe:
+        if deactivated:
+          pipe.sadd(AUTO_INACTIVE_KEY, *deactivated)
+        if reactivated:
+          pipe.srem(AUTO_INACTIVE_KEY, *reactivated)
+        await pipe.execute()
+    await InventoryLedgerService._invalidate([{"id": row.id, "category_id": row.category_id} for row in rows])
+
+  @staticmethod
+  async def _invalidate(rows: List[dict]):
+    if rows:
+      await invalidate_tags(*product_tags(*{row["category_id"] for row in rows}))
+      await ProductService.invalidate_products(*{row["id"] for row in rows})
+
+  @staticmethod
+  async def _expire_reservations(db: AsyncSession) -> Tuple[int, int]:
+    """
+    处理到期的预留：已支付的确认，已取消或不存在的订单归还
+    仍未支付的订单由超时清理任务取消（见 app/services/order_expiry_service.py），取消后即归还
+
+    Returns:
+      (确认数, 归还数)
+    """
+    due = await redis_connection.zrangebyscore(
+      RESERVATION_DEADLINES_KEY, "-inf", int(time.time()), start=0, num=RECONCILE_BATCH_SIZE)
+    if not due:
+      return 0, 0
+    order_ids = [int(order_id) for order_id in due]
+    statuses = dict((await db.execute(
+      select(Order.id, Order.order_status).where(Order.id.in_(order_ids))
+    )).all())
+
+    confirmed, released = 0, 0
+    for order_id in order_ids:
+      order_status = statuses.get(order_id)
+      if order_status in (OrderStatus.paid, OrderStatus.shipped, OrderStatus.completed):
+        await InventoryLedgerService.confirm(order_id)
+        confirmed += 1
+      elif order_status is None or order_status == OrderStatus.canceled:
+        # 取消后未能归还的订单，以及下单事务没有提交的订单
+        await InventoryLedgerService.release(db, order_id)
+        released += 1
+    return confirmed, released
+
+  @staticmethod
+  async def reconcile(db: AsyncSession):
+    """
+    对账：处理到期预留，并把台账库存写回数据库
+    """
+    await InventoryLedgerService._expire_reservations(db)
+    product_ids = [int(product_id) for product_id in await redis_connection.smembers(FLASH_SKUS_KEY)]
+    if not product_ids:
+      return
+    counts = await redis_connection.mget([f"{STOCK_PREFIX}{product_id}" for product_id in product_ids])
+    stocks = {product_id: int(count) for product_id, count in zip(product_ids, counts) if count is not None}
+    if stocks:
+      await InventoryLedgerService._sync_stock(db, stocks)
+
+
+async def run_inventory_reconciler():
+  """
+  定期对账（在应用生命周期内作为后台任务运行）
+  """
+  while True:
+    await asyncio.sleep(settings.INVENTORY_RECONCILE_INTERVAL)
+    try:
+      async with AsyncSessionLocal() as db:
+        await InventoryLedgerService.reconcile(db)
+    except asyncio.CancelledError:
+      raise
+    except Exception as e:
+      print(f"库存对账失败: {e}")
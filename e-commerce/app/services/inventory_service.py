@@ -0,0 +1,102 @@
+"""
+库存服务
+下单时用一条条件 UPDATE 预留所有商品的库存：
+  UPDATE products SET stock = stock - v.qty FROM (VALUES ...) v
+  WHERE products.id = v.product_id AND products.stock >= v.qty RETURNING ...
+库存不足的商品不会出现在返回行中，调用方回滚事务即可，不需要分布式锁
+"""
+from typing import Dict, List
+
+from fastapi import HTTPException, status
+from sqlalchemy import Integer, case, column, func, update, values
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.product import Product
+
+
+class InventoryService:
+  @staticmethod
+  async def reserve_stock(db: AsyncSession, quantities: Dict[int, int]) -> Dict[int, dict]:
+    """
+    原子扣减多个商品的库存（需要在事务中调用，库存不足时抛出异常，由调用方回滚）
+
+    Args:
+      db: 事务中的数据库会话
+      quantities: 商品ID -> 购买数量
+
+    Returns:
+      商品ID -> {"stock": 扣减后库存, "price": 当前价格, "category_id": 分类ID, "vendor_id": 商家ID}
+    """
+    if not quantities:
+      return {}
+
+    # 按商品ID排序，尽量让并发事务以相同顺序加行锁
+    lines = values(column("product_id", Integer), column("qty", Integer), name="v").data(
+      sorted(quantities.items()))
+    is_active = case((Product.stock == lines.c.qty, False), else_=Product.is_active)
+    stmt = (
+      update(Product)
+      .where(Product.id == lines.c.product_id, Product.stock >= lines.c.qty)
+      .values(
+        stock=Product.stock - lines.c.qty,
+        # SET 中引用的是更新前的值：扣完后库存为0时下架
+        is_active=is_active,
+        # 库存不属于知识库内容，只在上下架变化时更新 updated_at（知识库增量同步的高水位）
+        updated_at=case((is_active != Product.is_active, func.now()), else_=Product.updated_at)
+      )
+      .returning(Product.id, Product.stock, Product.price, Product.category_id, Product.vendor_id)
+      .execution_options(synchronize_session=False)
+    )
+    rows = (await db.execute(stmt)).all()
+    reserved = {
+      row.id: {"stock": row.stock, "price": row.price, "category_id": row.category_id, "vendor_id": row.vendor_id}
+      for row in rows
+    }
+
+    shortfall = [product_id for product_id in quantities if product_id not in reserved]
+    if shortfall:
+      raise await InventoryService._shortfall_error(db, shortfall, quantities)
+    return reserved
+
+  @staticmethod
+  async def release_stock(db: AsyncSession, quantities: Dict[int, int]) -> List[dict]:
+    """
+    批量归还库存（订单取消/超时），一条 UPDATE ... FROM (VALUES ...)
+
+    Returns:
+      被更新的商品 [{"id", "stock", "category_id"}]
+    """
+    if not quantities:
+      return []
+
+    lines = values(column("product_id", Integer), column("qty", Integer), name="v").data(
+      sorted(quantities.items()))
+    is_active = case((Product.stock + lines.c.qty > 0, True), else_=Product.is_active)
+    stmt = (
+      update(Product)
+      .where(Product.id == lines.c.product_id)
+      .values(
+        stock=Product.stock + lines.c.qty,
+        # 因库存为0而下架的商品，归还库存后重新上架
+        is_active=is_active,
+        updated_at=case((is_active != Product.is_active, func.now()), else_=Product.updated_at)
+      )
+      .returning(Product.id, Product.stock, Product.category_id)
+      .execution_options(synchronize_session=False)
+    )
+    rows = (await db.execute(stmt)).all()
+    return [{"id": row.id, "stock": row.stock, "category_id": row.category_id} for row in rows]
+
+  @staticmethod
+  async def _shortfall_error(db: AsyncSession, shortfall: List[int], quantities: Dict[int, int]) -> HTTPException:
+    result = await db.execute(select(Product.id, Product.stock).where(Product.id.in_(shortfall)))
+    available = dict(result.all())
+    product_id = shortfall[0]
+    if product_id not in available:
+      return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Product {product_id} not found")
+    return HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail=f"Insufficient stock for product {product_id}. Available: {available[product_id]}, Requested: {quantities[product_id]}")
@@ -1,13 +1,37 @@
 """
 知识库服务
 用于提取和准备商品、评论数据，构建RAG知识库
+增量同步（sync）：
+  - 高水位：只提取上次同步以来 updated_at/created_at 变化的商品和评论（以及分类、评分聚合有变化的商品）
+  - 内容哈希：向量元数据中保存文本和元数据的哈希，内容未变化的文档不重新生成向量
+  - 删除：高水位之后下架的商品（连同其评论）和删除记录表中的商品、评论（由数据库触发器写入）；
+    只有首次同步或显式要求一致性检查（full_scan）时才逐页核对向量库中的全部文档ID
+同步是流式的：服务端游标（yield_per）逐批读取 -> 构建文档 -> 比较哈希并生成向量 -> 写入ChromaDB，
+各阶段之间用有界队列连接，数据库读取、模型推理和向量写入同时进行，内存占用与数据量无关
 """
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional, Set
 from app.models.product import Product
 from app.models.review import Review
 from app.models.category import Category
+from app.models.product_stats import ProductStats
+from app.models.deleted_document import DeletedDocument
+
+
+# 高水位向前回退的时间：同步开始前启动、开始后才提交的事务中的修改也能被下一次同步提取到
+SYNC_OVERLAP = timedelta(minutes=5)
+# 同一进程中同时只运行一个同步任务
+_sync_lock = asyncio.Lock()
+# 每次从服务端游标读取的行数（也是生成向量和写入ChromaDB的批大小）
+STREAM_BATCH_SIZE = 256
+# 流水线各阶段之间最多积压的批数
+PIPELINE_DEPTH = 2
+# 全量核对删除时每页读取的向量库文档ID数
+ID_PAGE_SIZE = 1000
 
 
 class KnowledgeBaseService:
@@ -17,51 +41,142 @@ class KnowledgeBaseService:
     """
     
     @staticmethod
-    async def extract_all_products(db: AsyncSession) -> List[Dict]:
+    def product_document(product: Product, category: Optional[Category], stats: Optional[ProductStats]) -> Dict:
         """
-        提取所有商品信息
-        
-        Returns:
-            List[Dict]: 商品信息列表，每个商品包含完整信息
+        构建商品知识文档
         """
-        # 使用category_id关联Category表
-        query = await db.execute(
-            select(Product, Category)
-            .outerjoin(Category, Product.category_id == Category.id)
-            .where(Product.is_active == True)
-        )
-        results = query.all()
+        category_name = category.name if category else "未分类"
+        category_level = category.level if category else 0
+        average_rating = round(stats.average_rating, 2) if stats else 0
+        review_count = stats.rating_count if stats else 0
         
-        products_data = []
-        for product, category in results:
-            # 构建商品知识文档
-            category_name = category.name if category else "未分类"
-            category_level = category.level if category else 0
-            
-            product_doc = {
-                "id": product.id,
-                "type": "product",
-                "name": product.name,
-                "description": product.description or "",
-                "price": product.price,
-                "stock": product.stock,
-                "category": category_name,
-                "category_level": category_level,
-                "view_count": product.view_count,
-                "created_at": str(product.created_at),
-                # 构建完整的文本内容用于Embedding
-                "text": f"""
+        product_doc = {
+            "id": product.id,
+            "type": "product",
+            "name": product.name,
+            "description": product.description or "",
+            "price": product.price,
+            "stock": product.stock,
+            "category": category_name,
+            "category_level": category_level,
+            "view_count": product.view_count,
+            "average_rating": average_rating,
+            "review_count": review_count,
+            "positive_rate": round(stats.positive_rate, 3) if stats else 0,
+            "created_at": str(product.created_at),
+            # 构建完整的文本内容用于Embedding
+            # 库存、浏览量等频繁变化的计数不写入文本（也就不影响内容哈希），否则每次浏览或下单后都要重新生成向量；
+            # 需要实时库存时从数据库读取（见 RAGAgent）
+            "text": f"""
 商品名称：{product.name}
 商品描述：{product.description or '无描述'}
 价格：{product.price}元
 分类：{category_name}
-库存：{product.stock}
-浏览量：{product.view_count}
+评分：{average_rating}星（{review_count}条评价）
+""".strip()
+        }
+        return product_doc
+
+    @staticmethod
+    def review_document(review: Review, product: Product) -> Dict:
+        """
+        构建评论知识文档
+        """
+        review_doc = {
+            "id": review.id,
+            "type": "review",
+            "product_id": review.product_id,
+            "product_name": product.name,
+            "content": review.content,
+            "rating": review.rating,
+            "likes_count": review.likes_count,
+            "dislikes_count": review.dislikes_count,
+            "created_at": str(review.created_at),
+            # 构建完整的文本内容用于Embedding（点赞、点踩数频繁变化，不写入文本）
+            "text": f"""
+商品：{product.name}
+评分：{review.rating}星
+评论内容：{review.content}
 """.strip()
-            }
-            products_data.append(product_doc)
+        }
+        return review_doc
+
+    @staticmethod
+    async def stream_products(db: AsyncSession, since: Optional[datetime] = None,
+                              batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[List[Dict]]:
+        """
+        逐批提取上架商品（服务端游标，不一次加载整张表）
+
+        Args:
+            since: 只提取 since 之后有变化的商品（商品本身、所属分类或评分聚合变化），None 表示全部
+            batch_size: 每批的商品数
+
+        Yields:
+            List[Dict]: 一批商品知识文档
+        """
+        # 使用category_id关联Category表
+        # 评分来自 product_stats 聚合，不需要加载评论
+        query = (
+            select(Product, Category, ProductStats)
+            .outerjoin(Category, Product.category_id == Category.id)
+            .outerjoin(ProductStats, ProductStats.product_id == Product.id)
+            .where(Product.is_active == True)
+        )
+        if since is not None:
+            query = query.where(
+                or_(Product.updated_at > since, Category.updated_at > since, ProductStats.updated_at > since))
+
+        result = await db.stream(query.execution_options(yield_per=batch_size))
+        async for rows in result.partitions():
+            yield [KnowledgeBaseService.product_document(product, category, stats)
+                   for product, category, stats in rows]
+
+    @staticmethod
+    async def stream_reviews(db: AsyncSession, since: Optional[datetime] = None,
+                             batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[List[Dict]]:
+        """
+        逐批提取主评论（服务端游标）
+
+        Args:
+            since: 只提取 since 之后有变化的评论（评论本身变化，或商品名称等信息变化），None 表示全部
+            batch_size: 每批的评论数
+
+        Yields:
+            List[Dict]: 一批评论知识文档
+        """
+        # 只提取主评论（parent_review_id为NULL）
+        query = (
+            select(Review, Product)
+            .join(Product, Review.product_id == Product.id)
+            .where(Review.parent_review_id.is_(None), Product.is_active == True)
+        )
+        if since is not None:
+            query = query.where(or_(Review.updated_at > since, Product.updated_at > since))
+
+        result = await db.stream(query.execution_options(yield_per=batch_size))
+        async for rows in result.partitions():
+            yield [KnowledgeBaseService.review_document(review, product) for review, product in rows]
+
+    @staticmethod
+    async def stream_documents(db: AsyncSession, since: Optional[datetime] = None,
+                               batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[List[Dict]]:
+        """
+        逐批提取商品和评论知识文档（先商品后评论）
+        """
+        async for batch in KnowledgeBaseService.stream_products(db, since, batch_size):
+            yield batch
+        async for batch in KnowledgeBaseService.stream_reviews(db, since, batch_size):
+            yield batch
+
+    @staticmethod
+    async def extract_all_products(db: AsyncSession) -> List[Dict]:
+        """
+        提取所有商品信息
         
-        return products_data
+        Returns:
+            List[Dict]: 商品信息列表，每个商品包含完整信息
+        """
+        return [doc async for batch in KnowledgeBaseService.stream_products(db) for doc in batch]
     
     @staticmethod
     async def extract_all_reviews(db: AsyncSession) -> List[Dict]:
@@ -71,39 +186,7 @@ class KnowledgeBaseService:
         Returns:
             List[Dict]: 评论信息列表
         """
-        # 只提取主评论（parent_review_id为NULL）
-        query = await db.execute(
-            select(Review, Product)
-            .join(Product, Review.product_id == Product.id)
-            .where(Review.parent_review_id.is_(None))
-        )
-        results = query.all()
-        
-        reviews_data = []
-        for review, product in results:
-            # 构建评论知识文档
-            review_doc = {
-                "id": review.id,
-                "type": "review",
-                "product_id": review.product_id,
-                "product_name": product.name,
-                "content": review.content,
-                "rating": review.rating,
-                "likes_count": review.likes_count,
-                "dislikes_count": review.dislikes_count,
-                "created_at": str(review.created_at),
-                # 构建完整的文本内容用于Embedding
-                "text": f"""
-商品：{product.name}
-评分：{review.rating}星
-评论内容：{review.content}
-点赞数：{review.likes_count}
-点踩数：{review.dislikes_count}
-""".strip()
-            }
-            reviews_data.append(review_doc)
-        
-        return reviews_data
+        return [doc async for batch in KnowledgeBaseService.stream_reviews(db) for doc in batch]
     
     @staticmethod
     async def build_knowledge_documents(db: AsyncSession) -> List[Dict]:
@@ -134,3 +217,168 @@ class KnowledgeBaseService:
         """
         return doc.get("text", "")
 
+    @staticmethod
+    async def existing_document_ids(db: AsyncSession, doc_ids: List[str]) -> Set[str]:
+        """
+        doc_ids 中在数据库里仍然存在（商品上架、主评论存在）的文档ID
+        """
+        product_ids, review_ids = set(), set()
+        for doc_id in doc_ids:
+            doc_type, _, raw_id = doc_id.partition(":")
+            if not raw_id.isdigit():
+                continue
+            if doc_type == "product":
+                product_ids.add(int(raw_id))
+            elif doc_type == "review":
+                review_ids.add(int(raw_id))
+
+        existing = set()
+        if product_ids:
+            result = await db.execute(
+                select(Product.id).where(Product.id.in_(product_ids), Product.is_active == True))
+            existing.update(f"product:{product_id}" for product_id in result.scalars())
+        if review_ids:
+            result = await db.execute(
+                select(Review.id)
+                .join(Product, Review.product_id == Product.id)
+                .where(Review.id.in_(review_ids), Review.parent_review_id.is_(None), Product.is_active == True))
+            existing.update(f"review:{review_id}" for review_id in result.scalars())
+        return existing
+
+    @staticmethod
+    async def upsert_stream(batches: AsyncIterator[List[Dict]], vector_store) -> Dict:
+        """
+        流水线写入：读取 -> 比较哈希并生成向量 -> 写入向量库
+        三个阶段并发运行，用有界队列连接（下游慢时上游等待，积压不超过 PIPELINE_DEPTH 批）；
+        向量库调用和模型推理是同步的，在线程中执行，不阻塞事件循环
+
+        Returns:
+            Dict: 候选文档数、写入数
+        """
+        encode_queue = asyncio.Queue(maxsize=PIPELINE_DEPTH)
+        write_queue = asyncio.Queue(maxsize=PIPELINE_DEPTH)
+        counts = {"candidates": 0, "upserted": 0}
+
+        async def read():
+            async for batch in batches:
+                counts["candidates"] += len(batch)
+                await encode_queue.put(batch)
+            await encode_queue.put(None)
+
+        async def encode():
+            while (batch := await encode_queue.get()) is not None:
+                changed = await asyncio.to_thread(vector_store.filter_changed, batch)
+                if changed:
+                    embeddings = await asyncio.to_thread(vector_store.encode_documents, changed)
+                    await write_queue.put((changed, embeddings))
+            await write_queue.put(None)
+
+        async def write():
+            while (item := await write_queue.get()) is not None:
+                documents, embeddings = item
+                await asyncio.to_thread(vector_store.upsert_embeddings, documents, embeddings)
+                counts["upserted"] += len(documents)
+
+        tasks = [asyncio.create_task(stage()) for stage in (read, encode, write)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # 任一阶段失败时停止其他阶段（否则上游会一直等待已满的队列）
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # 关闭读取中断的生成器，释放服务端游标
+            await batches.aclose()
+            raise
+        return counts
+
+    @staticmethod
+    async def delete_removed(db: AsyncSession, vector_store, since: datetime) -> int:
+        """
+        删除 since 之后下架的商品及其评论、删除记录表中的商品和评论（只读取变化，与向量库大小无关）
+        下架会更新 products.updated_at；删除由触发器写入 deleted_documents
+
+        Returns:
+            int: 删除的文档数
+        """
+        doc_ids = set()
+        deleted = await db.execute(
+            select(DeletedDocument.doc_type, DeletedDocument.doc_id).where(DeletedDocument.deleted_at > since))
+        doc_ids.update(f"{doc_type}:{doc_id}" for doc_type, doc_id in deleted.all())
+
+        inactive_products = select(Product.id).where(Product.is_active == False, Product.updated_at > since)
+        result = await db.execute(inactive_products)
+        doc_ids.update(f"product:{product_id}" for product_id in result.scalars())
+        result = await db.execute(
+            select(Review.id).where(Review.product_id.in_(inactive_products), Review.parent_review_id.is_(None)))
+        doc_ids.update(f"review:{review_id}" for review_id in result.scalars())
+
+        if not doc_ids:
+            return 0
+        stale = await asyncio.to_thread(vector_store.filter_existing, sorted(doc_ids))
+        if stale:
+            await asyncio.to_thread(vector_store.delete_documents, stale)
+        return len(stale)
+
+    @staticmethod
+    async def delete_stale(db: AsyncSession, vector_store) -> int:
+        """
+        全量核对：逐页读取向量库中的文档ID，删除数据库中已不存在的文档
+        耗时与向量库大小成正比，只在首次同步或一致性检查时使用
+
+        Returns:
+            int: 删除的文档数
+        """
+        deleted, offset = 0, 0
+        while True:
+            page = await asyncio.to_thread(vector_store.list_ids_page, offset, ID_PAGE_SIZE)
+            if not page:
+                break
+            existing = await KnowledgeBaseService.existing_document_ids(db, page)
+            stale = [doc_id for doc_id in page if doc_id not in existing]
+            if stale:
+                await asyncio.to_thread(vector_store.delete_documents, stale)
+                deleted += len(stale)
+            if len(page) < ID_PAGE_SIZE:
+                break
+            # 本页删除的文档不再占位，下一页从保留的文档之后开始
+            offset += len(page) - len(stale)
+        return deleted
+
+    @staticmethod
+    async def sync(db: AsyncSession, vector_store, rebuild: bool = False, full_scan: bool = False) -> Dict:
+        """
+        增量同步知识库：只为新增或内容变化的文档生成向量并 upsert，删除已不存在的文档
+        向量库从未同步过（或重建）时提取全部文档
+
+        Args:
+            db: 数据库会话
+            vector_store: 向量数据库服务
+            rebuild: 是否先清空集合再全量同步
+            full_scan: 是否逐个核对向量库中的文档（一致性检查，弥补删除记录清理前未同步的情况）
+
+        Returns:
+            Dict: 候选文档数、写入数、删除数
+        """
+        async with _sync_lock:
+            # 重建也在锁内清空集合：否则正在运行的增量同步会把少量文档和它的高水位写进新集合，
+            # 之后的同步都按这个高水位增量提取，其余文档再也不会写入
+            if rebuild:
+                await asyncio.to_thread(vector_store.reset_collection)
+            # 数据库时间（与 updated_at 同为不带时区的本地时间），作为下一次同步的高水位
+            started_at = (await db.execute(select(func.localtimestamp()))).scalar_one()
+            watermark = None if rebuild else await asyncio.to_thread(vector_store.get_watermark)
+            since = watermark - SYNC_OVERLAP if watermark is not None else None
+
+            counts = await KnowledgeBaseService.upsert_stream(
+                KnowledgeBaseService.stream_documents(db, since), vector_store)
+            if since is None or full_scan:
+                deleted = await KnowledgeBaseService.delete_stale(db, vector_store)
+            else:
+                deleted = await KnowledgeBaseService.delete_removed(db, vector_store, since)
+
+            await asyncio.to_thread(vector_store.set_watermark, started_at)
+            # 高水位写入之后再清理删除记录：下一次同步只读取 started_at - SYNC_OVERLAP 之后的记录
+            await db.execute(delete(DeletedDocument).where(DeletedDocument.deleted_at <= started_at - SYNC_OVERLAP))
+            await db.commit()
+            return {**counts, "deleted": deleted}
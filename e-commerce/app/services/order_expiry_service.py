@@ -0,0 +1,83 @@
+"""
+超时未支付订单清理
+待支付订单占用着下单时扣减的库存，超过 ORDER_PAYMENT_TIMEOUT 仍未支付时自动取消并归还库存：
+  - 每批用 FOR UPDATE SKIP LOCKED 领取订单，多个进程可以同时清理，也不会与正在支付/取消的订单冲突
+  - 一批订单的所有订单项合并成一条 UPDATE ... FROM (VALUES ...) 归还库存
+"""
+import asyncio
+from datetime import timedelta
+
+from sqlalchemy import func, update
+from sqlalchemy.future import select
+
+from app.models.order import Order, OrderStatus
+from app.config.settings import settings
+from app.database.session import AsyncSessionLocal, transaction
+from app.services.order_service import OrderService
+
+
+class OrderExpiryService:
+  @staticmethod
+  async def sweep_batch() -> dict:
+    """
+    取消一批超时未支付的订单
+
+    Returns:
+      {"orders": 取消的订单数, "units": 归还的商品件数}
+    """
+    expired = (
+      select(Order.id)
+      .where(
+        Order.order_status == OrderStatus.pending,
+        Order.created_at < func.now() - timedelta(seconds=settings.ORDER_PAYMENT_TIMEOUT))
+      .order_by(Order.id)
+      .limit(settings.ORDER_EXPIRY_BATCH_SIZE)
+      .with_for_update(skip_locked=True)
+    )
+    async with transaction() as tx:
+      canceled = (await tx.execute(
+        update(Order)
+        .where(Order.id.in_(expired))
+        .values(order_status=OrderStatus.canceled, updated_at=func.now())
+        .returning(Order.id)
+        .execution_options(synchronize_session=False)
+      )).scalars().all()
+      if not canceled:
+        return {"orders": 0, "units": 0}
+      released = await OrderService.release_order_stock(tx, canceled)
+
+    async with AsyncSessionLocal() as db:
+      await OrderService.finish_cancellation(db, released)
+    return {"orders": len(canceled), "units": released["units"]}
+
+  @staticmethod
+  async def sweep() -> dict:
+    """
+    清理所有超时订单（按批次执行直到没有剩余）
+
+    Returns:
+      本次运行取消的订单数和归还的商品件数
+    """
+    report = {"orders": 0, "units": 0}
+    while True:
+      batch = await OrderExpiryService.sweep_batch()
+      report["orders"] += batch["orders"]
+      report["units"] += batch["units"]
+      if batch["orders"] < settings.ORDER_EXPIRY_BATCH_SIZE:
+        return report
+
+
+async def run_order_expiry_sweeper():
+  """
+  定期清理超时订单（在应用生命周期内作为后台任务运行）
+  """
+  while True:
+    await asyncio.sleep(settings.ORDER_EXPIRY_SWEEP_INTERVAL)
+    try:
+      report = await OrderExpiryService.sweep()
+      if report["orders"]:
+        print(f"超时订单清理: 取消 {report['orders']} 个订单，归还 {report['units']} 件库存")
+    except asyncio.CancelledError:
+      raise
+    except Exception as e:
+      print(f"超时订单清理失败: {e}")
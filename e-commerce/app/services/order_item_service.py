@@ -1,137 +1,158 @@
-from sqlalchemy import update, delete
+from typing import List, Optional
+
+from sqlalchemy import delete
 from fastapi import HTTPException, status
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.schemas.user import Role
 from app.models.order import Order
 from sqlalchemy.future import select
-from app.models.product import Product
 from app.models.cart_item import CartItem
 from app.models.order_item import OrderItem
 from app.services.order_service import OrderService
-from app.services.email_service import EmailService
-from app.utils.distributed_lock import DistributedLock
+from app.services.product_service import ProductService
+from app.services.outbox_service import OutboxService, ORDER_PLACED
+from app.database.session import AsyncSessionLocal, transaction
+from app.services.inventory_service import InventoryService
+from app.services.inventory_ledger_service import InventoryLedgerService
+from app.services.redis_cart_service import RedisCartService, CartLine
+from app.config.settings import settings
+from app.utils.cache import invalidate_tags, product_tags
 
 
-class OrderItemService:
-  async def create_order_item(db: AsyncSession, current_user):
-    result = await db.execute(
-      select(CartItem, Product)
-      .join(Product, CartItem.product_id == Product.id)
-      .filter(CartItem.user_id == current_user.id))
+# 并发下单的事务可能因加锁顺序不同而死锁，由数据库检测后重试
+CHECKOUT_RETRIES = 3
+DEADLOCK_SQLSTATES = ("40P01", "40001")
 
-    cart_items = result.all()
 
-    if not cart_items:
+class OrderItemService:
+  @staticmethod
+  async def checkout(tx: AsyncSession, user_id: int, cart_lines: Optional[List[CartLine]] = None):
+    """
+    在一个事务内完成下单：取走购物车、原子预留库存、创建订单和订单项
+
+    Args:
+      tx: 事务中的数据库会话（见 app.database.session.transaction）
+      user_id: 下单用户ID
+      cart_lines: 已从Redis购物车取走的商品；为 None 时从 cart_items 取
+
+    Returns:
+      (订单, 订单项列表, 预留结果)
+    """
+    # 1. 删除并取回购物车：同一用户的并发下单会在这些行上排队，后到的请求看到空购物车
+    #    Redis购物车已在事务外原子取走，这里只删除尚未回写的持久化副本
+    cart_result = await tx.execute(
+      delete(CartItem)
+      .where(CartItem.user_id == user_id)
+      .returning(CartItem.product_id, CartItem.quantity, CartItem.price))
+    if cart_lines is None:
+      cart_lines = cart_result.all()
+
+    if not cart_lines:
       raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart is empty")
 
-    # 使用分布式锁保护整个订单创建过程，防止并发问题
-    lock_key = f"order:create:{current_user.id}"
-    lock = DistributedLock(lock_key, timeout=30, retry_times=5, retry_delay=0.2)
-    
-    if not await lock.acquire():
-      raise HTTPException(
-        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-        detail="Another order is being processed. Please try again later.")
-    
+    quantities = {}
+    for line in cart_lines:
+      quantities[line.product_id] = quantities.get(line.product_id, 0) + line.quantity
+
+    # 2. 普通商品：一条语句预留库存，库存不足时抛出异常，事务回滚（购物车也会恢复）
+    flash_ids = await InventoryLedgerService.flash_products(quantities)
+    ledger_quantities = {product_id: quantities[product_id] for product_id in flash_ids}
+    reserved = await InventoryService.reserve_stock(
+      tx, {product_id: qty for product_id, qty in quantities.items() if product_id not in ledger_quantities})
+
+    # 3. 秒杀商品的价格和商家从商品快照读取
+    snapshots = {}
+    if ledger_quantities:
+      snapshots = await ProductService.get_products_by_ids(tx, list(ledger_quantities))
+      missing = [product_id for product_id in ledger_quantities if product_id not in snapshots]
+      if missing:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Product {missing[0]} not found")
+      for product_id, snapshot in snapshots.items():
+        reserved[product_id] = {"stock": None, "price": snapshot.price, "category_id": snapshot.category_id,
+                                "vendor_id": snapshot.vendor_id, "ledger": True}
+
+    # 4. 订单和订单项在提交时一起写入（订单项通过关系关联订单，不需要先取得订单ID）
+    order = await OrderService.create_order(tx, user_id, 0)
+    order_items = [
+      OrderItem(
+        order=order,
+        product_id=line.product_id,
+        vendor_id=reserved[line.product_id]["vendor_id"],
+        quantity=line.quantity,
+        price=line.price)
+
+      for line in cart_lines
+    ]
+    tx.add_all(order_items)
+
+    # 5. 秒杀商品：在Redis台账中原子预留（预留记录按订单ID登记，需要先写入订单）
+    #    放在最后，失败时前面的数据库修改随事务回滚
+    if ledger_quantities:
+      await tx.flush([order])
+      await InventoryLedgerService.reserve(order.id, ledger_quantities)
+
+    order.total_amount = sum(reserved[product_id]["price"] * quantity for product_id, quantity in quantities.items())
+    return order, order_items, reserved
+
+  @staticmethod
+  async def create_order_item(db: AsyncSession, current_user):
+    # Redis购物车：先原子取走，下单失败时放回
+    cart_lines = await RedisCartService.take(current_user.id) if settings.CART_BACKEND == "redis" else None
     try:
-      # 重新查询购物车和商品，确保获取最新数据
-      result = await db.execute(
-        select(CartItem, Product)
-        .join(Product, CartItem.product_id == Product.id)
-        .filter(CartItem.user_id == current_user.id))
-      
-      cart_items = result.all()
-      
-      if not cart_items:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart is empty")
-
-      order = await OrderService.create_order(db, current_user)
-
-      # 为每个商品获取分布式锁，保护库存扣减
-      for cart_item, product in cart_items:
-        product_lock_key = f"product:stock:{product.id}"
-        product_lock = DistributedLock(product_lock_key, timeout=10, retry_times=3, retry_delay=0.1)
-        
-        if not await product_lock.acquire():
-          raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail=f"Product {product.id} is being processed. Please try again later.")
-        
+      for attempt in range(CHECKOUT_RETRIES):
+        order, reserved = None, {}
         try:
-          # 重新查询商品库存，确保获取最新数据
-          product_query = await db.execute(
-            select(Product).where(Product.id == product.id)
-          )
-          current_product = product_query.scalars().first()
-          
-          if not current_product:
-            raise HTTPException(
-              status_code=status.HTTP_404_NOT_FOUND,
-              detail=f"Product {product.id} not found")
-          
-          if current_product.stock < cart_item.quantity:
-            raise HTTPException(
-              status_code=status.HTTP_400_BAD_REQUEST,
-              detail=f"Insufficient stock for product {product.id}. Available: {current_product.stock}, Requested: {cart_item.quantity}")
-
-          new_stock = current_product.stock - cart_item.quantity
-          is_active = False if new_stock == 0 else current_product.is_active
-
-          await db.execute(
-            update(Product)
-            .where(Product.id == current_product.id)
-            .values(stock=new_stock, is_active=is_active))
-        finally:
-          await product_lock.release()
-
-      order_items = [
-        OrderItem(
-          order_id=order.id,
-          product_id=cart_item.product_id,
-          quantity=cart_item.quantity,
-          price=cart_item.price)
-
-        for cart_item, _ in cart_items
+          # 购物车、库存、订单和订单项在同一个事务中提交（每次下单只提交一次）
+          async with transaction() as tx:
+            order, order_items, reserved = await OrderItemService.checkout(tx, current_user.id, cart_lines)
+            # 下单邮件随订单一起提交到发件箱，由后台分发，请求路径不等待SMTP或消息代理
+            OutboxService.enqueue(tx, ORDER_PLACED, {"email": current_user.email})
+          break
+        except DBAPIError as e:
+          # 提交失败：归还秒杀商品在Redis中的预留
+          await OrderItemService._release_ledger(order, reserved)
+          sqlstate = getattr(e.orig, "sqlstate", None) or getattr(e.orig, "pgcode", None)
+          if sqlstate not in DEADLOCK_SQLSTATES or attempt == CHECKOUT_RETRIES - 1:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                                detail="Database error")
+    except BaseException:
+      if cart_lines:
+        await RedisCartService.restore(current_user.id, cart_lines)
+      raise
+
+    # 库存已变化，失效相关商品列表/搜索缓存（秒杀商品的数据库库存由对账任务写回，届时再失效）
+    db_reserved = {product_id: item for product_id, item in reserved.items() if not item.get("ledger")}
+    if db_reserved:
+      await invalidate_tags(*product_tags(*{item["category_id"] for item in db_reserved.values()}))
+      await ProductService.invalidate_products(*db_reserved)
+
+    # 返回订单ID和订单项列表，方便前端使用
+    return {
+      "order_id": order.id,
+      "total_amount": order.total_amount,
+      "order_status": order.order_status.value,
+      "order_items": [
+        {
+          "id": item.id,
+          "order_id": item.order_id,
+          "product_id": item.product_id,
+          "quantity": item.quantity,
+          "price": item.price
+        }
+        for item in order_items
       ]
-      db.add_all(order_items)
-
-      await db.execute(delete(CartItem).where(CartItem.user_id == current_user.id))
-
-      try:
-        await db.commit()
-      except SQLAlchemyError:
-        await db.rollback()
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                            detail="Database error")
-
-      # 使用Celery异步发送邮件
-      try:
-        from app.tasks.email_tasks import send_order_placement_email
-        send_order_placement_email.delay(current_user.email)
-      except Exception:
-        # 如果Celery不可用，同步发送（降级处理）
-        await EmailService.order_placement_message(current_user.email)
-      
-      # 返回订单ID和订单项列表，方便前端使用
-      return {
-        "order_id": order.id,
-        "total_amount": order.total_amount,
-        "order_status": order.order_status.value,
-        "order_items": [
-          {
-            "id": item.id,
-            "order_id": item.order_id,
-            "product_id": item.product_id,
-            "quantity": item.quantity,
-            "price": item.price
-          }
-          for item in order_items
-        ]
-      }
-    finally:
-      await lock.release()
+    }
+
+  @staticmethod
+  async def _release_ledger(order, reserved: dict):
+    """
+    下单事务失败时归还秒杀商品的预留（事务会话已不可用，使用新的会话）
+    """
+    if order is not None and any(item.get("ledger") for item in reserved.values()):
+      async with AsyncSessionLocal() as db:
+        await InventoryLedgerService.release(db, order.id)
 
   @staticmethod
   async def get_order_item_by_id(db: AsyncSession, order_item_id: int, current_user):
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import List
 
 from sqlalchemy import func, and_
 from sqlalchemy.future import select
@@ -7,30 +8,64 @@ from sqlalchemy.orm import selectinload
 from fastapi import HTTPException, status, Depends
 
 from app.schemas.user import Role
-from app.models.product import Product
 from app.models.order import OrderStatus
 from app.models.cart_item import CartItem
-from app.schemas.order import OrderResponse, OrderItemResponse
+from app.schemas.order import OrderResponse, OrderItemResponse, OrderFilter
 from app.utils.token import get_current_user
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.utils.cache import invalidate_tags, product_tags
+from app.services.product_service import ProductService
+from app.services.inventory_service import InventoryService
+from app.services.inventory_ledger_service import InventoryLedgerService
+from app.database.session import transaction
 from app.models import Order, User, OrderItem
 
 
 class OrderService:
   @staticmethod
-  async def create_order(db, current_user):
-    total_amount = await db.execute(
-      select(func.sum(CartItem.quantity * Product.price)).join(Product, CartItem.product_id == Product.id)
-      .where(CartItem.user_id == current_user.id))
-
-    total_amount = total_amount.scalar()
-    order_data = {"total_amount": total_amount, "user_id": current_user.id}
-    order = Order(**order_data)
-
+  async def create_order(db, user_id: int, total_amount: float):
+    """
+    创建待支付订单（在下单事务中调用，提交时与订单项一起写入）
+    """
+    order = Order(total_amount=total_amount, user_id=user_id, order_status=OrderStatus.pending)
     db.add(order)
-    await db.commit()
-    await db.refresh(order)
     return order
 
+  @staticmethod
+  async def release_order_stock(tx: AsyncSession, order_ids: List[int]) -> dict:
+    """
+    订单取消时归还所有订单项的库存（在取消订单的事务中调用）
+    多个订单的订单项合并成一条 UPDATE ... FROM (VALUES ...)；秒杀商品的库存在Redis台账中，
+    提交后由 finish_cancellation 归还
+
+    Returns:
+      {"restored": 被更新的商品, "units": 归还的件数, "ledger_orders": 有台账预留的订单ID}
+    """
+    ledger_items = await InventoryLedgerService.reserved_items(order_ids)
+    result = await tx.execute(
+      select(OrderItem.order_id, OrderItem.product_id, OrderItem.quantity)
+      .where(OrderItem.order_id.in_(order_ids)))
+
+    quantities, units = {}, 0
+    for order_id, product_id, quantity in result.all():
+      units += quantity
+      if product_id not in ledger_items.get(order_id, {}):
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    restored = await InventoryService.release_stock(tx, quantities)
+    return {"restored": restored, "units": units, "ledger_orders": list(ledger_items)}
+
+  @staticmethod
+  async def finish_cancellation(db: AsyncSession, released: dict):
+    """
+    取消事务提交后：归还台账预留，失效库存变化的商品缓存
+    """
+    for order_id in released["ledger_orders"]:
+      await InventoryLedgerService.release(db, order_id)
+    restored = released["restored"]
+    if restored:
+      await invalidate_tags(*product_tags(*{row["category_id"] for row in restored}))
+      await ProductService.invalidate_products(*{row["id"] for row in restored})
+
   @staticmethod
   async def get_order_by_id(
           order_id: int,
@@ -76,20 +111,13 @@ class OrderService:
     
     # 如果是商家，检查订单是否包含该商家的商品
     if current_user.role == Role.vendor:
-      # 查询该订单中属于该商家的商品ID列表
-      vendor_products_query = await db.execute(
-        select(Product.id)
-        .where(Product.vendor_id == current_user.id)
-      )
-      vendor_product_ids = {row[0] for row in vendor_products_query.all()}
-      
-      # 查询订单中是否有该商家的商品
+      # 订单项中记录了商家ID，直接按 (vendor_id, order_id) 索引查询
       order_items_query = await db.execute(
         select(OrderItem)
         .where(
           and_(
-            OrderItem.order_id == order_id,
-            OrderItem.product_id.in_(vendor_product_ids)
+            OrderItem.vendor_id == current_user.id,
+            OrderItem.order_id == order_id
           )
         )
       )
@@ -129,29 +157,24 @@ class OrderService:
           db: AsyncSession,
           current_user: User = Depends(get_current_user)):
 
-    query = await db.execute(select(Order).filter(Order.id == order_id))
-    order = query.scalars().first()
+    # 状态检查、取消和归还库存在同一个事务中完成；锁住订单行，与支付、超时取消互斥
+    async with transaction() as tx:
+      query = await tx.execute(select(Order).filter(Order.id == order_id).with_for_update())
+      order = query.scalars().first()
 
-    if not order:
-      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
-    
-    if order.user_id != current_user.id and not current_user.role == Role.admin:
-      raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+      if not order:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
 
-    if order.order_status == OrderStatus.canceled:
-      raise HTTPException(status_code=status.HTTP_409_CONFLICT,detail="Order already cancelled")
+      if order.user_id != current_user.id and not current_user.role == Role.admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
 
-    order.order_status=OrderStatus.canceled
+      if order.order_status == OrderStatus.canceled:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,detail="Order already cancelled")
 
-    order_item = await db.execute(select(OrderItem).filter(OrderItem.order_id == order_id))
-    order_item = order_item.scalars().first()
-    product = await db.execute(select(Product).filter(Product.id == order_item.product_id))
-    product = product.scalars().first()
-    product.stock = product.stock + order_item.quantity
+      order.order_status=OrderStatus.canceled
+      released = await OrderService.release_order_stock(tx, [order_id])
 
-    await db.commit()
-    await db.refresh(order)
-    await db.refresh(product)
+    await OrderService.finish_cancellation(db, released)
     return {"message":"Order canceled successfully"}
   
   @staticmethod
@@ -219,6 +242,15 @@ class OrderService:
     # 只有商家可以发货（vendor角色）
     if not current_vendor.role == Role.vendor:
       raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only vendors can ship orders")
+
+    # 订单中必须有该商家的商品
+    vendor_item = await db.execute(
+      select(OrderItem.id)
+      .where(OrderItem.vendor_id == current_vendor.id, OrderItem.order_id == order_id)
+      .limit(1)
+    )
+    if vendor_item.first() is None:
+      raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
     
     # 只能对已支付的订单进行发货
     if order.order_status != OrderStatus.paid:
@@ -265,171 +297,94 @@ class OrderService:
     return {"message":"Order status updated successfully"}
 
   @staticmethod
-  async def list_orders(
-          db: AsyncSession,
-          current_user: User = Depends(get_current_user)):
+  async def _list_orders_page(db: AsyncSession, current_user, filters: OrderFilter, conditions: list):
+    """
+    游标分页的订单列表，一条SQL同时取出一页订单和它们的订单项：
+      先按 id 倒序取 size + 1 个订单（主键索引，代价与总订单数无关），再左连接订单项
+    商家只能看到包含自己商品的订单和其中自己的订单项，按 order_items.vendor_id 过滤（索引覆盖）
+    响应直接由结果行构建，不加载ORM对象
+    """
+    if filters.cursor:
+      _, last_id, _ = decode_cursor(filters.cursor, "id")
+      conditions.append(Order.id < last_id)
 
-    if current_user.role == Role.admin:
-      # 管理员可以查看所有订单
-      query = await db.execute(
-        select(Order)
-        .options(selectinload(Order.order_items))
-      )
-      orders = query.scalars().all()
-    elif current_user.role == Role.vendor:
-      # 商家可以查看包含他们商品的所有订单
-      query = await db.execute(
-        select(Order)
-        .options(selectinload(Order.order_items))
-        .join(OrderItem, OrderItem.order_id == Order.id)
-        .join(Product, OrderItem.product_id == Product.id)
-        .where(Product.vendor_id == current_user.id)
-        .distinct()
-      )
-      orders = query.scalars().all()
-    else:
-      # 普通用户只能查看自己的订单
-      query = await db.execute(
-        select(Order)
-        .options(selectinload(Order.order_items))
-        .filter(Order.user_id == current_user.id)
-        .where(Order.order_status != OrderStatus.canceled)
+    items = OrderItem.__table__
+    if current_user.role == Role.vendor:
+      vendor_items = (
+        select(OrderItem.id, OrderItem.order_id, OrderItem.product_id, OrderItem.quantity, OrderItem.price)
+        .where(OrderItem.vendor_id == current_user.id)
       )
-      orders = query.scalars().all()
+      conditions.append(vendor_items.where(OrderItem.order_id == Order.id).exists())
+      items = vendor_items.subquery()
+    elif current_user.role != Role.admin:
+      conditions.append(Order.user_id == current_user.id)
+
+    page = (
+      select(Order.id, Order.total_amount, Order.order_status, Order.tracking_number,
+             Order.created_at, Order.updated_at)
+      .where(*conditions)
+      .order_by(Order.id.desc())
+      .limit(filters.size + 1)
+      .subquery()
+    )
+    rows = await db.execute(
+      select(page, items.c.id.label("item_id"), items.c.product_id, items.c.quantity, items.c.price)
+      .outerjoin(items, items.c.order_id == page.c.id)
+      .order_by(page.c.id.desc(), items.c.id)
+    )
 
-    if not orders:
-      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+    orders = []
+    for row in rows:
+      if not orders or orders[-1]["id"] != row.id:
+        orders.append({
+          "id": row.id,
+          "total_amount": row.total_amount,
+          "order_status": row.order_status.value,
+          "tracking_number": row.tracking_number,
+          "created_at": row.created_at,
+          "updated_at": row.updated_at,
+          "order_items": []
+        })
+      if row.item_id is not None:
+        orders[-1]["order_items"].append({
+          "id": row.item_id,
+          "order_id": row.id,
+          "product_id": row.product_id,
+          "quantity": row.quantity,
+          "price": row.price
+        })
+
+    has_more = len(orders) > filters.size
+    orders = orders[:filters.size]
+    next_cursor = encode_cursor("id", orders[-1]["id"], orders[-1]["id"], "next") if has_more else None
+    return {"items": orders, "size": filters.size, "next_cursor": next_cursor}
 
-    # 构建订单响应列表
-    result = []
-    for order in orders:
-      if current_user.role == Role.vendor:
-        # 商家只看到自己的订单项
-        vendor_product_ids_query = await db.execute(
-          select(Product.id).where(Product.vendor_id == current_user.id)
-        )
-        vendor_product_ids = {row[0] for row in vendor_product_ids_query.all()}
-        
-        order_items = [
-          OrderItemResponse(
-            id=item.id,
-            order_id=item.order_id,
-            product_id=item.product_id,
-            quantity=item.quantity,
-            price=item.price
-          )
-          for item in order.order_items
-          if item.product_id in vendor_product_ids
-        ] if order.order_items else None
-      else:
-        # 用户和管理员看到所有订单项
-        order_items = [
-          OrderItemResponse(
-            id=item.id,
-            order_id=item.order_id,
-            product_id=item.product_id,
-            quantity=item.quantity,
-            price=item.price
-          )
-          for item in order.order_items
-        ] if order.order_items else None
-      
-      order_response = OrderResponse(
-        id=order.id,
-        total_amount=order.total_amount,
-        order_status=order.order_status,
-        tracking_number=order.tracking_number,
-        created_at=order.created_at,
-        updated_at=order.updated_at,
-        order_items=order_items
-      )
-      result.append(order_response)
+  @staticmethod
+  async def list_orders(
+          db: AsyncSession,
+          current_user: User = Depends(get_current_user),
+          filters: OrderFilter = None):
+    """
+    订单列表：管理员查看所有订单，商家查看包含其商品的订单，普通用户查看自己未取消的订单
+    """
+    filters = filters or OrderFilter()
+    conditions = []
+    if current_user.role not in (Role.admin, Role.vendor):
+      conditions.append(Order.order_status != OrderStatus.canceled)
 
+    result = await OrderService._list_orders_page(db, current_user, filters, conditions)
+    if not result["items"] and not filters.cursor:
+      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
     return result
 
   @staticmethod
-  async def get_order_by_status(order_status, current_user, db):
-    if current_user.role == Role.admin:
-      # 管理员可以查看所有状态的订单
-      query = await db.execute(
-        select(Order)
-        .options(selectinload(Order.order_items))
-        .filter(Order.order_status == order_status)
-      )
-      orders = query.scalars().all()
-    elif current_user.role == Role.vendor:
-      # 商家可以查看包含他们商品的指定状态订单
-      query = await db.execute(
-        select(Order)
-        .options(selectinload(Order.order_items))
-        .join(OrderItem, OrderItem.order_id == Order.id)
-        .join(Product, OrderItem.product_id == Product.id)
-        .where(
-          and_(
-            Order.order_status == order_status,
-            Product.vendor_id == current_user.id
-          )
-        )
-        .distinct()
-      )
-      orders = query.scalars().all()
-    else:
-      # 普通用户只能查看自己指定状态的订单
-      query = await db.execute(
-        select(Order)
-        .options(selectinload(Order.order_items))
-        .filter(
-          and_(
-            Order.order_status == order_status,
-            Order.user_id == current_user.id
-          )
-        )
-      )
-      orders = query.scalars().all()
-    
-    # 构建订单响应列表
-    result = []
-    for order in orders:
-      if current_user.role == Role.vendor:
-        # 商家只看到自己的订单项
-        vendor_product_ids_query = await db.execute(
-          select(Product.id).where(Product.vendor_id == current_user.id)
-        )
-        vendor_product_ids = {row[0] for row in vendor_product_ids_query.all()}
-        
-        order_items = [
-          OrderItemResponse(
-            id=item.id,
-            order_id=item.order_id,
-            product_id=item.product_id,
-            quantity=item.quantity,
-            price=item.price
-          )
-          for item in order.order_items
-          if item.product_id in vendor_product_ids
-        ] if order.order_items else None
-      else:
-        # 用户和管理员看到所有订单项
-        order_items = [
-          OrderItemResponse(
-            id=item.id,
-            order_id=item.order_id,
-            product_id=item.product_id,
-            quantity=item.quantity,
-            price=item.price
-          )
-          for item in order.order_items
-        ] if order.order_items else None
-      
-      order_response = OrderResponse(
-        id=order.id,
-        total_amount=order.total_amount,
-        order_status=order.order_status,
-        tracking_number=order.tracking_number,
-        created_at=order.created_at,
-        updated_at=order.updated_at,
-        order_items=order_items
-      )
-      result.append(order_response)
-    
-    return result
\ No newline at end of file
+  async def get_order_by_status(order_status, current_user, db, filters: OrderFilter = None):
+    try:
+      order_status = OrderStatus(order_status)
+    except ValueError:
+      raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Invalid order status: {order_status}")
+
+    return await OrderService._list_orders_page(
+      db, current_user, filters or OrderFilter(), [Order.order_status == order_status])
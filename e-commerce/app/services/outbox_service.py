@@ -0,0 +1,193 @@
+"""
+事务外发件箱（transactional outbox）
+业务事务中只写入一行 outbox 记录，提交后由后台分发任务批量投递到 Celery：
+  - 事件与业务数据同时提交或同时回滚，不会丢失，也不会为回滚的订单发邮件
+  - 请求路径上不再连接 SMTP 或消息代理
+  - 分发为"至少一次"：投递后提交前进程退出会重复投递，
+    因此以幂等键作为 Celery task_id，消费端按幂等键去重（见 app/tasks/email_tasks.py）
+分发分三步，投递时不持有事务和行锁：
+  1. 短事务领取一批事件（FOR UPDATE SKIP LOCKED），把 available_at 推后一个租约并计入投递次数后提交；
+     多个进程同时分发时领取不同的批次，进程在投递中途退出时租约到期后重新领取
+  2. 在事务之外逐个投递
+  3. 短事务记录结果：成功的标记为已投递，失败的按指数退避稍后重试，
+     达到 OUTBOX_MAX_ATTEMPTS 的标记为死信（dead_at）并记录日志，不再投递
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import timedelta
+from typing import Optional
+
+from sqlalchemy import delete, func, update
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.outbox_event import OutboxEvent
+from app.config.settings import settings
+from app.database.session import transaction
+
+
+logger = logging.getLogger(__name__)
+
+# 事件类型 -> Celery任务名，payload 作为任务的关键字参数
+ORDER_PLACED = "order.placed"
+PAYMENT_COMPLETED = "payment.completed"
+EVENT_TASKS = {
+  ORDER_PLACED: "send_order_placement_email",
+  PAYMENT_COMPLETED: "send_payment_confirmation_email",
+}
+# 重试退避：2^attempts 秒，最长10分钟
+MAX_RETRY_DELAY = 600
+# 已投递事件保留时间，之后清理
+DISPATCHED_RETENTION = timedelta(days=7)
+PURGE_BATCH_SIZE = 1000
+PURGE_INTERVAL = 3600
+
+
+class OutboxService:
+  @staticmethod
+  def enqueue(db: AsyncSession, event_type: str, payload: dict, idempotency_key: Optional[str] = None) -> OutboxEvent:
+    """
+    在当前事务中登记一个事件（随事务提交，不单独 flush）
+
+    Args:
+      db: 事务中的数据库会话
+      event_type: 事件类型（EVENT_TASKS 的键）
+      payload: 事件数据（Celery任务的关键字参数）
+      idempotency_key: 幂等键，默认随机生成
+    """
+    if event_type not in EVENT_TASKS:
+      raise ValueError(f"Unknown outbox event type: {event_type}")
+    event = OutboxEvent(
+      event_type=event_type,
+      payload=payload,
+      idempotency_key=idempotency_key or f"{event_type}:{uuid.uuid4().hex}")
+    db.add(event)
+    return event
+
+  @staticmethod
+  def _publish(event_type: str, payload: dict, idempotency_key: str):
+    from app.celery_app import celery_app
+    celery_app.send_task(
+      EVENT_TASKS[event_type],
+      kwargs={**payload, "event_key": idempotency_key},
+      task_id=idempotency_key)
+
+  @staticmethod
+  async def _claim() -> list:
+    """
+    领取一批到期的事件：推后 available_at 一个租约、投递次数 +1，提交后释放行锁
+    """
+    async with transaction() as tx:
+      due = (
+        select(OutboxEvent.id)
+        .where(
+          OutboxEvent.dispatched_at.is_(None),
+          OutboxEvent.dead_at.is_(None),
+          OutboxEvent.available_at <= func.now())
+        .order_by(OutboxEvent.available_at, OutboxEvent.id)
+        .limit(settings.OUTBOX_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+      )
+      result = await tx.execute(
+        update(OutboxEvent)
+        .where(OutboxEvent.id.in_(due))
+        .values(attempts=OutboxEvent.attempts + 1,
+                available_at=func.now() + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS))
+        .returning(OutboxEvent.id, OutboxEvent.event_type, OutboxEvent.payload,
+                   OutboxEvent.idempotency_key, OutboxEvent.attempts)
+        .execution_options(synchronize_session=False)
+      )
+      return result.all()
+
+  @staticmethod
+  async def dispatch_batch() -> int:
+    """
+    领取一批到期的事件并投递，成功的标记为已投递，失败的按指数退避稍后重试，
+    达到最大投递次数的标记为死信
+
+    Returns:
+      本批领取的事件数
+    """
+    events = await OutboxService._claim()
+    if not events:
+      return 0
+
+    dispatched, failed = [], []
+    for event in events:
+      try:
+        # Celery 的发送是同步网络调用，放到线程中执行，不阻塞事件循环
+        await asyncio.to_thread(OutboxService._publish, event.event_type, event.payload, event.idempotency_key)
+        dispatched.append(event.id)
+      except Exception as e:
+        failed.append((event, str(e)[:1000]))
+
+    async with transaction() as tx:
+      if dispatched:
+        await tx.execute(
+          update(OutboxEvent)
+          .where(OutboxEvent.id.in_(dispatched))
+          .values(dispatched_at=func.now())
+          .execution_options(synchronize_session=False))
+      for event, error in failed:
+        values = {"last_error": error}
+        if event.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+          values["dead_at"] = func.now()
+          logger.error("Outbox event %s (%s) dead after %s attempts: %s",
+                       event.id, event.event_type, event.attempts, error)
+        else:
+          values["available_at"] = func.now() + timedelta(seconds=min(2 ** event.attempts, MAX_RETRY_DELAY))
+        await tx.execute(
+          update(OutboxEvent)
+          .where(OutboxEvent.id == event.id)
+          .values(**values)
+          .execution_options(synchronize_session=False))
+    return len(events)
+
+  @staticmethod
+  async def stats(db: AsyncSession) -> dict:
+    """
+    待投递和死信事件数（死信需要人工处理：修复后把 dead_at、attempts 清空即可重新投递）
+    """
+    result = await db.execute(
+      select(
+        func.count().filter(OutboxEvent.dispatched_at.is_(None), OutboxEvent.dead_at.is_(None)),
+        func.count().filter(OutboxEvent.dead_at.isnot(None)))
+      .select_from(OutboxEvent))
+    pending, dead = result.one()
+    return {"pending": pending, "dead": dead}
+
+  @staticmethod
+  async def purge_dispatched() -> int:
+    """
+    分批删除超过保留期的已投递事件
+    """
+    async with transaction() as tx:
+      expired = (
+        select(OutboxEvent.id)
+        .where(OutboxEvent.dispatched_at < func.now() - DISPATCHED_RETENTION)
+        .limit(PURGE_BATCH_SIZE)
+      )
+      result = await tx.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(expired)))
+    return result.rowcount
+
+
+async def run_outbox_dispatcher():
+  """
+  持续投递发件箱事件（在应用生命周期内作为后台任务运行）
+  """
+  next_purge = time.monotonic() + PURGE_INTERVAL
+  while True:
+    try:
+      # 满批说明还有积压，立即继续
+      if await OutboxService.dispatch_batch() >= settings.OUTBOX_BATCH_SIZE:
+        continue
+      if time.monotonic() >= next_purge:
+        await OutboxService.purge_dispatched()
+        next_purge = time.monotonic() + PURGE_INTERVAL
+    except asyncio.CancelledError:
+      raise
+    except Exception as e:
+      print(f"发件箱分发失败: {e}")
+    await asyncio.sleep(settings.OUTBOX_DISPATCH_INTERVAL)
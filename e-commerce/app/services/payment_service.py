@@ -8,7 +8,9 @@ from app.models.payment import Payment
 from app.models.user import User
 from app.schemas.order import OrderStatus
 from app.schemas.payment import PaymentCreate, PaymentStatus
-from app.services.email_service import EmailService
+from app.services.outbox_service import OutboxService, PAYMENT_COMPLETED
+from app.services.inventory_ledger_service import InventoryLedgerService
+from app.database.session import transaction
 
 
 class PaymentServiceMock:
@@ -56,118 +58,110 @@ class PaymentServiceMock:
   @staticmethod
   async def mock_payment_success(session_id: str, db: AsyncSession):
     """模拟支付成功"""
-    
-    result = await db.execute(select(Payment).where(Payment.stripe_session_id == session_id))
-    payment = result.scalars().first()
 
-    if not payment:
-      raise HTTPException(status_code=404, detail="Payment not found")
+    # 支付和订单状态在同一个事务中更新；锁住两行，避免重复支付或与取消、超时取消交错
+    async with transaction() as tx:
+      result = await tx.execute(
+        select(Payment).where(Payment.stripe_session_id == session_id).with_for_update())
+      payment = result.scalars().first()
 
-    # 检查支付是否已经完成
-    if payment.status == PaymentStatus.completed:
-      raise HTTPException(
-        status_code=400, 
-        detail="Payment already completed. Cannot process again.")
-    
-    # 检查支付是否已经失败
-    if payment.status == PaymentStatus.failed:
-      raise HTTPException(
-        status_code=400, 
-        detail="Payment already failed. Cannot mark as successful.")
-
-    # 获取订单并检查状态
-    order_result = await db.execute(select(Order).where(Order.id == payment.order_id))
-    order = order_result.scalars().first()
-    
-    if not order:
-      raise HTTPException(status_code=404, detail="Order not found")
-    
-    # 检查订单是否已经支付
-    if order.order_status == OrderStatus.paid:
-      raise HTTPException(
-        status_code=400, 
-        detail="Order already paid. Cannot process payment again.")
-    
-    # 检查订单是否已经取消
-    if order.order_status == OrderStatus.canceled:
-      raise HTTPException(
-        status_code=400, 
-        detail="Order is canceled. Cannot process payment.")
+      if not payment:
+        raise HTTPException(status_code=404, detail="Payment not found")
+
+      # 检查支付是否已经完成
+      if payment.status == PaymentStatus.completed:
+        raise HTTPException(
+          status_code=400, 
+          detail="Payment already completed. Cannot process again.")
+      
+      # 检查支付是否已经失败
+      if payment.status == PaymentStatus.failed:
+        raise HTTPException(
+          status_code=400, 
+          detail="Payment already failed. Cannot mark as successful.")
+
+      # 获取订单并检查状态
+      order_result = await tx.execute(select(Order).where(Order.id == payment.order_id).with_for_update())
+      order = order_result.scalars().first()
+      
+      if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+      
+      # 检查订单是否已经支付
+      if order.order_status == OrderStatus.paid:
+        raise HTTPException(
+          status_code=400, 
+          detail="Order already paid. Cannot process payment again.")
+      
+      # 检查订单是否已经取消
+      if order.order_status == OrderStatus.canceled:
+        raise HTTPException(
+          status_code=400, 
+          detail="Order is canceled. Cannot process payment.")
 
-    # 更新支付状态
-    payment.status = PaymentStatus.completed
+      # 更新支付状态
+      payment.status = PaymentStatus.completed
 
-    # 更新订单状态
-    order.order_status = OrderStatus.paid
+      # 更新订单状态
+      order.order_status = OrderStatus.paid
 
-    # 获取用户信息
-    user_query = await db.execute(select(User).where(User.id == payment.user_id))
-    user = user_query.scalars().first()
+      # 获取用户信息，支付成功邮件随支付状态一起提交到发件箱
+      user_query = await tx.execute(select(User).where(User.id == payment.user_id))
+      user = user_query.scalars().first()
+      if user:
+        OutboxService.enqueue(tx, PAYMENT_COMPLETED, {"email": user.email},
+                              idempotency_key=f"{PAYMENT_COMPLETED}:{payment.id}")
 
-    db.add(payment)
-    db.add(order)
-    await db.commit()
-    await db.refresh(payment)
-    await db.refresh(order)
-
-    # 使用Celery异步发送支付成功邮件（可选）
-    if user:
-      try:
-        from app.tasks.email_tasks import send_payment_confirmation_email
-        send_payment_confirmation_email.delay(user.email)
-      except Exception:
-        # 如果Celery不可用，同步发送（降级处理）
-        try:
-          await EmailService.payment_confirmation_message(user.email)
-        except:
-          pass  # 邮件发送失败不影响支付流程
+    # 秒杀商品的库存正式扣除；失败时由对账任务在预留到期后确认
+    try:
+      await InventoryLedgerService.confirm(order.id)
+    except Exception:
+      pass
 
     return payment
   
   @staticmethod
   async def mock_payment_cancel(session_id: str, db: AsyncSession):
     """模拟支付取消"""
-    
-    result = await db.execute(select(Payment).where(Payment.stripe_session_id == session_id))
-    payment = result.scalars().first()
 
-    if not payment:
-      raise HTTPException(status_code=404, detail="Payment not found")
+    async with transaction() as tx:
+      result = await tx.execute(
+        select(Payment).where(Payment.stripe_session_id == session_id).with_for_update())
+      payment = result.scalars().first()
 
-    # 检查支付是否已经完成
-    if payment.status == PaymentStatus.completed:
-      raise HTTPException(
-        status_code=400, 
-        detail="Payment already completed. Cannot cancel a successful payment.")
-    
-    # 检查支付是否已经失败
-    if payment.status == PaymentStatus.failed:
-      raise HTTPException(
-        status_code=400, 
-        detail="Payment already failed. Cannot cancel again.")
-    
-    # 获取订单并检查状态
-    order_result = await db.execute(select(Order).where(Order.id == payment.order_id))
-    order = order_result.scalars().first()
-    
-    if order:
-      # 检查订单是否已经支付
-      if order.order_status == OrderStatus.paid:
+      if not payment:
+        raise HTTPException(status_code=404, detail="Payment not found")
+
+      # 检查支付是否已经完成
+      if payment.status == PaymentStatus.completed:
         raise HTTPException(
           status_code=400, 
-          detail="Order already paid. Cannot cancel the payment.")
+          detail="Payment already completed. Cannot cancel a successful payment.")
       
-      # 检查订单是否已经取消
-      if order.order_status == OrderStatus.canceled:
+      # 检查支付是否已经失败
+      if payment.status == PaymentStatus.failed:
         raise HTTPException(
           status_code=400, 
-          detail="Order already canceled.")
-
-    # 更新支付状态
-    payment.status = PaymentStatus.failed
-
-    db.add(payment)
-    await db.commit()
-    await db.refresh(payment)
+          detail="Payment already failed. Cannot cancel again.")
+      
+      # 获取订单并检查状态
+      order_result = await tx.execute(select(Order).where(Order.id == payment.order_id))
+      order = order_result.scalars().first()
+      
+      if order:
+        # 检查订单是否已经支付
+        if order.order_status == OrderStatus.paid:
+          raise HTTPException(
+            status_code=400, 
+            detail="Order already paid. Cannot cancel the payment.")
+        
+        # 检查订单是否已经取消
+        if order.order_status == OrderStatus.canceled:
+          raise HTTPException(
+            status_code=400, 
+            detail="Order already canceled.")
+
+      # 更新支付状态
+      payment.status = PaymentStatus.failed
 
     return payment
\ No newline at end of file
@@ -1,70 +1,100 @@
+from typing import Dict, Iterable
+
 from sqlalchemy.future import select
-from sqlalchemy import or_, func, and_
 from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.schemas.user import Role
 from app.models.product import Product
-from app.utils.token import get_client_ip
-from app.database.redis_session import redis_connection
-from app.utils.pagination import apply_filters, apply_pagination
-from app.schemas.product import ProductCreate, ProductUpdate, ProductFilter, ProductResponse
+from app.services.search_engine import get_search_engine
+from app.utils.cache import (CATALOG_TAG, RATINGS_TAG, category_tag, product_tags, versioned_key,
+                             invalidate_tags, invalidate_keys, cached_call, cache_get_many, cache_set_many)
+from app.utils.pagination import apply_filters, apply_pagination, apply_keyset_pagination
+from app.schemas.product import ProductCreate, ProductUpdate, ProductFilter, ProductResponse, ProductSnapshot
+
+
+# 商品实体缓存：快照结构变化时修改版本号，旧格式的缓存自然失效
+PRODUCT_ENTITY_VERSION = 1
+PRODUCT_ENTITY_TTL = 600
+# 失效后禁止回填的时间（秒）：失效前开始的查询在这段时间内完成，旧快照不会被写回缓存
+PRODUCT_TOMBSTONE_TTL = 10
 
 
 class ProductService:
   @staticmethod
-  async def get_all_products(db: AsyncSession, filters: ProductFilter):
-    # 构建缓存键（基于过滤条件）
-    cache_key_parts = [
-      f"page:{filters.page}",
-      f"size:{filters.size}",
-    ]
+  def _list_filter_parts(filters: ProductFilter) -> list:
+    filter_parts = []
     if filters.category_id:
-      cache_key_parts.append(f"category:{filters.category_id}")
+      filter_parts.append(f"category:{filters.category_id}")
     if filters.min_price:
-      cache_key_parts.append(f"min_price:{filters.min_price}")
+      filter_parts.append(f"min_price:{filters.min_price}")
     if filters.max_price:
-      cache_key_parts.append(f"max_price:{filters.max_price}")
+      filter_parts.append(f"max_price:{filters.max_price}")
     if filters.availability is not None:
-      cache_key_parts.append(f"availability:{filters.availability}")
-    
-    cache_key = f"products:list:{':'.join(cache_key_parts)}"
-    cache_ttl = 180  # 缓存3分钟
-    
-    # 尝试从Redis缓存获取结果
-    try:
-      cached_result = await redis_connection.get(cache_key)
-      if cached_result:
-        import json
-        return json.loads(cached_result)
-    except Exception:
-      pass
-    
-    query = await apply_filters(db, filters)
-    products = await apply_pagination(query, filters, db)
-    if not products:
-      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+      filter_parts.append(f"availability:{filters.availability}")
+    if filters.min_rating is not None:
+      filter_parts.append(f"min_rating:{filters.min_rating}")
+    return filter_parts
+
+  @staticmethod
+  async def get_products_cache_key(filters: ProductFilter) -> str:
+    """
+    商品列表的缓存键（带标签版本号）
+    商品写操作会改变版本号，因此也可以用来生成ETag，无需读取缓存内容
+    """
+    filter_parts = ProductService._list_filter_parts(filters)
+    if filters.pagination == "cursor":
+      # 游标分页：页码无意义，用游标和排序键区分缓存
+      cache_key_parts = [
+        f"cursor:{filters.cursor or 'first'}",
+        f"size:{filters.size}",
+        f"sort:{filters.sort_by}",
+        f"total:{filters.total_mode}",
+      ] + filter_parts
+    else:
+      cache_key_parts = [
+        f"page:{filters.page}",
+        f"size:{filters.size}",
+      ] + filter_parts
+
+    # 缓存键带上标签版本号：按分类过滤时依赖分类标签，否则依赖全局目录标签
+    tags = [category_tag(filters.category_id)] if filters.category_id else [CATALOG_TAG]
+    if filters.min_rating is not None:
+      tags.append(RATINGS_TAG)
+    return await versioned_key("products:list", tags, *cache_key_parts)
+
+  @staticmethod
+  async def get_all_products(db: AsyncSession, filters: ProductFilter, raw: bool = False,
+                             cache_key: str = None):
+    """
+    商品列表（带缓存）
+    raw=True 时返回编码好的JSON字节，缓存命中时不再经过反序列化和Pydantic校验
+    cache_key 可由调用方预先通过 get_products_cache_key 计算（例如用于ETag）
+    """
+    filter_parts = ProductService._list_filter_parts(filters)
+    if cache_key is None:
+      cache_key = await ProductService.get_products_cache_key(filters)
+    cache_ttl = 3600  # 商品写操作会主动失效，可使用较长的TTL
     
-    # 将结果存入Redis缓存
-    try:
-      import json
+    async def load_products():
+      query = await apply_filters(db, filters)
+      if filters.pagination == "cursor":
+        # 总数缓存键不包含游标，同一组过滤条件共用
+        count_cache_key = ":".join(["products"] + filter_parts)
+        products = await apply_keyset_pagination(query, filters, db, count_cache_key)
+      else:
+        products = await apply_pagination(query, filters, db)
+      if not products:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+
       # 转换items为可序列化的格式
-      cache_data = {
-        "items": [ProductResponse.model_validate(p).model_dump() for p in products["items"]],
-        "total": products["total"],
-        "page": products["page"],
-        "size": products["size"],
-        "pages": products["pages"]
+      return {
+        **products,
+        "items": [ProductResponse.model_validate(p).model_dump() for p in products["items"]]
       }
-      await redis_connection.setex(
-        cache_key,
-        cache_ttl,
-        json.dumps(cache_data, default=str)
-      )
-    except Exception:
-      pass
-    
-    return products
+
+    # 同一个键只有一个请求回源，过期后短时间内返回旧值
+    return await cached_call("products:list", cache_key, load_products, cache_ttl, raw=raw)
 
   @staticmethod
   async def create_product(db: AsyncSession, product_data: ProductCreate,
@@ -84,11 +114,15 @@ class ProductService:
     db.add(product_db)
     await db.commit()
     await db.refresh(product_db)
+    await invalidate_tags(*product_tags(product_db.category_id))
 
     return ProductResponse.model_validate(product_db)
 
   @staticmethod
   async def get_product_by_id(request, db: AsyncSession, product_id: int):
+    """
+    只读查询；浏览量由 ViewCounterService 在Redis中累计后批量回写
+    """
     query = select(Product).where(Product.id == product_id)
     result = await db.execute(query)
     product = result.scalars().first()
@@ -98,15 +132,69 @@ class ProductService:
         status_code=status.HTTP_404_NOT_FOUND,
         detail="Product not found.")
 
-    client_ip = get_client_ip(request)
-    view_state = await redis_connection.get(client_ip)
+    return product
+
+  @staticmethod
+  def product_cache_key(product_id: int) -> str:
+    return f"products:entity:v{PRODUCT_ENTITY_VERSION}:{product_id}"
+
+  @staticmethod
+  async def invalidate_products(*product_ids: int):
+    """
+    删除商品实体缓存（商品信息、库存、上下架状态变化后调用）
+    """
+    await invalidate_keys(*[ProductService.product_cache_key(product_id) for product_id in set(product_ids)],
+                          tombstone_ttl=PRODUCT_TOMBSTONE_TTL)
+
+  @staticmethod
+  async def get_products_by_ids(db: AsyncSession, product_ids: Iterable[int],
+                                use_cache: bool = True) -> Dict[int, ProductSnapshot]:
+    """
+    批量获取商品快照：先批量读缓存，未命中的用一条 IN 查询补齐并回填缓存
+
+    Args:
+      db: 数据库会话
+      product_ids: 商品ID（可重复）
+      use_cache: 为 False 时直接查询数据库（例如扣减库存前需要最新数据）
 
-    if view_state is None:
-      await redis_connection.set(client_ip, 1)
-      product.view_count += 1
-      await db.commit()
-      await db.refresh(product)
+    Returns:
+      商品ID -> ProductSnapshot，不存在的商品不包含在结果中
+    """
+    product_ids = list(dict.fromkeys(product_ids))
+    if not product_ids:
+      return {}
+
+    products = {}
+    if use_cache:
+      cached = await cache_get_many(
+        "products:entity", [ProductService.product_cache_key(product_id) for product_id in product_ids])
+      for data in cached.values():
+        snapshot = ProductSnapshot.model_validate(data)
+        products[snapshot.id] = snapshot
 
+    missing = [product_id for product_id in product_ids if product_id not in products]
+    if missing:
+      result = await db.execute(select(Product).where(Product.id.in_(missing)))
+      loaded = {product.id: ProductSnapshot.model_validate(product) for product in result.scalars().all()}
+      products.update(loaded)
+      if use_cache:
+        await cache_set_many({
+          ProductService.product_cache_key(product_id): snapshot.model_dump()
+          for product_id, snapshot in loaded.items()
+        }, PRODUCT_ENTITY_TTL, guarded=True)
+
+    return products
+
+  @staticmethod
+  async def get_product_snapshot(db: AsyncSession, product_id: int) -> ProductSnapshot:
+    """
+    商品详情（读缓存），不存在时返回404
+    """
+    product = (await ProductService.get_products_by_ids(db, [product_id])).get(product_id)
+    if not product:
+      raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Product not found.")
     return product
 
   @staticmethod
@@ -129,6 +217,7 @@ class ProductService:
         status_code=status.HTTP_403_FORBIDDEN,
         detail="You do not have permission to update this product.")
 
+    previous_category_id = product.category_id
     updated_data = product_data.model_dump(exclude_unset=True)
     for key, value in updated_data.items():
       setattr(product, key, value)
@@ -140,6 +229,15 @@ class ProductService:
 
     await db.commit()
     await db.refresh(product)
+    if "stock" in updated_data:
+      # 秒杀商品的库存以Redis台账为准，手动修改同步到台账（模块间循环依赖，延迟导入）
+      from app.services.inventory_ledger_service import InventoryLedgerService
+      try:
+        await InventoryLedgerService.set_stock(product.id, product.stock)
+      except Exception:
+        pass
+    await invalidate_tags(*product_tags(previous_category_id, product.category_id))
+    await ProductService.invalidate_products(product.id)
     return product
 
   @staticmethod
@@ -165,16 +263,21 @@ class ProductService:
         detail="You do not have permission to delete this product.")
 
     # 硬删除：真正从数据库中删除记录
+    category_id = product.category_id
     await db.delete(product)
     await db.commit()
+    await invalidate_tags(*product_tags(category_id))
+    await ProductService.invalidate_products(product_id)
 
     return {"detail": "Product deleted successfully."}
 
   @staticmethod
-  async def search_products(db: AsyncSession, search_query: str, page: int = 1, size: int = 10):
+  async def search_products(db: AsyncSession, search_query: str, page: int = 1, size: int = 10,
+                            raw: bool = False):
     """
     全文搜索商品（带Redis缓存）
     支持搜索商品名称和描述
+    raw=True 时返回编码好的JSON字节
     """
     if not search_query or not search_query.strip():
       raise HTTPException(
@@ -183,68 +286,29 @@ class ProductService:
       )
     
     search_query = search_query.strip()
-    search_term = f"%{search_query}%"
     
     # 构建缓存键（包含搜索关键词和分页信息）
-    cache_key = f"search:products:{search_query.lower()}:page:{page}:size:{size}"
-    cache_ttl = 300  # 缓存5分钟
-    
-    # 尝试从Redis缓存获取结果
-    try:
-      cached_result = await redis_connection.get(cache_key)
-      if cached_result:
-        import json
-        return json.loads(cached_result)
-    except Exception:
-      # 缓存获取失败，继续执行数据库查询
-      pass
+    cache_key = await versioned_key("search:products", [CATALOG_TAG],
+                                    search_query.lower(), f"page:{page}", f"size:{size}")
+    cache_ttl = 3600  # 商品写操作会主动失效，可使用较长的TTL
     
-    # 使用 ILIKE 进行不区分大小写的模糊搜索（PostgreSQL）
-    # 搜索商品名称和描述
-    query = select(Product).where(
-      and_(
-        Product.is_active == True,
-        or_(
-          Product.name.ilike(search_term),
-          Product.description.ilike(search_term)
+    async def load_search_results():
+      # PostgreSQL：全文检索 + 三元组索引，按相关度排序；分页在SQL中完成
+      engine = get_search_engine(db)
+      products, total = await engine.search(db, search_query, page, size)
+      
+      if not products:
+        raise HTTPException(
+          status_code=status.HTTP_404_NOT_FOUND,
+          detail="No products found matching your search"
         )
-      )
-    ).order_by(Product.created_at.desc())
-    
-    # 执行查询
-    result = await db.execute(query)
-    all_products = result.scalars().all()
-    
-    # 手动分页
-    total = len(all_products)
-    start = (page - 1) * size
-    end = start + size
-    products = all_products[start:end]
-    
-    if not products:
-      raise HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND,
-        detail="No products found matching your search"
-      )
-    
-    response_data = {
-      "products": [ProductResponse.model_validate(p).model_dump() for p in products],
-      "total": total,
-      "page": page,
-      "size": size,
-      "pages": (total + size - 1) // size
-    }
-    
-    # 将结果存入Redis缓存
-    try:
-      import json
-      await redis_connection.setex(
-        cache_key,
-        cache_ttl,
-        json.dumps(response_data, default=str)  # default=str处理datetime等类型
-      )
-    except Exception:
-      # 缓存存储失败，不影响返回结果
-      pass
+      
+      return {
+        "products": [ProductResponse.model_validate(p).model_dump() for p in products],
+        "total": total,
+        "page": page,
+        "size": size,
+        "pages": (total + size - 1) // size
+      }
     
-    return response_data
+    return await cached_call("search:products", cache_key, load_search_results, cache_ttl, raw=raw)
@@ -0,0 +1,99 @@
+"""
+商品评分聚合服务
+评论写操作时增量更新 product_stats（INSERT ... ON CONFLICT DO UPDATE 原子累加），
+数据不一致时可用 rebuild 从 reviews 表一次性重建
+"""
+from typing import Dict, Iterable
+
+from sqlalchemy import func, text
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import insert
+
+from app.models.product_stats import ProductStats
+
+
+POSITIVE_RATING = 4
+STAR_COLUMNS = [f"stars_{star}" for star in range(6)]
+COUNTER_COLUMNS = ["rating_sum", "rating_count", "positive_count"] + STAR_COLUMNS
+
+# 只统计主评论；一条语句完成：聚合、写入，并删除已经没有评论的商品
+REBUILD_SQL = f"""
+WITH agg AS (
+  SELECT product_id,
+         sum(rating) AS rating_sum,
+         count(*) AS rating_count,
+         count(*) FILTER (WHERE rating >= {POSITIVE_RATING}) AS positive_count,
+         {", ".join(f"count(*) FILTER (WHERE rating = {star}) AS stars_{star}" for star in range(6))}
+  FROM reviews
+  WHERE parent_review_id IS NULL
+  GROUP BY product_id
+), upserted AS (
+  INSERT INTO product_stats (product_id, {", ".join(COUNTER_COLUMNS)}, updated_at)
+  SELECT product_id, {", ".join(COUNTER_COLUMNS)}, now() FROM agg
+  ON CONFLICT (product_id) DO UPDATE SET
+    {", ".join(f"{column} = EXCLUDED.{column}" for column in COUNTER_COLUMNS)},
+    updated_at = now()
+  RETURNING product_id
+)
+DELETE FROM product_stats WHERE product_id NOT IN (SELECT product_id FROM agg)
+"""
+
+
+class ProductStatsService:
+  @staticmethod
+  def _delta(rating: int, sign: int) -> Dict[str, int]:
+    delta = {column: 0 for column in COUNTER_COLUMNS}
+    delta["rating_sum"] = sign * rating
+    delta["rating_count"] = sign
+    delta["positive_count"] = sign if rating >= POSITIVE_RATING else 0
+    delta[f"stars_{rating}"] = sign
+    return delta
+
+  @staticmethod
+  async def _apply(db: AsyncSession, product_id: int, delta: Dict[str, int]):
+    stmt = insert(ProductStats).values(product_id=product_id, **delta)
+    stmt = stmt.on_conflict_do_update(
+      index_elements=[ProductStats.product_id],
+      set_={
+        **{column: getattr(ProductStats, column) + stmt.excluded[column] for column in COUNTER_COLUMNS},
+        "updated_at": func.now()
+      }
+    )
+    await db.execute(stmt)
+
+  @staticmethod
+  async def add_rating(db: AsyncSession, product_id: int, rating: int):
+    await ProductStatsService._apply(db, product_id, ProductStatsService._delta(rating, 1))
+
+  @staticmethod
+  async def remove_rating(db: AsyncSession, product_id: int, rating: int):
+    await ProductStatsService._apply(db, product_id, ProductStatsService._delta(rating, -1))
+
+  @staticmethod
+  async def change_rating(db: AsyncSession, product_id: int, old_rating: int, new_rating: int):
+    if old_rating == new_rating:
+      return
+    delta = ProductStatsService._delta(new_rating, 1)
+    for column, value in ProductStatsService._delta(old_rating, -1).items():
+      delta[column] += value
+    await ProductStatsService._apply(db, product_id, delta)
+
+  @staticmethod
+  async def get_stats(db: AsyncSession, product_ids: Iterable[int]) -> Dict[int, ProductStats]:
+    """
+    批量读取评分聚合，没有评论的商品不包含在结果中
+    """
+    product_ids = list(set(product_ids))
+    if not product_ids:
+      return {}
+    result = await db.execute(select(ProductStats).where(ProductStats.product_id.in_(product_ids)))
+    return {stats.product_id: stats for stats in result.scalars().all()}
+
+  @staticmethod
+  async def rebuild(db: AsyncSession):
+    """
+    从 reviews 表重建全部评分聚合（单条SQL）
+    """
+    await db.execute(text(REBUILD_SQL))
+    await db.commit()
@@ -0,0 +1,177 @@
+"""
+RAG共享资源（进程内单例）
+Embedding模型和向量数据库在每个进程中只创建一次，由所有请求共享：
+  - 应用启动时（RAG_WARMUP=true）在后台线程中预热：加载模型、打开ChromaDB并编码一次，
+    第一个对话请求不再等待模型加载
+  - 未预热时在第一次使用时加载；加载过程加锁，并发请求等待同一次加载，不会重复加载模型
+  - 请求中的查询编码通过共享的批量推理执行器完成（见 app/services/embedding_executor.py），
+    编码前先查询向量缓存（见 app/services/embedding_cache.py）
+  - rag_status() 报告各资源的就绪状态
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+
+from app.config.settings import settings
+from app.services.embedding_executor import EmbeddingBatcher
+from app.services.embedding_cache import EmbeddingCache
+
+try:
+    from app.services.embedding_service import EmbeddingService
+except (ImportError, OSError):
+    EmbeddingService = None
+
+try:
+    from app.services.vector_store_service import VectorStoreService
+except (ImportError, OSError):
+    VectorStoreService = None
+
+
+NOT_LOADED = "not_loaded"
+LOADING = "loading"
+READY = "ready"
+ERROR = "error"
+
+_embedding_lock = threading.Lock()
+_vector_store_lock = threading.Lock()
+# 执行器和向量缓存在事件循环线程中创建，不能与模型加载共用 _embedding_lock（加载期间会阻塞事件循环）
+_batcher_lock = threading.Lock()
+_cache_lock = threading.Lock()
+_embedding_service: Optional["EmbeddingService"] = None
+_vector_store: Optional["VectorStoreService"] = None
+_embedding_batcher: Optional[EmbeddingBatcher] = None
+_embedding_cache: Optional[EmbeddingCache] = None
+_status: Dict[str, Dict] = {
+    "embedding_model": {"status": NOT_LOADED, "error": None, "load_seconds": None},
+    "vector_store": {"status": NOT_LOADED, "error": None, "load_seconds": None},
+}
+
+
+def _load(name: str, factory):
+    state = _status[name]
+    state.update(status=LOADING, error=None)
+    started = time.perf_counter()
+    try:
+        resource = factory()
+    except Exception as e:
+        state.update(status=ERROR, error=str(e))
+        raise
+    state.update(status=READY, load_seconds=round(time.perf_counter() - started, 3))
+    return resource
+
+
+def get_embedding_service() -> "EmbeddingService":
+    """
+    共享的Embedding服务（首次调用时加载模型）
+    """
+    global _embedding_service
+    if _embedding_service is None:
+        with _embedding_lock:
+            if _embedding_service is None:
+                if EmbeddingService is None:
+                    raise ImportError("sentence-transformers is not available")
+                _embedding_service = _load("embedding_model", lambda: EmbeddingService(settings.EMBEDDING_MODEL))
+    return _embedding_service
+
+
+def get_vector_store() -> "VectorStoreService":
+    """
+    共享的向量数据库服务（首次调用时打开ChromaDB；模型在第一次编码时才加载）
+    """
+    global _vector_store
+    if _vector_store is None:
+        with _vector_store_lock:
+            if _vector_store is None:
+                if VectorStoreService is None:
+                    raise ImportError("chromadb is not available")
+                _vector_store = _load("vector_store", VectorStoreService)
+    return _vector_store
+
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """
+    共享的查询编码执行器（模型在第一次推理时于推理线程中加载）
+    """
+    global _embedding_batcher
+    if _embedding_batcher is None:
+        with _batcher_lock:
+            if _embedding_batcher is None:
+                _embedding_batcher = EmbeddingBatcher(
+                    get_embedding_service,
+                    max_batch_size=settings.EMBEDDING_MAX_BATCH,
+                    max_wait=settings.EMBEDDING_BATCH_WINDOW_MS / 1000)
+    return _embedding_batcher
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """
+    共享的查询向量缓存（按实际加载的模型名区分缓存键；模型尚未加载时使用配置的模型名）
+    """
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _cache_lock:
+            if _embedding_cache is None:
+                model_name = (_embedding_service.model_name if _embedding_service is not None
+                              else settings.EMBEDDING_MODEL)
+                _embedding_cache = EmbeddingCache(
+                    model_name,
+                    max_bytes=settings.EMBEDDING_CACHE_MAX_BYTES,
+                    ttl=settings.EMBEDDING_CACHE_TTL,
+                    dtype=settings.EMBEDDING_CACHE_DTYPE)
+    return _embedding_cache
+
+
+def shutdown():
+    """
+    应用关闭时停止查询编码执行器
+    """
+    if _embedding_batcher is not None:
+        _embedding_batcher.close()
+
+
+async def aget_vector_store() -> "VectorStoreService":
+    """
+    在线程中获取向量数据库服务，加载时不阻塞事件循环
+    """
+    if _vector_store is not None:
+        return _vector_store
+    return await asyncio.to_thread(get_vector_store)
+
+
+def warm_up():
+    """
+    加载全部资源，并编码一次使模型完成首次推理的初始化
+    """
+    get_vector_store()
+    get_embedding_service().encode_single("warm up")
+
+
+async def run_rag_warmup():
+    """
+    启动时在后台预热RAG资源（失败只记录，不影响应用启动）
+    """
+    if not settings.RAG_WARMUP:
+        return
+    try:
+        await asyncio.to_thread(warm_up)
+        print("RAG资源预热完成")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"RAG资源预热失败: {e}")
+
+
+def rag_status() -> Dict:
+    """
+    各资源的就绪状态
+
+    Returns:
+        Dict: ready 表示模型和向量数据库都已加载
+    """
+    return {
+        "ready": all(state["status"] == READY for state in _status.values()),
+        "warmup_enabled": settings.RAG_WARMUP,
+        **{name: dict(state) for name, state in _status.items()},
+        "embedding_cache": _embedding_cache.stats() if _embedding_cache is not None else None,
+    }
@@ -0,0 +1,294 @@
+"""
+Redis购物车（CART_BACKEND=redis 时启用）
+每个用户的购物车是一个哈希 cart:{user_id}：
+  - {product_id} -> 数量
+  - price:{product_id} -> 加购时的单价快照
+  - _loaded -> 1，表示已从数据库载入；键不存在（首次访问或过期）时从 cart_items 载入一次
+读写购物车只访问Redis；写操作把用户记入 cart:dirty，
+后台任务定期把这些用户的购物车回写到 cart_items（持久化和统计分析用），
+Redis 中的数据丢失时以 cart_items 为准重新载入（最多丢失最近一个回写周期的修改）
+Redis 中的购物车项没有独立的行ID，对外以商品ID作为购物车项ID
+"""
+import asyncio
+from collections import namedtuple
+from typing import Dict, Iterable, List, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, tuple_
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.models.cart_item import CartItem
+from app.config.settings import settings
+from app.database.session import AsyncSessionLocal, transaction
+from app.database.redis_session import redis_connection
+from app.schemas.cart_item import CartItemResponse
+
+
+CART_PREFIX = "cart:"
+DIRTY_KEY = "cart:dirty"
+PRICE_PREFIX = "price:"
+LOADED_FIELD = "_loaded"
+FLUSH_BATCH_SIZE = 500
+
+# 与 cart_items 查询结果相同的形状（price 为该行总价），下单时使用
+CartLine = namedtuple("CartLine", ["product_id", "quantity", "price"])
+
+# 仅在未载入时写入数据库中的购物车，避免覆盖并发写入的新数据
+# ARGV: ttl, field1, value1, ...
+LOAD_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], '_loaded') == 1 then
+  return 0
+end
+for i = 2, #ARGV, 2 do
+  redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('HSET', KEYS[1], '_loaded', 1)
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+# 写入一批商品并记入待回写集合；未载入时返回 -1
+# set 行写入数量（数量为0表示删除）；add 行用 HINCRBY 在脚本中累加，累加后超过上限时整批不写入，
+# 返回超出上限的商品ID列表（读取现有数量和写入在同一个脚本中，并发加购不会丢失数量）
+# ARGV: ttl, user_id, product_id1, mode1(set|add), quantity1, price1, limit1, ...
+APPLY_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], '_loaded') == 0 then
+  return -1
+end
+local exceeded = {}
+for i = 3, #ARGV, 5 do
+  if ARGV[i + 1] == 'add' then
+    local current = tonumber(redis.call('HGET', KEYS[1], ARGV[i]) or '0')
+    if current + tonumber(ARGV[i + 2]) > tonumber(ARGV[i + 4]) then
+      table.insert(exceeded, ARGV[i])
+    end
+  end
+end
+if #exceeded > 0 then
+  return exceeded
+end
+for i = 3, #ARGV, 5 do
+  if ARGV[i + 1] == 'add' then
+    redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 2])
+    redis.call('HSET', KEYS[1], 'price:' .. ARGV[i], ARGV[i + 3])
+  elseif tonumber(ARGV[i + 2]) > 0 then
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 2], 'price:' .. ARGV[i], ARGV[i + 3])
+  else
+    redis.call('HDEL', KEYS[1], ARGV[i], 'price:' .. ARGV[i])
+  end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('SADD', KEYS[2], ARGV[2])
+return 1
+"""
+
+# 下单：取走整个购物车并清空（保留载入标记），并发下单时只有一个请求能取到商品；未载入时返回 false
+# ARGV: ttl, user_id
+TAKE_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], '_loaded') == 0 then
+  return false
+end
+local cart = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], '_loaded', 1)
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('SADD', KEYS[2], ARGV[2])
+return cart
+"""
+
+# 下单失败时把取走的商品放回购物车（与期间新加购的数量合并）
+# ARGV: ttl, user_id, product_id1, quantity1, price1, ...
+RESTORE_SCRIPT = """
+for i = 3, #ARGV, 3 do
+  redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+  redis.call('HSETNX', KEYS[1], 'price:' .. ARGV[i], ARGV[i + 2])
+end
+redis.call('HSET', KEYS[1], '_loaded', 1)
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('SADD', KEYS[2], ARGV[2])
+return 1
+"""
+
+
+class RedisCartService:
+  @staticmethod
+  def cart_key(user_id: int) -> str:
+    return f"{CART_PREFIX}{user_id}"
+
+  @staticmethod
+  def _parse(raw) -> Dict[int, Tuple[int, float]]:
+    """
+    哈希内容（dict 或 HGETALL 返回的扁平列表）-> {商品ID: (数量, 单价)}
+    """
+    if isinstance(raw, list):
+      raw = dict(zip(raw[::2], raw[1::2]))
+    return {
+      int(field): (int(quantity), float(raw.get(f"{PRICE_PREFIX}{field}", 0)))
+      for field, quantity in raw.items()
+      if field.isdigit()
+    }
+
+  @staticmethod
+  async def _load(user_id: int):
+    """
+    从 cart_items 载入购物车（Redis中不存在时）
+    """
+    async with AsyncSessionLocal() as db:
+      result = await db.execute(
+        select(CartItem.product_id, CartItem.quantity, CartItem.price)
+        .where(CartItem.user_id == user_id))
+      rows = result.all()
+
+    args = []
+    for row in rows:
+      args += [row.product_id, row.quantity, f"{PRICE_PREFIX}{row.product_id}", row.price / row.quantity]
+    await redis_connection.eval(LOAD_SCRIPT, 1, RedisCartService.cart_key(user_id), settings.CART_TTL, *args)
+
+  @staticmethod
+  async def _eval(script: str, user_id: int, *args):
+    """
+    执行购物车脚本；购物车未载入时先载入再重试一次。Redis不可用时返回503
+    """
+    keys = (RedisCartService.cart_key(user_id), DIRTY_KEY)
+    try:
+      result = await redis_connection.eval(script, 2, *keys, settings.CART_TTL, user_id, *args)
+      if result is None or result == -1:
+        await RedisCartService._load(user_id)
+        result = await redis_connection.eval(script, 2, *keys, settings.CART_TTL, user_id, *args)
+      return result
+    except HTTPException:
+      raise
+    except Exception:
+      raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Cart is temporarily unavailable")
+
+  @staticmethod
+  async def get_quantities(user_id: int) -> Dict[int, Tuple[int, float]]:
+    """
+    购物车内容 {商品ID: (数量, 单价)}
+    """
+    key = RedisCartService.cart_key(user_id)
+    try:
+      raw = await redis_connection.hgetall(key)
+      if LOADED_FIELD not in raw:
+        await RedisCartService._load(user_id)
+        raw = await redis_connection.hgetall(key)
+    except Exception:
+      raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Cart is temporarily unavailable")
+    return RedisCartService._parse(raw)
+
+  @staticmethod
+  async def get_cart(user_id: int) -> List[CartItemResponse]:
+    """
+    购物车中的全部商品（购物车项ID即商品ID，price 为该行总价）
+    """
+    cart = await RedisCartService.get_quantities(user_id)
+    return [
+      CartItemResponse(id=product_id, user_id=user_id, product_id=product_id,
+                       quantity=quantity, price=price * quantity)
+      for product_id, (quantity, price) in sorted(cart.items())
+    ]
+
+  @staticmethod
+  async def apply(user_id: int, lines: Dict[int, Tuple[str, int, float, int]]) -> List[int]:
+    """
+    写入一批商品
+
+    Args:
+      user_id: 用户ID
+      lines: {商品ID: (模式, 数量, 单价, 上限)}；模式 set 写入数量（0表示删除），
+        add 在现有数量上累加，累加后不能超过上限（库存）
+
+    Returns:
+      超出上限的商品ID（不为空时整批未写入）
+    """
+    args = []
+    for product_id, (mode, quantity, price, limit) in lines.items():
+      args += [product_id, mode, quantity, price, limit]
+    result = await RedisCartService._eval(APPLY_SCRIPT, user_id, *args)
+    return [int(product_id) for product_id in result] if isinstance(result, list) else []
+
+  @staticmethod
+  async def take(user_id: int) -> List[CartLine]:
+    """
+    下单时取走并清空购物车；下单失败时用 restore 放回
+    """
+    raw = await RedisCartService._eval(TAKE_SCRIPT, user_id)
+    return [
+      CartLine(product_id, quantity, price * quantity)
+      for product_id, (quantity, price) in RedisCartService._parse(raw or []).items()
+    ]
+
+  @staticmethod
+  async def restore(user_id: int, lines: Iterable[CartLine]):
+    args = []
+    for line in lines:
+      args += [line.product_id, line.quantity, line.price / line.quantity]
+    if args:
+      await RedisCartService._eval(RESTORE_SCRIPT, user_id, *args)
+
+  @staticmethod
+  async def flush() -> int:
+    """
+    把一批有修改的购物车回写到 cart_items：
+    一条 INSERT ... ON CONFLICT 写入当前的商品，一条 DELETE 删除已不在购物车中的商品
+
+    Returns:
+      本批回写的用户数
+    """
+    user_ids = await redis_connection.spop(DIRTY_KEY, FLUSH_BATCH_SIZE)
+    if not user_ids:
+      return 0
+    user_ids = [int(user_id) for user_id in user_ids]
+
+    try:
+      async with redis_connection.pipeline(transaction=False) as pipe:
+        for user_id in user_ids:
+          pipe.hgetall(RedisCartService.cart_key(user_id))
+        carts = await pipe.execute()
+
+      # 键已不存在（过期或被淘汰）的购物车以数据库为准，不回写
+      flushed_users, rows = [], []
+      for user_id, raw in zip(user_ids, carts):
+        if LOADED_FIELD not in raw:
+          continue
+        flushed_users.append(user_id)
+        for product_id, (quantity, price) in RedisCartService._parse(raw).items():
+          rows.append({"user_id": user_id, "product_id": product_id,
+                       "quantity": quantity, "price": price * quantity})
+
+      if flushed_users:
+        async with transaction() as tx:
+          if rows:
+            stmt = insert(CartItem).values(rows)
+            await tx.execute(stmt.on_conflict_do_update(
+              index_elements=[CartItem.user_id, CartItem.product_id],
+              set_={"quantity": stmt.excluded.quantity, "price": stmt.excluded.price}))
+          stale = delete(CartItem).where(CartItem.user_id.in_(flushed_users))
+          if rows:
+            stale = stale.where(
+              tuple_(CartItem.user_id, CartItem.product_id).not_in(
+                [(row["user_id"], row["product_id"]) for row in rows]))
+          await tx.execute(stale)
+    except Exception:
+      # 回写失败：重新标记，下个周期重试
+      await redis_connection.sadd(DIRTY_KEY, *user_ids)
+      raise
+    return len(user_ids)
+
+
+async def run_cart_flusher():
+  """
+  定期把Redis购物车回写到数据库（在应用生命周期内作为后台任务运行）
+  切换回数据库后端后仍会回写Redis中尚未持久化的修改
+  """
+  while True:
+    try:
+      # 满批说明还有积压，立即继续
+      if await RedisCartService.flush() >= FLUSH_BATCH_SIZE:
+        continue
+    except asyncio.CancelledError:
+      raise
+    except Exception as e:
+      print(f"购物车回写失败: {e}")
+    await asyncio.sleep(settings.CART_FLUSH_INTERVAL)
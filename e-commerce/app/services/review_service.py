@@ -9,6 +9,8 @@ from app.models.order import Order, OrderStatus
 from app.models.order_item import OrderItem
 from app.schemas.review import LikeDislike
 from app.database.redis_session import redis_connection
+from app.utils.cache import RATINGS_TAG, review_tag, versioned_key, invalidate_tags, cached_call
+from app.services.product_stats_service import ProductStatsService
 from app.schemas.review import ReviewCreate, ReviewResponse
 
 
@@ -23,60 +25,65 @@ class ReviewService:
   @staticmethod
   async def get_review_by_id(product_id: int, db: AsyncSession):
     """
-    获取商品的所有主评论，每个主评论包含其追评列表
+    获取商品的所有主评论，每个主评论包含其追评列表（带缓存）
     """
-    # 查询该商品的所有主评论（parent_review_id 为 NULL）
-    main_reviews_query = await db.execute(
-      select(Review).where(
-        and_(
-          Review.product_id == product_id,
-          Review.parent_review_id.is_(None)
-        )
-      ).order_by(Review.created_at.desc())
-    )
-    main_reviews = main_reviews_query.scalars().all()
-
-    if not main_reviews:
-      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No reviews found for this product")
+    cache_key = await versioned_key("reviews:product", [review_tag(product_id)], product_id)
 
-    # 为每个主评论查询其追评列表
-    result = []
-    for main_review in main_reviews:
-      # 查询该主评论的所有追评
-      follow_up_query = await db.execute(
+    async def load_reviews():
+      # 查询该商品的所有主评论（parent_review_id 为 NULL）
+      main_reviews_query = await db.execute(
         select(Review).where(
-          Review.parent_review_id == main_review.id
-        ).order_by(Review.created_at.asc())
+          and_(
+            Review.product_id == product_id,
+            Review.parent_review_id.is_(None)
+          )
+        ).order_by(Review.created_at.desc())
       )
-      follow_up_reviews = follow_up_query.scalars().all()
-
-      # 构建追评列表
-      follow_up_list = [
-        ReviewResponse(
-          id=fu.id,
-          product_id=fu.product_id,
-          parent_review_id=fu.parent_review_id,
-          content=fu.content,
-          rating=fu.rating,
-          created_at=fu.created_at,
-          follow_up_reviews=None  # 追评不能再有追评
+      main_reviews = main_reviews_query.scalars().all()
+
+      if not main_reviews:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No reviews found for this product")
+
+      # 为每个主评论查询其追评列表
+      result = []
+      for main_review in main_reviews:
+        # 查询该主评论的所有追评
+        follow_up_query = await db.execute(
+          select(Review).where(
+            Review.parent_review_id == main_review.id
+          ).order_by(Review.created_at.asc())
         )
-        for fu in follow_up_reviews
-      ] if follow_up_reviews else None
-
-      # 构建主评论响应对象
-      main_review_response = ReviewResponse(
-        id=main_review.id,
-        product_id=main_review.product_id,
-        parent_review_id=main_review.parent_review_id,
-        content=main_review.content,
-        rating=main_review.rating,
-        created_at=main_review.created_at,
-        follow_up_reviews=follow_up_list
-      )
-      result.append(main_review_response)
+        follow_up_reviews = follow_up_query.scalars().all()
+
+        # 构建追评列表
+        follow_up_list = [
+          ReviewResponse(
+            id=fu.id,
+            product_id=fu.product_id,
+            parent_review_id=fu.parent_review_id,
+            content=fu.content,
+            rating=fu.rating,
+            created_at=fu.created_at,
+            follow_up_reviews=None  # 追评不能再有追评
+          )
+          for fu in follow_up_reviews
+        ] if follow_up_reviews else None
+
+        # 构建主评论响应对象
+        main_review_response = ReviewResponse(
+          id=main_review.id,
+          product_id=main_review.product_id,
+          parent_review_id=main_review.parent_review_id,
+          content=main_review.content,
+          rating=main_review.rating,
+          created_at=main_review.created_at,
+          follow_up_reviews=follow_up_list
+        )
+        result.append(main_review_response)
 
-    return result
+      return [review.model_dump() for review in result]
+
+    return await cached_call("reviews:product", cache_key, load_reviews, ttl=3600)
 
   @staticmethod
   async def create_review(review: ReviewCreate, db: AsyncSession,current_user):
@@ -154,8 +161,15 @@ class ReviewService:
 
     review_db = Review(**review_data)
     db.add(review_db)
+    if not existing_review:
+      # 只有主评论计入评分聚合；与评论在同一事务中提交
+      await ProductStatsService.add_rating(db, review_db.product_id, review_db.rating)
     await db.commit()
     await db.refresh(review_db)
+    if not existing_review:
+      await invalidate_tags(review_tag(review_db.product_id), RATINGS_TAG)
+    else:
+      await invalidate_tags(review_tag(review_db.product_id))
 
     # 手动构建 ReviewResponse，避免访问关系属性导致的异步加载问题
     return ReviewResponse(
@@ -183,12 +197,20 @@ class ReviewService:
     if review_dict.user_id != user.id:
       raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You have no permission to perform this action")
 
+    previous_rating = review_dict.rating
     review_dict.content= updated_review.content
     review_dict.rating= updated_review.rating
 
+    rating_changed = review_dict.parent_review_id is None and previous_rating != review_dict.rating
     db.add(review_dict)
+    if rating_changed:
+      await ProductStatsService.change_rating(db, review_dict.product_id, previous_rating, review_dict.rating)
     await db.commit()
     await db.refresh(review_dict)
+    if rating_changed:
+      await invalidate_tags(review_tag(review_dict.product_id), RATINGS_TAG)
+    else:
+      await invalidate_tags(review_tag(review_dict.product_id))
 
     return review_dict
 
@@ -216,8 +238,17 @@ class ReviewService:
         await db.delete(follow_up_review)
     
     # 删除主评论（或单独的追评）
+    product_id = review_dict.product_id
+    is_main_review = review_dict.parent_review_id is None
+    rating = review_dict.rating
     await db.delete(review_dict)
+    if is_main_review:
+      await ProductStatsService.remove_rating(db, product_id, rating)
     await db.commit()
+    if is_main_review:
+      await invalidate_tags(review_tag(product_id), RATINGS_TAG)
+    else:
+      await invalidate_tags(review_tag(product_id))
   
   @staticmethod
   async def like_dislike(reaction: LikeDislike, db: AsyncSession, current_user):
@@ -251,6 +282,8 @@ class ReviewService:
         review.likes_count -= 1 if previous_state == like else 0
         await redis_connection.set(key, dislike)
     
+    # 点赞数不是评论内容，保留 updated_at（否则知识库增量同步会重新提取这条评论）
+    review.updated_at = Review.updated_at
     db.add(review)
     await db.commit()
     await db.refresh(review)
@@ -0,0 +1,105 @@
+"""
+商品搜索引擎
+PostgreSQL 使用 tsvector 全文检索 + pg_trgm 三元组索引，按相关度排序并在SQL中分页；
+其他数据库（如测试用的SQLite）使用可移植的 LIKE 实现
+"""
+from typing import List, Tuple
+
+from sqlalchemy import and_, case, func, literal_column, or_
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.product import Product
+
+
+# 与迁移和 models/product.py 中 DDL 保持一致
+SEARCH_CONFIG = "simple"
+search_vector = literal_column("products.search_vector")
+
+
+class PostgresSearchEngine:
+    """
+    基于 search_vector（生成列，GIN索引）的全文检索
+    中文等无空格分词的文本由 name/description 上的 trigram 索引兜底
+    """
+    name = "postgres"
+
+    @staticmethod
+    def build_query(search_query: str, page: int, size: int):
+        ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, search_query)
+        search_term = f"%{search_query}%"
+        name_match = Product.name.ilike(search_term)
+
+        # 全文检索得分 + 名称命中加权
+        rank = func.ts_rank(search_vector, ts_query) + case((name_match, 1.0), else_=0.0)
+
+        return (
+            select(Product, func.count().over().label("total"))
+            .where(
+                and_(
+                    Product.is_active == True,
+                    or_(
+                        search_vector.op("@@")(ts_query),
+                        name_match,
+                        Product.description.ilike(search_term)
+                    )
+                )
+            )
+            .order_by(rank.desc(), Product.created_at.desc(), Product.id.desc())
+            .offset((page - 1) * size)
+            .limit(size)
+        )
+
+    @classmethod
+    async def search(cls, db: AsyncSession, search_query: str, page: int, size: int) -> Tuple[List[Product], int]:
+        result = await db.execute(cls.build_query(search_query, page, size))
+        rows = result.all()
+        if not rows:
+            return [], 0
+        return [row[0] for row in rows], rows[0][1]
+
+
+class SimpleSearchEngine:
+    """
+    可移植的回退实现（非PostgreSQL环境）
+    名称命中优先，分页同样下推到SQL
+    """
+    name = "simple"
+
+    @staticmethod
+    def build_conditions(search_query: str):
+        search_term = f"%{search_query.lower()}%"
+        name_match = func.lower(Product.name).like(search_term)
+        condition = and_(
+            Product.is_active == True,
+            or_(name_match, func.lower(Product.description).like(search_term))
+        )
+        return condition, name_match
+
+    @classmethod
+    def build_query(cls, search_query: str, page: int, size: int):
+        condition, name_match = cls.build_conditions(search_query)
+        return (
+            select(Product)
+            .where(condition)
+            .order_by(case((name_match, 0), else_=1), Product.created_at.desc(), Product.id.desc())
+            .offset((page - 1) * size)
+            .limit(size)
+        )
+
+    @classmethod
+    async def search(cls, db: AsyncSession, search_query: str, page: int, size: int) -> Tuple[List[Product], int]:
+        condition, _ = cls.build_conditions(search_query)
+        total = (await db.execute(select(func.count()).select_from(Product).where(condition))).scalar_one()
+        if not total:
+            return [], 0
+        result = await db.execute(cls.build_query(search_query, page, size))
+        return list(result.scalars().all()), total
+
+
+def get_search_engine(db: AsyncSession):
+    """根据数据库方言选择搜索引擎"""
+    bind = db.bind
+    if bind is not None and bind.dialect.name == "postgresql":
+        return PostgresSearchEngine
+    return SimpleSearchEngine
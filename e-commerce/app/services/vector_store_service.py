@@ -2,7 +2,11 @@
 向量数据库服务
 使用ChromaDB存储和检索向量
 """
+from datetime import datetime
 from typing import List, Dict, Optional
+import asyncio
+import hashlib
+import json
 import os
 
 # 可选导入chromadb，如果未安装则提供友好的错误提示
@@ -25,6 +29,10 @@ except (ImportError, OSError) as e:
     EmbeddingService = None
 
 
+# 集合元数据中保存增量同步高水位的键
+WATERMARK_KEY = "synced_at"
+
+
 class VectorStoreService:
     """
     向量数据库服务
@@ -61,10 +69,11 @@ class VectorStoreService:
     
     @property
     def embedding_service(self):
-        """延迟加载EmbeddingService"""
+        """延迟加载EmbeddingService（进程内共享同一个模型，见 app/services/rag_resources.py）"""
         if self._embedding_service is None:
+            from app.services.rag_resources import get_embedding_service
             try:
-                self._embedding_service = EmbeddingService()
+                self._embedding_service = get_embedding_service()
             except (ImportError, RuntimeError, OSError) as e:
                 raise ImportError(
                     f"无法初始化EmbeddingService: {e}. "
@@ -95,54 +104,117 @@ class VectorStoreService:
             print(f"初始化向量数据库失败: {e}")
             raise
     
+    @staticmethod
+    def document_id(doc: Dict) -> str:
+        """向量库中的文档ID：类型 + 数据库ID（商品和评论的ID会重复）"""
+        return f"{doc.get('type', 'unknown')}:{doc['id']}"
+
+    @staticmethod
+    def document_metadata(doc: Dict) -> Dict:
+        """文档元数据（不含内容哈希）"""
+        return {
+            "type": doc.get("type", "unknown"),
+            "product_id": doc.get("product_id", doc.get("id")),
+            "product_name": doc.get("product_name", doc.get("name", "")),
+            "price": doc.get("price", 0),
+            "rating": doc.get("rating", doc.get("average_rating", 0)),
+            "category": doc.get("category", ""),
+        }
+
+    @staticmethod
+    def content_hash(doc: Dict) -> str:
+        """文本和元数据的哈希，内容不变的文档同步时不重新生成向量"""
+        payload = json.dumps([doc.get("text", ""), VectorStoreService.document_metadata(doc)],
+                             ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
     def add_documents(self, documents: List[Dict], batch_size: int = 100):
         """
-        添加文档到向量数据库
+        添加或更新文档（按文档ID upsert，重复执行不会产生重复文档）
+        逐批生成向量并写入，内存中只保留一批文档的向量
         
         Args:
-            documents: 文档列表，每个文档包含 text, id, metadata
+            documents: 文档列表，每个文档包含 text, id, type, metadata
             batch_size: 批处理大小
         """
         if not documents:
             return
         
-        # 提取文本
-        texts = [doc.get("text", "") for doc in documents]
-        
-        # 生成向量
-        print(f"正在生成 {len(texts)} 个文档的向量...")
-        embeddings = self.embedding_service.encode(texts, batch_size=batch_size)
-        
-        # 准备数据
-        ids = [str(doc["id"]) for doc in documents]
-        metadatas = [
-            {
-                "type": doc.get("type", "unknown"),
-                "product_id": doc.get("product_id", doc.get("id")),
-                "product_name": doc.get("product_name", doc.get("name", "")),
-                "price": doc.get("price", 0),
-                "rating": doc.get("rating", 0),
-                "category": doc.get("category", ""),
-            }
-            for doc in documents
-        ]
-        
-        # 批量添加
+        print(f"正在生成 {len(documents)} 个文档的向量...")
         for i in range(0, len(documents), batch_size):
-            batch_ids = ids[i:i+batch_size]
-            batch_embeddings = embeddings[i:i+batch_size].tolist()
-            batch_texts = texts[i:i+batch_size]
-            batch_metadatas = metadatas[i:i+batch_size]
-            
-            self.collection.add(
-                ids=batch_ids,
-                embeddings=batch_embeddings,
-                documents=batch_texts,
-                metadatas=batch_metadatas
-            )
-            print(f"已添加 {i+len(batch_ids)}/{len(documents)} 个文档")
+            batch = documents[i:i+batch_size]
+            self.upsert_embeddings(batch, self.encode_documents(batch))
+            print(f"已写入 {i+len(batch)}/{len(documents)} 个文档")
         
-        print(f"成功添加 {len(documents)} 个文档到向量数据库")
+        print(f"成功写入 {len(documents)} 个文档到向量数据库")
+
+    def encode_documents(self, documents: List[Dict]):
+        """
+        生成一批文档的向量
+
+        Returns:
+            np.ndarray: 向量数组，形状为 (len(documents), embedding_dim)
+        """
+        texts = [doc.get("text", "") for doc in documents]
+        return self.embedding_service.encode(texts, batch_size=len(texts), show_progress_bar=False)
+
+    def upsert_embeddings(self, documents: List[Dict], embeddings):
+        """
+        写入一批已生成向量的文档（元数据中包含内容哈希）
+        """
+        if not documents:
+            return
+        self.collection.upsert(
+            ids=[self.document_id(doc) for doc in documents],
+            embeddings=embeddings.tolist(),
+            documents=[doc.get("text", "") for doc in documents],
+            metadatas=[
+                {**self.document_metadata(doc), "content_hash": self.content_hash(doc)}
+                for doc in documents
+            ]
+        )
+
+    def filter_changed(self, documents: List[Dict], batch_size: int = 1000) -> List[Dict]:
+        """
+        只保留新增或内容有变化的文档（与向量库中保存的内容哈希比较）
+        """
+        changed = []
+        for i in range(0, len(documents), batch_size):
+            batch = documents[i:i+batch_size]
+            stored = self.collection.get(ids=[self.document_id(doc) for doc in batch], include=["metadatas"])
+            hashes = {
+                doc_id: (metadata or {}).get("content_hash")
+                for doc_id, metadata in zip(stored["ids"], stored["metadatas"])
+            }
+            changed.extend(doc for doc in batch if hashes.get(self.document_id(doc)) != self.content_hash(doc))
+        return changed
+
+    def list_ids_page(self, offset: int = 0, limit: int = 1000) -> List[str]:
+        """一页文档ID（不读取向量和文本）"""
+        return self.collection.get(include=[], limit=limit, offset=offset)["ids"]
+
+    def filter_existing(self, ids: List[str], batch_size: int = 1000) -> List[str]:
+        """ids 中已写入向量库的文档ID"""
+        existing = []
+        for i in range(0, len(ids), batch_size):
+            existing.extend(self.collection.get(ids=ids[i:i+batch_size], include=[])["ids"])
+        return existing
+
+    def delete_documents(self, ids: List[str], batch_size: int = 1000):
+        """按文档ID删除"""
+        for i in range(0, len(ids), batch_size):
+            self.collection.delete(ids=ids[i:i+batch_size])
+
+    def get_watermark(self) -> Optional[datetime]:
+        """上次增量同步开始的时间（保存在集合元数据中），从未同步时返回 None"""
+        synced_at = (self.collection.metadata or {}).get(WATERMARK_KEY)
+        return datetime.fromisoformat(synced_at) if synced_at else None
+
+    def set_watermark(self, synced_at: datetime):
+        metadata = {key: value for key, value in (self.collection.metadata or {}).items()
+                    if not key.startswith("hnsw:")}
+        metadata[WATERMARK_KEY] = synced_at.isoformat()
+        self.collection.modify(metadata=metadata)
     
     def search(self, query: str, n_results: int = 10, filter_dict: Optional[Dict] = None) -> List[Dict]:
         """
@@ -156,8 +228,9 @@ class VectorStoreService:
         Returns:
             List[Dict]: 搜索结果列表
         """
-        # 生成查询向量
-        query_embedding = self.embedding_service.encode_single(query)
+        # 生成查询向量（先查向量缓存）
+        from app.services.rag_resources import get_embedding_cache
+        query_embedding = get_embedding_cache().embed(query, self.embedding_service.encode_single)
         
         # 执行搜索
         results = self.collection.query(
@@ -166,7 +239,37 @@ class VectorStoreService:
             where=filter_dict
         )
         
-        # 格式化结果
+        return self._format_results(results)
+
+    async def asearch(self, query: str, n_results: int = 10, filter_dict: Optional[Dict] = None) -> List[Dict]:
+        """
+        语义搜索（请求中使用）
+        查询向量先查缓存，未命中时交给批量推理执行器，与并发请求的查询合并计算；ChromaDB查询在线程中执行，
+        两者都不阻塞事件循环
+        
+        Args:
+            query: 查询文本
+            n_results: 返回结果数量
+            filter_dict: 过滤条件（ChromaDB格式）
+        
+        Returns:
+            List[Dict]: 搜索结果列表
+        """
+        from app.services.rag_resources import get_embedding_batcher, get_embedding_cache
+        query_embedding = await get_embedding_cache().aembed(query, get_embedding_batcher().encode)
+        
+        results = await asyncio.to_thread(
+            self.collection.query,
+            query_embeddings=[query_embedding.tolist()],
+            n_results=n_results,
+            where=filter_dict
+        )
+        
+        return self._format_results(results)
+
+    @staticmethod
+    def _format_results(results: Dict) -> List[Dict]:
+        """格式化ChromaDB查询结果"""
         formatted_results = []
         if results["ids"] and len(results["ids"][0]) > 0:
             for i in range(len(results["ids"][0])):
@@ -186,6 +289,14 @@ class VectorStoreService:
             print(f"已删除集合: {self.collection_name}")
         except Exception as e:
             print(f"删除集合失败: {e}")
+
+    def reset_collection(self):
+        """删除并重新创建集合（共享实例重建知识库时使用，不需要重新打开客户端）"""
+        self.delete_collection()
+        self.collection = self.client.get_or_create_collection(
+            name=self.collection_name,
+            metadata={"description": "E-commerce product and review knowledge base"}
+        )
     
     def get_collection_info(self) -> Dict:
         """获取集合信息"""
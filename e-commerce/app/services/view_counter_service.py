@@ -0,0 +1,174 @@
+"""
+商品浏览量计数（Redis缓冲 + 批量回写）
+请求路径上只执行一次Redis脚本：按 (ip, 商品, 时间窗口) 去重后累加到待回写哈希，
+同时写入按天的 HyperLogLog 用于估算独立访客数；
+后台任务定期取走待回写的增量，用一条 UPDATE ... FROM (VALUES ...) 写回 products.view_count
+"""
+import asyncio
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict
+
+from sqlalchemy import Integer, column, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.product import Product
+from app.config.settings import settings
+from app.database.session import AsyncSessionLocal
+from app.database.redis_session import redis_connection
+
+
+PENDING_KEY = "views:pending"
+FLUSHING_PREFIX = "views:flushing:"
+FLUSH_BATCH_SIZE = 1000
+# 回写批次超过这个时间仍未删除，说明处理它的进程已退出，由其他进程接管
+ABANDONED_FLUSH_AGE = 300
+
+# 去重键不存在时才计数：SET NX EX + HINCRBY + PFADD 在一次往返中完成
+RECORD_VIEW_SCRIPT = """
+if redis.call('SET', KEYS[1], 1, 'NX', 'EX', ARGV[1]) then
+  redis.call('HINCRBY', KEYS[2], ARGV[2], 1)
+  redis.call('PFADD', KEYS[3], ARGV[3])
+  redis.call('EXPIRE', KEYS[3], ARGV[4])
+  return 1
+end
+return 0
+"""
+
+
+class ViewCounterService:
+  @staticmethod
+  def _seen_key(product_id: int, client_ip: str, window: int) -> str:
+    return f"views:seen:{product_id}:{client_ip}:{int(time.time() // window)}"
+
+  @staticmethod
+  def _unique_key(product_id: int, day: str) -> str:
+    return f"views:uv:{product_id}:{day}"
+
+  @staticmethod
+  async def record_view(product_id: int, client_ip: str) -> bool:
+    """
+    记录一次浏览（同一IP在去重窗口内只计一次）
+
+    Args:
+      product_id: 商品ID
+      client_ip: 客户端IP
+
+    Returns:
+      是否计入浏览量；Redis不可用时不计数，不影响商品详情的读取
+    """
+    window = settings.VIEW_COUNT_DEDUP_WINDOW
+    day = datetime.now(timezone.utc).strftime("%Y%m%d")
+    try:
+      counted = await redis_connection.eval(
+        RECORD_VIEW_SCRIPT, 3,
+        ViewCounterService._seen_key(product_id, client_ip, window),
+        PENDING_KEY,
+        ViewCounterService._unique_key(product_id, day),
+        window, product_id, client_ip, 2 * 24 * 3600)
+      return bool(counted)
+    except Exception:
+      return False
+
+  @staticmethod
+  async def get_unique_viewers(product_id: int, day: str = None) -> int:
+    """
+    某天的独立访客数（HyperLogLog估算，误差约0.81%）
+
+    Args:
+      product_id: 商品ID
+      day: 日期（YYYYMMDD），默认今天（UTC）
+    """
+    day = day or datetime.now(timezone.utc).strftime("%Y%m%d")
+    try:
+      return await redis_connection.pfcount(ViewCounterService._unique_key(product_id, day))
+    except Exception:
+      return 0
+
+  @staticmethod
+  async def apply_deltas(db: AsyncSession, deltas: Dict[int, int]):
+    """
+    将浏览量增量批量写回数据库
+    UPDATE products SET view_count = products.view_count + v.delta FROM (VALUES ...) AS v(id, delta)
+    """
+    items = list(deltas.items())
+    for start in range(0, len(items), FLUSH_BATCH_SIZE):
+      batch = values(column("id", Integer), column("delta", Integer), name="v").data(
+        items[start:start + FLUSH_BATCH_SIZE])
+      await db.execute(
+        update(Product)
+        .where(Product.id == batch.c.id)
+        # 保留 updated_at：浏览量不是商品内容，不应让知识库增量同步重新提取这些商品
+        .values(view_count=Product.view_count + batch.c.delta, updated_at=Product.updated_at)
+        .execution_options(synchronize_session=False)
+      )
+    await db.commit()
+
+  @staticmethod
+  async def _flush_key(db: AsyncSession, flushing_key: str) -> int:
+    raw = await redis_connection.hgetall(flushing_key)
+    deltas = {int(product_id): int(delta) for product_id, delta in raw.items() if int(delta)}
+    if deltas:
+      try:
+        await ViewCounterService.apply_deltas(db, deltas)
+      except Exception:
+        # 写库失败：把增量放回待回写哈希，下次重试
+        async with redis_connection.pipeline(transaction=True) as pipe:
+          for product_id, delta in deltas.items():
+            pipe.hincrby(PENDING_KEY, product_id, delta)
+          pipe.delete(flushing_key)
+          await pipe.execute()
+        raise
+    await redis_connection.delete(flushing_key)
+    return sum(deltas.values())
+
+  @staticmethod
+  async def _claim(source_key: str):
+    """
+    RENAME 是原子的：只有一个进程能取走同一批增量，之后的新浏览记录进入新的待回写哈希
+    """
+    flushing_key = f"{FLUSHING_PREFIX}{int(time.time())}:{uuid.uuid4()}"
+    try:
+      await redis_connection.rename(source_key, flushing_key)
+    except Exception:
+      return None  # 键不存在（没有增量或已被其他进程取走）
+    return flushing_key
+
+  @staticmethod
+  async def flush(db: AsyncSession) -> int:
+    """
+    取走当前累计的增量并写回数据库（多个worker同时执行也不会重复写入）
+
+    Returns:
+      本次写回的浏览量总数
+    """
+    flushed = 0
+    # 接管中途退出的进程留下的批次
+    async for leftover in redis_connection.scan_iter(match=f"{FLUSHING_PREFIX}*"):
+      claimed_at = int(leftover[len(FLUSHING_PREFIX):].split(":", 1)[0])
+      if time.time() - claimed_at < ABANDONED_FLUSH_AGE:
+        continue
+      flushing_key = await ViewCounterService._claim(leftover)
+      if flushing_key:
+        flushed += await ViewCounterService._flush_key(db, flushing_key)
+
+    flushing_key = await ViewCounterService._claim(PENDING_KEY)
+    if flushing_key:
+      flushed += await ViewCounterService._flush_key(db, flushing_key)
+    return flushed
+
+
+async def run_view_count_flusher():
+  """
+  定期回写浏览量（在应用生命周期内作为后台任务运行）
+  """
+  while True:
+    await asyncio.sleep(settings.VIEW_COUNT_FLUSH_INTERVAL)
+    try:
+      async with AsyncSessionLocal() as db:
+        await ViewCounterService.flush(db)
+    except asyncio.CancelledError:
+      raise
+    except Exception as e:
+      print(f"浏览量回写失败: {e}")
@@ -2,10 +2,10 @@ from sqlalchemy.future import select
 from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import Product
+from app.services.product_service import ProductService
 from app.models.wishlist import Wishlist
 from app.schemas.wishlist import WishlistCreate, WishlistFilter
-from app.utils.pagination import apply_wishlist_filters, apply_wishlist_pagination
+from app.utils.pagination import apply_wishlist_filters, apply_wishlist_pagination, apply_keyset_pagination
 
 
 class WishlistService:
@@ -17,6 +17,10 @@ class WishlistService:
           current_user):
 
     query = await apply_wishlist_filters(filters, current_user)
+    if filters.pagination == "cursor":
+      wishlists = await apply_keyset_pagination(query, filters, db)
+      return wishlists if wishlists["items"] else None
+
     wishlists = await apply_wishlist_pagination(query, filters, db)
 
     return wishlists
@@ -46,8 +50,8 @@ class WishlistService:
                              Wishlist.user_id == user_id))
     wishlist = existing_product_id_wishlist.scalars().all()
 
-    product = await db.execute(select(Product).where(Product.id == wishlist_data.product_id))
-    product = product.scalar_one_or_none()
+    products = await ProductService.get_products_by_ids(db, [wishlist_data.product_id])
+    product = products.get(wishlist_data.product_id)
 
     if not product:
       raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found .")
@@ -1,45 +1,76 @@
 """
 邮件发送异步任务
+订单和支付邮件由发件箱分发（见 app/services/outbox_service.py），投递是"至少一次"，
+任务按 event_key 去重：发送成功后记录，重复投递的事件直接跳过
 """
+import redis
+from fastapi import HTTPException
+
 from app.celery_app import celery_app
+from app.config.settings import settings
 from app.services.email_service import EmailService
 
 
-@celery_app.task(name="send_order_placement_email")
-def send_order_placement_email(email: str):
+EVENT_DONE_PREFIX = "outbox:done:"
+EVENT_DONE_TTL = 7 * 24 * 3600  # 与发件箱中已投递事件的保留时间一致
+# 发送失败时由Celery重试：指数退避，最多5次
+EMAIL_RETRY_OPTIONS = {"autoretry_for": (Exception,), "retry_backoff": True, "max_retries": 5}
+
+_redis_client = None
+
+
+def _redis():
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.REDIS_SESSION_URL, decode_responses=True)
+    return _redis_client
+
+
+def _run_once(event_key, coroutine_factory):
+    """
+    执行一次事件处理；event_key 已处理过时跳过。EmailService 出错时返回而不是抛出 HTTPException，这里转为异常以触发重试
+    """
+    if event_key and _redis().exists(f"{EVENT_DONE_PREFIX}{event_key}"):
+        return
+    import asyncio
+    loop = asyncio.get_event_loop()
+    if loop.is_closed():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+    result = loop.run_until_complete(coroutine_factory())
+    if isinstance(result, HTTPException):
+        raise RuntimeError(result.detail)
+    if event_key:
+        _redis().set(f"{EVENT_DONE_PREFIX}{event_key}", 1, ex=EVENT_DONE_TTL)
+
+
+@celery_app.task(name="send_order_placement_email", **EMAIL_RETRY_OPTIONS)
+def send_order_placement_email(email: str, event_key: str = None, **_):
     """
     异步发送订单创建邮件
     
     Args:
         email: 收件人邮箱
+        event_key: 发件箱事件的幂等键
     """
     try:
-        import asyncio
-        loop = asyncio.get_event_loop()
-        if loop.is_closed():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-        loop.run_until_complete(EmailService.order_placement_message(email))
+        _run_once(event_key, lambda: EmailService.order_placement_message(email))
     except Exception as e:
         print(f"Failed to send order placement email to {email}: {e}")
         raise
 
 
-@celery_app.task(name="send_payment_confirmation_email")
-def send_payment_confirmation_email(email: str):
+@celery_app.task(name="send_payment_confirmation_email", **EMAIL_RETRY_OPTIONS)
+def send_payment_confirmation_email(email: str, event_key: str = None, **_):
     """
     异步发送支付确认邮件
     
     Args:
         email: 收件人邮箱
+        event_key: 发件箱事件的幂等键
     """
     try:
-        import asyncio
-        loop = asyncio.get_event_loop()
-        if loop.is_closed():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-        loop.run_until_complete(EmailService.payment_confirmation_message(email))
+        _run_once(event_key, lambda: EmailService.payment_confirmation_message(email))
     except Exception as e:
         print(f"Failed to send payment confirmation email to {email}: {e}")
         raise
@@ -0,0 +1,90 @@
+from datetime import datetime, timezone
+from enum import Enum
+
+import pytest
+
+from app.utils import cache_codec
+from app.utils.cache_codec import (CacheFrameCodec, JsonCodec, MsgpackCodec, NoCompression, ZlibCompression,
+                                   Lz4Compression, FRAME_HEADER, content_digest)
+
+
+class Color(Enum):
+    RED = "red"
+
+
+VALUE = {"id": 1, "name": "耳机", "price": 19.5, "tags": ["a", "b"], "nested": {"ok": True, "none": None}}
+
+
+def test_json_frame_round_trip_without_compression():
+    codec = CacheFrameCodec(JsonCodec, ZlibCompression, compress_min_bytes=10_000)
+    frame, entry = codec.encode(VALUE, exp=123.5, d=0.25)
+
+    decoded = CacheFrameCodec.decode(frame)
+    assert decoded.value == VALUE
+    assert decoded.exp == 123.5
+    assert decoded.d == pytest.approx(0.25)
+    assert decoded.body == entry.body
+    assert decoded.json_body() == entry.body
+    assert frame[FRAME_HEADER.size:] == entry.body  # 未压缩
+
+
+def test_large_payload_is_compressed_and_round_trips():
+    value = {"items": ["x" * 50] * 100}
+    codec = CacheFrameCodec(JsonCodec, ZlibCompression, compress_min_bytes=256)
+    frame, entry = codec.encode(value, exp=1.0, d=0.0)
+
+    assert len(frame) < len(entry.body)
+    assert CacheFrameCodec.decode(frame).value == value
+
+
+@pytest.mark.skipif(not cache_codec.MSGPACK_AVAILABLE, reason="msgpack is not installed")
+def test_msgpack_frame_round_trip_and_json_body():
+    codec = CacheFrameCodec(MsgpackCodec, NoCompression, compress_min_bytes=0)
+    frame, _ = codec.encode(VALUE, exp=1.0, d=0.0)
+
+    decoded = CacheFrameCodec.decode(frame)
+    assert decoded.value == VALUE
+    assert JsonCodec.decode(decoded.json_body()) == VALUE
+
+
+@pytest.mark.skipif(not cache_codec.LZ4_AVAILABLE, reason="lz4 is not installed")
+def test_lz4_frame_round_trip():
+    value = {"items": ["y" * 50] * 100}
+    codec = CacheFrameCodec(JsonCodec, Lz4Compression, compress_min_bytes=0)
+    frame, _ = codec.encode(value, exp=1.0, d=0.0)
+    assert CacheFrameCodec.decode(frame).value == value
+
+
+@pytest.mark.parametrize("frame", [b"", b"not a frame", b"\x00" * 32])
+def test_unknown_frames_decode_to_none(frame):
+    assert CacheFrameCodec.decode(frame) is None
+
+
+@pytest.mark.skipif(not cache_codec.ORJSON_AVAILABLE, reason="orjson is not installed")
+def test_stdlib_fallback_matches_orjson_output(monkeypatch):
+    value = {
+        "created_at": datetime(2024, 5, 6, 7, 8, 9, 123456),
+        "aware": datetime(2024, 5, 6, 7, 8, 9, tzinfo=timezone.utc),
+        "color": Color.RED,
+        "name": "商品",
+        "count": 3,
+    }
+    with_orjson = JsonCodec.encode(value)
+    monkeypatch.setattr(cache_codec, "ORJSON_AVAILABLE", False)
+    assert JsonCodec.encode(value) == with_orjson
+
+
+def test_fallback_encodes_datetimes_as_iso_8601(monkeypatch):
+    monkeypatch.setattr(cache_codec, "ORJSON_AVAILABLE", False)
+    body = JsonCodec.encode({"at": datetime(2024, 1, 2, 3, 4, 5)})
+    assert body == b'{"at":"2024-01-02T03:04:05"}'
+
+
+def test_header_can_be_read_without_the_payload():
+    codec = CacheFrameCodec(JsonCodec, ZlibCompression, compress_min_bytes=0)
+    frame, entry = codec.encode(VALUE, exp=123.5, d=0.25)
+
+    codec_class, compression, exp, d, digest = CacheFrameCodec.decode_header(frame[:FRAME_HEADER.size])
+    assert (codec_class, compression, exp) == (JsonCodec, ZlibCompression, 123.5)
+    assert digest == entry.digest == content_digest(entry.body)
+    assert CacheFrameCodec.decode(frame).digest == entry.digest
@@ -0,0 +1,89 @@
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import DBAPIError
+
+from app.models.order import OrderStatus
+from app.services import order_item_service
+from app.services.order_item_service import CHECKOUT_RETRIES, OrderItemService
+
+
+class FakeDriverError(Exception):
+    def __init__(self, sqlstate):
+        super().__init__(sqlstate)
+        self.sqlstate = sqlstate
+
+
+def db_error(sqlstate):
+    return DBAPIError("COMMIT", None, FakeDriverError(sqlstate))
+
+
+@pytest.fixture
+def checkout_env(monkeypatch):
+    """
+    替换事务和下单依赖，返回 (checkout mock, 商品失效 mock)
+    """
+    @asynccontextmanager
+    async def fake_transaction():
+        yield MagicMock()
+
+    checkout = AsyncMock()
+    invalidate_products = AsyncMock()
+    monkeypatch.setattr(order_item_service.settings, "CART_BACKEND", "db")
+    monkeypatch.setattr(order_item_service, "transaction", fake_transaction)
+    monkeypatch.setattr(order_item_service, "invalidate_tags", AsyncMock())
+    monkeypatch.setattr(OrderItemService, "checkout", checkout)
+    monkeypatch.setattr(order_item_service.OutboxService, "enqueue", MagicMock())
+    monkeypatch.setattr(order_item_service.ProductService, "invalidate_products", invalidate_products)
+    return checkout, invalidate_products
+
+
+def placed_order():
+    order = SimpleNamespace(id=1, total_amount=20.0, order_status=OrderStatus.pending)
+    item = SimpleNamespace(id=10, order_id=1, product_id=5, quantity=2, price=20.0)
+    reserved = {5: {"stock": 3, "price": 10.0, "category_id": 2, "vendor_id": 1}}
+    return order, [item], reserved
+
+
+@pytest.mark.asyncio
+async def test_checkout_retries_after_deadlock(checkout_env):
+    checkout, invalidate_products = checkout_env
+    checkout.side_effect = [db_error("40P01"), placed_order()]
+    user = SimpleNamespace(id=1, email="buyer@example.com")
+
+    result = await OrderItemService.create_order_item(MagicMock(), user)
+
+    assert checkout.await_count == 2
+    assert result["order_id"] == 1
+    assert [item["product_id"] for item in result["order_items"]] == [5]
+    invalidate_products.assert_awaited_once_with(5)
+
+
+@pytest.mark.asyncio
+async def test_checkout_gives_up_after_repeated_deadlocks(checkout_env):
+    checkout, invalidate_products = checkout_env
+    checkout.side_effect = [db_error("40001")] * CHECKOUT_RETRIES
+    user = SimpleNamespace(id=1, email="buyer@example.com")
+
+    with pytest.raises(HTTPException) as exc_info:
+        await OrderItemService.create_order_item(MagicMock(), user)
+
+    assert exc_info.value.status_code == 500
+    assert checkout.await_count == CHECKOUT_RETRIES
+    invalidate_products.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_checkout_does_not_retry_other_database_errors(checkout_env):
+    checkout, _ = checkout_env
+    checkout.side_effect = [db_error("23505"), placed_order()]
+    user = SimpleNamespace(id=1, email="buyer@example.com")
+
+    with pytest.raises(HTTPException) as exc_info:
+        await OrderItemService.create_order_item(MagicMock(), user)
+
+    assert exc_info.value.status_code == 500
+    assert checkout.await_count == 1
@@ -0,0 +1,39 @@
+import pytest
+
+from app.services.embedding_cache import EmbeddingCache, normalize_query
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Wireless Headphones", "wireless headphones"),
+    ("  wireless \t\n headphones  ", "wireless headphones"),
+    ("ＡＢＣ　１２３", "abc 123"),  # 全角字母、数字和空格
+    ("蓝牙耳机", "蓝牙耳机"),
+])
+def test_normalize_query(text, expected):
+    assert normalize_query(text) == expected
+
+
+def test_equivalent_queries_share_a_cache_key():
+    cache = EmbeddingCache("model-a", max_bytes=1024, ttl=60, use_redis=False)
+    assert cache.key("Ｗｉｒｅｌｅｓｓ  HEADPHONES") == cache.key("wireless headphones")
+    assert cache.key("wireless headphones") != EmbeddingCache("model-b", 1024, 60, use_redis=False).key(
+        "wireless headphones")
+
+
+def test_cached_vector_matches_the_first_result():
+    cache = EmbeddingCache("model-a", max_bytes=1024, ttl=60, dtype="float16", use_redis=False)
+    calls = []
+
+    def encode(text):
+        calls.append(text)
+        return np.array([0.1, 0.2, 0.3], dtype=np.float32)
+
+    first = cache.embed("Headphones", encode)
+    second = cache.embed(" headphones ", encode)
+
+    assert calls == ["Headphones"]
+    assert np.array_equal(first, second)
+    assert cache.stats()["l1_hits"] == 1
+    assert cache.stats()["misses"] == 1
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from app.services.embedding_executor import EmbeddingBatcher
+
+
+class FakeEmbeddingService:
+    """
+    记录每次 encode 收到的批次，向量为 [len(text)]
+    """
+
+    def __init__(self, error: Exception = None):
+        self.batches = []
+        self.error = error
+
+    def encode(self, texts, batch_size, show_progress_bar):
+        self.batches.append(list(texts))
+        if self.error is not None:
+            raise self.error
+        return [[float(len(text))] for text in texts]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_are_encoded_in_one_batch():
+    service = FakeEmbeddingService()
+    batcher = EmbeddingBatcher(lambda: service, max_batch_size=32, max_wait=0.05)
+    try:
+        results = await asyncio.gather(*(batcher.encode("q" * n) for n in range(1, 6)))
+    finally:
+        batcher.close()
+
+    assert results == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    assert service.batches == [["q", "qq", "qqq", "qqqq", "qqqqq"]]
+
+
+@pytest.mark.asyncio
+async def test_batches_are_capped_by_max_batch_size():
+    service = FakeEmbeddingService()
+    batcher = EmbeddingBatcher(lambda: service, max_batch_size=2, max_wait=0.01)
+    try:
+        results = await batcher.encode_many(["a", "bb", "ccc", "dddd", "eeeee"])
+    finally:
+        batcher.close()
+
+    assert results == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    assert all(len(batch) <= 2 for batch in service.batches)
+    assert [text for batch in service.batches for text in batch] == ["a", "bb", "ccc", "dddd", "eeeee"]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_queries_are_not_encoded():
+    service = FakeEmbeddingService()
+    batcher = EmbeddingBatcher(lambda: service, max_batch_size=32, max_wait=0.05)
+    try:
+        cancelled = asyncio.create_task(batcher.encode("cancelled"))
+        kept = asyncio.create_task(batcher.encode("kept"))
+        await asyncio.sleep(0.01)  # 两条查询都已入队，执行器仍在等待窗口内
+        cancelled.cancel()
+
+        assert await kept == [4.0]
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+    finally:
+        batcher.close()
+
+    assert service.batches == [["kept"]]
+
+
+@pytest.mark.asyncio
+async def test_encode_error_is_raised_to_every_caller_and_worker_keeps_running():
+    service = FakeEmbeddingService(error=RuntimeError("model failed"))
+    batcher = EmbeddingBatcher(lambda: service, max_batch_size=32, max_wait=0.05)
+    try:
+        results = await asyncio.gather(batcher.encode("a"), batcher.encode("b"), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+        service.error = None
+        assert await batcher.encode("ccc") == [3.0]
+    finally:
+        batcher.close()
@@ -0,0 +1,151 @@
+import hashlib
+import time
+from unittest.mock import AsyncMock
+
+import fakeredis.aioredis
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.database.session import get_db
+from app.routers import products
+from app.utils import cache, cache_codec
+from app.utils.cache_codec import CacheFrameCodec, JsonCodec, MsgpackCodec, NoCompression
+from app.utils.local_cache import LocalCache
+
+
+KEY = "products:list:v0:page:1:size:10"
+
+
+class BrokenRedis:
+    async def mget(self, *args, **kwargs):
+        raise ConnectionError("redis is down")
+
+    async def getrange(self, *args, **kwargs):
+        raise ConnectionError("redis is down")
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    """
+    独立的进程内缓存和版本号副本，Redis 使用 fakeredis
+    """
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(cache, "redis_connection", fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+    monkeypatch.setattr(cache, "redis_binary_connection", fakeredis.aioredis.FakeRedis(server=server))
+    monkeypatch.setattr(cache, "local_cache", LocalCache(max_bytes=1024 * 1024, max_ttl=60))
+    monkeypatch.setattr(cache, "_local_generations", {})
+    return cache
+
+
+@pytest.mark.asyncio
+async def test_unreadable_generations_produce_an_unversioned_key(fresh_cache, monkeypatch):
+    healthy = fresh_cache.redis_connection
+    monkeypatch.setattr(fresh_cache, "redis_connection", BrokenRedis())
+
+    key = await fresh_cache.versioned_key("products:list", ["catalog"], "page:1")
+    assert not fresh_cache.is_versioned(key)
+    assert fresh_cache._local_generations == {}
+
+    monkeypatch.setattr(fresh_cache, "redis_connection", healthy)
+    key = await fresh_cache.versioned_key("products:list", ["catalog"], "page:1")
+    assert key == "products:list:v0:page:1"
+    assert fresh_cache.is_versioned(key)
+
+
+@pytest.mark.asyncio
+async def test_cached_digest_reads_the_frame_header(fresh_cache):
+    codec = CacheFrameCodec(JsonCodec, NoCompression, compress_min_bytes=0)
+    frame, entry = codec.encode({"items": [1, 2, 3]}, exp=time.time() + 60, d=0.0)
+    await fresh_cache.redis_binary_connection.set(KEY, frame)
+
+    assert await fresh_cache.cached_digest(KEY) == hashlib.sha1(entry.body).hexdigest()
+
+    # 版本号丢失后同一个键下写入了不同的内容：摘要随之变化
+    frame, changed = codec.encode({"items": [4]}, exp=time.time() + 60, d=0.0)
+    await fresh_cache.redis_binary_connection.set(KEY, frame)
+    assert await fresh_cache.cached_digest(KEY) == hashlib.sha1(changed.body).hexdigest()
+
+
+@pytest.mark.asyncio
+async def test_cached_digest_is_unknown_for_missing_or_expired_entries(fresh_cache):
+    assert await fresh_cache.cached_digest(KEY) is None
+
+    expired, _ = CacheFrameCodec(JsonCodec, NoCompression, 0).encode([1], exp=time.time() - 1, d=0.0)
+    await fresh_cache.redis_binary_connection.set(KEY, expired)
+    assert await fresh_cache.cached_digest(KEY) is None
+
+
+@pytest.mark.skipif(not cache_codec.MSGPACK_AVAILABLE, reason="msgpack is not installed")
+@pytest.mark.asyncio
+async def test_cached_digest_is_unknown_for_msgpack_entries(fresh_cache):
+    # msgpack 负载的摘要与输出的JSON响应体不同，回源后按响应体计算
+    frame, _ = CacheFrameCodec(MsgpackCodec, NoCompression, 0).encode([1], exp=time.time() + 60, d=0.0)
+    await fresh_cache.redis_binary_connection.set(KEY, frame)
+    assert await fresh_cache.cached_digest(KEY) is None
+
+
+@pytest.mark.asyncio
+async def test_cached_digest_uses_the_local_entry_without_redis(fresh_cache, monkeypatch):
+    _, entry = CacheFrameCodec(JsonCodec, NoCompression, 0).encode([1], exp=time.time() + 60, d=0.0)
+    fresh_cache.local_cache.set(KEY, entry, entry.size, 60)
+    monkeypatch.setattr(fresh_cache, "redis_binary_connection", BrokenRedis())
+
+    assert await fresh_cache.cached_digest(KEY) == entry.digest.hex()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """
+    只挂载商品路由；缓存键、缓存摘要和商品列表由各测试指定
+    """
+    app = FastAPI()
+    app.include_router(products.router)
+    app.dependency_overrides[get_db] = lambda: None
+    state = {"key": KEY, "body": b'[{"id":1}]', "cached": True}
+
+    async def cache_key(filters):
+        return state["key"]
+
+    async def digest(key):
+        return hashlib.sha1(state["body"]).hexdigest() if state["cached"] else None
+
+    async def load(db, filters, raw=False, cache_key=None):
+        return state["body"]
+
+    monkeypatch.setattr(products.ProductService, "get_products_cache_key", cache_key)
+    monkeypatch.setattr(products.ProductService, "get_all_products", load)
+    monkeypatch.setattr(products, "cached_digest", AsyncMock(side_effect=digest))
+    return TestClient(app), state
+
+
+def test_matching_etag_returns_not_modified(client):
+    http, state = client
+    first = http.get("/products/")
+    assert first.status_code == 200
+    assert first.content == b'{"products":[{"id":1}]}'
+
+    again = http.get("/products/", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+
+
+def test_etag_changes_with_content_under_the_same_key(client):
+    http, state = client
+    etag = http.get("/products/").headers["ETag"]
+
+    # 同一个缓存键（例如版本号从0重新计数）下内容已经变化
+    state["body"] = b'[{"id":2}]'
+    response = http.get("/products/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_no_etag_when_generations_are_unknown(client):
+    http, state = client
+    etag = http.get("/products/").headers["ETag"]
+    state["key"] = cache.UNVERSIONED_PREFIX + KEY
+
+    response = http.get("/products/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
+    products.cached_digest.assert_awaited_once()
@@ -0,0 +1,164 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock
+
+import fakeredis.aioredis
+import pytest
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.requests import Request
+
+from app.config.settings import settings
+from app.utils import idempotency
+from app.utils.idempotency import idempotent, KEY_PREFIX, REPLAYED_HEADER
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    connection = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(idempotency, "redis_connection", connection)
+    monkeypatch.setattr(idempotency, "POLL_INTERVAL", 0.01)
+    return connection
+
+
+def make_request(body: dict, path: str = "/orders/checkout") -> Request:
+    payload = json.dumps(body).encode()
+
+    async def receive():
+        return {"type": "http.request", "body": payload, "more_body": False}
+    return Request({"type": "http", "method": "POST", "path": path, "query_string": b"", "headers": []}, receive)
+
+
+def counting_call():
+    return AsyncMock(return_value={"order_id": 1})
+
+
+@pytest.mark.asyncio
+async def test_replay_returns_the_stored_response_without_running_again(redis):
+    call = counting_call()
+
+    first = await idempotent(make_request({"cart": 1}), "checkout:7", "key-1", call)
+    replay = await idempotent(make_request({"cart": 1}), "checkout:7", "key-1", call)
+
+    assert call.await_count == 1
+    assert (replay.status_code, replay.body) == (first.status_code, first.body)
+    assert replay.headers[REPLAYED_HEADER] == "true"
+    assert REPLAYED_HEADER not in first.headers
+    assert 0 < await redis.ttl(f"{KEY_PREFIX}checkout:7:key-1") <= settings.IDEMPOTENCY_TTL
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_wait_for_the_first_request(redis):
+    started = asyncio.Event()
+    release = asyncio.Event()
+    calls = 0
+
+    async def checkout():
+        nonlocal calls
+        calls += 1
+        started.set()
+        await release.wait()
+        return {"order_id": calls}
+
+    first = asyncio.create_task(idempotent(make_request({"cart": 1}), "checkout:7", "key-1", checkout))
+    await started.wait()
+    duplicate = asyncio.create_task(idempotent(make_request({"cart": 1}), "checkout:7", "key-1", checkout))
+    await asyncio.sleep(0.05)
+    assert not duplicate.done()
+
+    release.set()
+    first, duplicate = await asyncio.gather(first, duplicate)
+
+    assert calls == 1
+    assert duplicate.body == first.body == b'{"order_id":1}'
+    assert duplicate.headers[REPLAYED_HEADER] == "true"
+
+
+@pytest.mark.asyncio
+async def test_same_key_with_a_different_body_is_rejected(redis):
+    call = counting_call()
+    await idempotent(make_request({"cart": 1}), "checkout:7", "key-1", call)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await idempotent(make_request({"cart": 2}), "checkout:7", "key-1", call)
+
+    assert exc_info.value.status_code == 422
+    assert call.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_keys_are_scoped(redis):
+    call = counting_call()
+
+    await idempotent(make_request({"cart": 1}), "checkout:7", "key-1", call)
+    response = await idempotent(make_request({"cart": 1}), "checkout:8", "key-1", call)
+
+    assert call.await_count == 2
+    assert REPLAYED_HEADER not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_in_progress_request_times_out_with_conflict(redis, monkeypatch):
+    monkeypatch.setattr(settings, "IDEMPOTENCY_WAIT_TIMEOUT", 0.05)
+    fingerprint = await idempotency.request_fingerprint(make_request({"cart": 1}))
+    await redis.set(f"{KEY_PREFIX}checkout:7:key-1", json.dumps({"state": "pending", "fp": fingerprint}))
+    call = counting_call()
+
+    with pytest.raises(HTTPException) as exc_info:
+        await idempotent(make_request({"cart": 1}), "checkout:7", "key-1", call)
+
+    assert exc_info.value.status_code == 409
+    call.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_failures_release_the_key_for_retries(redis):
+    failing = AsyncMock(side_effect=HTTPException(status_code=400, detail="Cart is empty"))
+    with pytest.raises(HTTPException):
+        await idempotent(make_request({"cart": 1}), "checkout:7", "key-1", failing)
+    assert await redis.exists(f"{KEY_PREFIX}checkout:7:key-1") == 0
+
+    unavailable = AsyncMock(return_value=JSONResponse({"detail": "down"}, status_code=503))
+    await idempotent(make_request({"cart": 1}), "checkout:7", "key-1", unavailable)
+    assert await redis.exists(f"{KEY_PREFIX}checkout:7:key-1") == 0
+
+    call = counting_call()
+    response = await idempotent(make_request({"cart": 1}), "checkout:7", "key-1", call)
+    assert response.status_code == 200
+    call.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_replayed(redis):
+    call = AsyncMock(return_value=JSONResponse({"detail": "Insufficient stock"}, status_code=400))
+
+    await idempotent(make_request({"cart": 1}), "checkout:7", "key-1", call)
+    replay = await idempotent(make_request({"cart": 1}), "checkout:7", "key-1", call)
+
+    assert replay.status_code == 400
+    call.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_without_a_key_or_redis_the_request_runs_normally(monkeypatch):
+    broken = AsyncMock()
+    broken.set.side_effect = ConnectionError("redis down")
+    monkeypatch.setattr(idempotency, "redis_connection", broken)
+    call = counting_call()
+
+    await idempotent(make_request({"cart": 1}), "checkout:7", None, call)
+    await idempotent(make_request({"cart": 1}), "checkout:7", "key-1", call)
+    await idempotent(make_request({"cart": 1}), "checkout:7", "key-1", call)
+
+    assert call.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_overlong_keys_are_rejected(redis):
+    call = counting_call()
+
+    with pytest.raises(HTTPException) as exc_info:
+        await idempotent(make_request({}), "checkout:7", "k" * (idempotency.MAX_KEY_LENGTH + 1), call)
+
+    assert exc_info.value.status_code == 400
+    call.assert_not_awaited()
@@ -0,0 +1,147 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import fakeredis.aioredis
+import pytest
+from fastapi import HTTPException
+
+from app.services import inventory_ledger_service
+from app.services.inventory_ledger_service import (InventoryLedgerService, AUTO_INACTIVE_KEY, FLASH_SKUS_KEY,
+                                                   RESERVATION_DEADLINES_KEY, STOCK_PREFIX)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    connection = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(inventory_ledger_service, "redis_connection", connection)
+    monkeypatch.setattr(InventoryLedgerService, "_invalidate", AsyncMock())
+    return connection
+
+
+async def put_on_flash_sale(redis, stocks):
+    for product_id, stock in stocks.items():
+        await redis.sadd(FLASH_SKUS_KEY, product_id)
+        await redis.set(f"{STOCK_PREFIX}{product_id}", stock)
+
+
+async def stock(redis, product_id):
+    return int(await redis.get(f"{STOCK_PREFIX}{product_id}"))
+
+
+@pytest.mark.asyncio
+async def test_reserve_takes_all_lines_and_records_the_reservation(redis):
+    await put_on_flash_sale(redis, {1: 5, 2: 3})
+
+    await InventoryLedgerService.reserve(10, {1: 2, 2: 3})
+
+    assert (await stock(redis, 1), await stock(redis, 2)) == (3, 0)
+    assert await InventoryLedgerService.reserved_items([10, 11]) == {10: {1: 2, 2: 3}}
+    assert await redis.zscore(RESERVATION_DEADLINES_KEY, "10") is not None
+
+
+@pytest.mark.asyncio
+async def test_reserve_is_all_or_nothing(redis):
+    await put_on_flash_sale(redis, {1: 5, 2: 1})
+
+    with pytest.raises(HTTPException) as exc_info:
+        await InventoryLedgerService.reserve(10, {1: 2, 2: 2})
+
+    assert exc_info.value.status_code == 400
+    assert exc_info.value.detail == "Insufficient stock for product 2. Available: 1, Requested: 2"
+    assert (await stock(redis, 1), await stock(redis, 2)) == (5, 1)
+    assert await InventoryLedgerService.reserved_items([10]) == {}
+
+
+@pytest.mark.asyncio
+async def test_reserve_rejects_products_that_left_flash_sale(redis):
+    await put_on_flash_sale(redis, {1: 5})
+
+    with pytest.raises(HTTPException) as exc_info:
+        await InventoryLedgerService.reserve(10, {1: 1, 2: 1})
+
+    assert exc_info.value.status_code == 409
+    assert await stock(redis, 1) == 5
+
+
+@pytest.mark.asyncio
+async def test_release_returns_stock_and_writes_back_products_no_longer_on_flash_sale(redis, monkeypatch):
+    await put_on_flash_sale(redis, {1: 5, 2: 5})
+    await InventoryLedgerService.reserve(10, {1: 2, 2: 1})
+    await redis.srem(FLASH_SKUS_KEY, 2)  # 商品2已退出秒杀模式
+    release_stock = AsyncMock(return_value=[{"id": 2, "stock": 1, "category_id": 1}])
+    monkeypatch.setattr(inventory_ledger_service.InventoryService, "release_stock", release_stock)
+    db = MagicMock()
+    db.commit = AsyncMock()
+
+    released = await InventoryLedgerService.release(db, 10)
+
+    assert released == {1: 2, 2: 1}
+    assert await stock(redis, 1) == 5
+    release_stock.assert_awaited_once_with(db, {2: 1})
+    db.commit.assert_awaited_once()
+    assert await InventoryLedgerService.reserved_items([10]) == {}
+    assert await redis.zscore(RESERVATION_DEADLINES_KEY, "10") is None
+
+    # 重复归还不会再次加回库存
+    assert await InventoryLedgerService.release(db, 10) == {}
+    assert await stock(redis, 1) == 5
+
+
+@pytest.mark.asyncio
+async def test_enable_keeps_existing_ledger_stock(redis):
+    await put_on_flash_sale(redis, {1: 3})
+    db = MagicMock()
+    result = MagicMock()
+    result.scalars.return_value.first.return_value = SimpleNamespace(id=1, stock=100)
+    db.execute = AsyncMock(return_value=result)
+
+    assert await InventoryLedgerService.enable(db, 1) == 3
+
+
+@pytest.mark.asyncio
+async def test_set_stock_only_updates_flash_products_and_clears_auto_inactive(redis):
+    await put_on_flash_sale(redis, {1: 0})
+    await redis.sadd(AUTO_INACTIVE_KEY, 1, 2)
+
+    assert await InventoryLedgerService.set_stock(1, 20) is True
+    assert await InventoryLedgerService.set_stock(2, 7) is False
+
+    assert await stock(redis, 1) == 20
+    assert await redis.get(f"{STOCK_PREFIX}2") is None
+    assert await redis.smembers(AUTO_INACTIVE_KEY) == set()
+
+
+@pytest.mark.asyncio
+async def test_disable_returns_remaining_stock_and_forgets_the_product(redis, monkeypatch):
+    await put_on_flash_sale(redis, {1: 4})
+    await redis.sadd(AUTO_INACTIVE_KEY, 1)
+    sync_stock = AsyncMock()
+    monkeypatch.setattr(InventoryLedgerService, "_sync_stock", sync_stock)
+
+    assert await InventoryLedgerService.disable(MagicMock(), 1) == 4
+
+    sync_stock.assert_awaited_once()
+    assert sync_stock.await_args.args[1] == {1: 4}
+    assert not await redis.sismember(FLASH_SKUS_KEY, 1)
+    assert await redis.get(f"{STOCK_PREFIX}1") is None
+    assert await redis.smembers(AUTO_INACTIVE_KEY) == set()
+
+
+@pytest.mark.asyncio
+async def test_sync_stock_only_reactivates_products_it_deactivated(redis):
+    await redis.sadd(AUTO_INACTIVE_KEY, 2)
+    rows = [
+        SimpleNamespace(id=1, category_id=1, is_active=False, was_active=True),  # 库存归零，自动下架
+        SimpleNamespace(id=2, category_id=1, is_active=True, was_active=False),  # 自动下架后库存恢复
+        SimpleNamespace(id=3, category_id=1, is_active=False, was_active=False),  # 手动下架
+    ]
+    result = MagicMock()
+    result.all.return_value = rows
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=result)
+    db.commit = AsyncMock()
+
+    await InventoryLedgerService._sync_stock(db, {1: 0, 2: 5, 3: 5})
+
+    assert await redis.smembers(AUTO_INACTIVE_KEY) == {"1"}
+    db.commit.assert_awaited_once()
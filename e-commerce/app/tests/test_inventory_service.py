@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.inventory_service import InventoryService
+
+
+def execute_results(*rows_per_call):
+    """
+    模拟 db.execute：第 n 次调用返回的结果的 .all() 为第 n 组行
+    """
+    results = []
+    for rows in rows_per_call:
+        result = MagicMock()
+        result.all.return_value = rows
+        results.append(result)
+    return AsyncMock(side_effect=results)
+
+
+def reserved_row(product_id, stock, price=10.0, category_id=1, vendor_id=1):
+    return SimpleNamespace(id=product_id, stock=stock, price=price, category_id=category_id, vendor_id=vendor_id)
+
+
+@pytest.mark.asyncio
+async def test_reserve_stock_without_lines_does_not_query():
+    db = MagicMock()
+    db.execute = AsyncMock()
+
+    assert await InventoryService.reserve_stock(db, {}) == {}
+    db.execute.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_reserve_stock_returns_remaining_stock_and_prices():
+    db = MagicMock()
+    db.execute = execute_results([reserved_row(1, 8, price=5.0, category_id=3), reserved_row(2, 0, vendor_id=9)])
+
+    reserved = await InventoryService.reserve_stock(db, {2: 4, 1: 2})
+
+    assert reserved == {
+        1: {"stock": 8, "price": 5.0, "category_id": 3, "vendor_id": 1},
+        2: {"stock": 0, "price": 10.0, "category_id": 1, "vendor_id": 9},
+    }
+    assert db.execute.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_reserve_stock_shortfall_reports_available_and_requested():
+    db = MagicMock()
+    # 商品2库存不足，未出现在 UPDATE ... RETURNING 的结果中
+    db.execute = execute_results([reserved_row(1, 8)], [(2, 3)])
+
+    with pytest.raises(HTTPException) as exc_info:
+        await InventoryService.reserve_stock(db, {1: 2, 2: 5})
+
+    assert exc_info.value.status_code == 400
+    assert exc_info.value.detail == "Insufficient stock for product 2. Available: 3, Requested: 5"
+
+
+@pytest.mark.asyncio
+async def test_reserve_stock_missing_product_is_not_found():
+    db = MagicMock()
+    db.execute = execute_results([], [])
+
+    with pytest.raises(HTTPException) as exc_info:
+        await InventoryService.reserve_stock(db, {99: 1})
+
+    assert exc_info.value.status_code == 404
+    assert exc_info.value.detail == "Product 99 not found"
@@ -0,0 +1,214 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.services import knowledge_base_service
+from app.services.knowledge_base_service import KnowledgeBaseService, SYNC_OVERLAP
+
+
+SYNC_STARTED_AT = datetime(2026, 1, 2, 3, 0, 0)
+
+
+class FakeVectorStore:
+    """
+    内存中的向量库，记录清空集合和写入高水位的顺序
+    """
+
+    def __init__(self, events, watermark=None, doc_ids=()):
+        self.events = events
+        self.watermark = watermark
+        self.docs = {doc_id: {} for doc_id in doc_ids}
+
+    @staticmethod
+    def document_id(doc):
+        return f"{doc['type']}:{doc['id']}"
+
+    def reset_collection(self):
+        self.events.append("reset")
+        self.docs.clear()
+        self.watermark = None
+
+    def get_watermark(self):
+        return self.watermark
+
+    def set_watermark(self, synced_at):
+        self.events.append("watermark")
+        self.watermark = synced_at
+
+    def filter_changed(self, documents):
+        return documents
+
+    def encode_documents(self, documents):
+        return [[0.0] for _ in documents]
+
+    def upsert_embeddings(self, documents, embeddings):
+        for doc in documents:
+            self.docs[self.document_id(doc)] = doc
+
+    def list_ids_page(self, offset, limit):
+        self.events.append("list_ids")
+        return list(self.docs)[offset:offset + limit]
+
+    def filter_existing(self, ids):
+        return [doc_id for doc_id in ids if doc_id in self.docs]
+
+    def delete_documents(self, ids):
+        for doc_id in ids:
+            self.docs.pop(doc_id, None)
+
+
+def query_result(scalar_one=SYNC_STARTED_AT, rows=(), scalars=()):
+    result = MagicMock()
+    result.scalar_one.return_value = scalar_one
+    result.all.return_value = list(rows)
+    result.scalars.return_value = list(scalars)
+    return result
+
+
+def fake_db(*results):
+    """
+    results 为依次返回的查询结果；不指定时每次查询都返回空结果
+    """
+    db = MagicMock()
+    db.execute = AsyncMock(side_effect=list(results)) if results else AsyncMock(return_value=query_result())
+    db.commit = AsyncMock()
+    return db
+
+
+def compiled(statement):
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def product(product_id):
+    return {"id": product_id, "type": "product", "text": f"商品{product_id}"}
+
+
+@pytest.mark.asyncio
+async def test_rebuild_waits_for_running_sync_and_ignores_its_watermark(monkeypatch):
+    events = []
+    watermark = datetime(2026, 1, 1)
+    store = FakeVectorStore(events, watermark=watermark, doc_ids=["product:1", "product:2"])
+    release_update = asyncio.Event()
+
+    async def stream_documents(db, since=None, batch_size=None):
+        events.append(("stream", since))
+        if since is not None:
+            # 增量同步读到一半时触发重建
+            await release_update.wait()
+            yield [product(2)]
+        else:
+            yield [product(1), product(2), product(3)]
+
+    monkeypatch.setattr(KnowledgeBaseService, "stream_documents", stream_documents)
+    monkeypatch.setattr(KnowledgeBaseService, "delete_stale", AsyncMock(return_value=0))
+    monkeypatch.setattr(knowledge_base_service, "_sync_lock", asyncio.Lock())
+
+    update = asyncio.create_task(KnowledgeBaseService.sync(fake_db(), store))
+    while ("stream", watermark - SYNC_OVERLAP) not in events:
+        await asyncio.sleep(0)
+    rebuild = asyncio.create_task(KnowledgeBaseService.sync(fake_db(), store, rebuild=True))
+    await asyncio.sleep(0.01)
+    assert "reset" not in events
+
+    release_update.set()
+    await asyncio.gather(update, rebuild)
+
+    assert events == [("stream", watermark - SYNC_OVERLAP), "watermark", "reset", ("stream", None), "watermark"]
+    assert set(store.docs) == {"product:1", "product:2", "product:3"}
+    assert store.watermark == SYNC_STARTED_AT
+
+
+async def no_documents(db, since=None, batch_size=None):
+    return
+    yield
+
+
+@pytest.mark.asyncio
+async def test_incremental_sync_deletes_only_removed_and_deactivated_documents(monkeypatch):
+    events = []
+    watermark = datetime(2026, 1, 1)
+    store = FakeVectorStore(events, watermark=watermark, doc_ids=[
+        "product:1", "product:3", "product:5", "review:7", "review:8", "review:9"])
+    monkeypatch.setattr(KnowledgeBaseService, "stream_documents", no_documents)
+    db = fake_db(
+        query_result(),  # 同步开始时间
+        query_result(rows=[("product", 5), ("review", 7), ("review", 70)]),  # 删除记录（review:70 不在向量库中）
+        query_result(scalars=[3]),  # 高水位之后下架的商品
+        query_result(scalars=[8]),  # 下架商品的主评论
+        query_result(),  # 清理删除记录
+    )
+
+    result = await KnowledgeBaseService.sync(db, store)
+
+    assert result["deleted"] == 4
+    assert set(store.docs) == {"product:1", "review:9"}
+    assert "list_ids" not in events
+    statements = [compiled(call.args[0]) for call in db.execute.await_args_list]
+    assert "deleted_documents.deleted_at >" in statements[1]
+    assert "DELETE FROM deleted_documents" in statements[-1]
+    # 删除记录只在高水位写入之后清理
+    assert store.watermark == SYNC_STARTED_AT
+    db.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_full_scan_checks_every_stored_document(monkeypatch):
+    events = []
+    store = FakeVectorStore(events, watermark=datetime(2026, 1, 1), doc_ids=["product:1", "review:2"])
+    monkeypatch.setattr(KnowledgeBaseService, "stream_documents", no_documents)
+    db = fake_db(
+        query_result(),  # 同步开始时间
+        query_result(scalars=[1]),  # 仍然上架的商品
+        query_result(scalars=[]),  # 主评论所属商品已下架
+        query_result(),  # 清理删除记录
+    )
+
+    result = await KnowledgeBaseService.sync(db, store, full_scan=True)
+
+    assert "list_ids" in events
+    assert result["deleted"] == 1
+    assert set(store.docs) == {"product:1"}
+
+
+@pytest.mark.asyncio
+async def test_reviews_of_inactive_products_are_not_kept():
+    db = fake_db(query_result(scalars=[]))
+
+    assert await KnowledgeBaseService.existing_document_ids(db, ["review:1"]) == set()
+    statement = compiled(db.execute.await_args.args[0])
+    assert "products.is_active" in statement
+
+
+def executed_update(db):
+    return compiled(db.execute.await_args_list[0].args[0])
+
+
+@pytest.mark.asyncio
+async def test_view_count_flush_keeps_updated_at():
+    from app.services.view_counter_service import ViewCounterService
+
+    db = fake_db()
+    await ViewCounterService.apply_deltas(db, {1: 3})
+
+    assert "updated_at=products.updated_at" in executed_update(db)
+
+
+@pytest.mark.asyncio
+async def test_stock_updates_only_touch_updated_at_when_visibility_changes():
+    from app.services.inventory_service import InventoryService
+
+    db = fake_db(query_result(rows=[SimpleNamespace(id=1, stock=1, price=1.0, category_id=1, vendor_id=1)]))
+    await InventoryService.reserve_stock(db, {1: 1})
+    reserve = executed_update(db)
+
+    db = fake_db()
+    await InventoryService.release_stock(db, {1: 1})
+    release = executed_update(db)
+
+    for statement in (reserve, release):
+        assert "updated_at=CASE WHEN" in statement
+        assert "ELSE products.updated_at END" in statement
@@ -0,0 +1,51 @@
+from app.utils import local_cache as local_cache_module
+from app.utils.local_cache import LocalCache
+
+
+def test_evicts_least_recently_used_by_bytes():
+    cache = LocalCache(max_bytes=10, max_ttl=60)
+    cache.set("a", "A", 4, 60)
+    cache.set("b", "B", 4, 60)
+    assert cache.get("a") == "A"  # a 变为最近使用
+
+    cache.set("c", "C", 4, 60)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+    assert cache.current_bytes == 8
+    assert cache.evictions == 1
+
+
+def test_replacing_a_key_updates_byte_count():
+    cache = LocalCache(max_bytes=100, max_ttl=60)
+    cache.set("a", "old", 30, 60)
+    cache.set("a", "new", 10, 60)
+    assert cache.get("a") == "new"
+    assert cache.current_bytes == 10
+
+    cache.delete("a")
+    assert cache.current_bytes == 0
+    assert cache.stats()["entries"] == 0
+
+
+def test_oversized_and_expired_entries_are_not_stored():
+    cache = LocalCache(max_bytes=10, max_ttl=60)
+    cache.set("big", "x", 11, 60)
+    cache.set("expired", "x", 1, 0)
+    assert cache.get("big") is None
+    assert cache.get("expired") is None
+    assert cache.current_bytes == 0
+
+
+def test_ttl_is_capped_by_max_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(local_cache_module.time, "monotonic", lambda: now[0])
+    cache = LocalCache(max_bytes=100, max_ttl=5)
+    cache.set("a", "A", 1, 60)
+
+    now[0] += 4.9
+    assert cache.get("a") == "A"
+    now[0] += 0.2
+    assert cache.get("a") is None
+    assert cache.current_bytes == 0
@@ -0,0 +1,157 @@
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.config.settings import settings
+from app.services import outbox_service
+from app.services.outbox_service import OutboxService, ORDER_PLACED, PAYMENT_COMPLETED
+
+
+def compiled(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+
+class FakeTransactions:
+    """
+    记录每个短事务中执行的语句，以及事务的开始/结束顺序
+    """
+    def __init__(self, claimed):
+        self.claimed = claimed
+        self.statements = []
+        self.log = []
+
+    @asynccontextmanager
+    async def __call__(self):
+        tx = MagicMock()
+        tx.execute = AsyncMock(side_effect=self._execute)
+        self.log.append("begin")
+        yield tx
+        self.log.append("commit")
+
+    async def _execute(self, stmt):
+        self.statements.append(stmt)
+        result = MagicMock()
+        result.all.return_value = self.claimed if len(self.statements) == 1 else []
+        return result
+
+
+def event(event_id, attempts=1, event_type=ORDER_PLACED):
+    return SimpleNamespace(id=event_id, event_type=event_type, payload={"order_id": event_id},
+                           idempotency_key=f"{event_type}:{event_id}", attempts=attempts)
+
+
+@pytest.fixture
+def transactions(monkeypatch):
+    def install(claimed):
+        fake = FakeTransactions(claimed)
+        monkeypatch.setattr(outbox_service, "transaction", fake)
+        return fake
+    return install
+
+
+def test_enqueue_rejects_unknown_event_types():
+    db = MagicMock()
+
+    with pytest.raises(ValueError):
+        OutboxService.enqueue(db, "order.unknown", {})
+
+    db.add.assert_not_called()
+
+
+def test_enqueue_adds_the_event_to_the_session_without_flushing():
+    db = MagicMock()
+
+    event = OutboxService.enqueue(db, PAYMENT_COMPLETED, {"order_id": 1}, idempotency_key="payment:1")
+
+    db.add.assert_called_once_with(event)
+    db.flush.assert_not_called()
+    assert (event.event_type, event.idempotency_key) == (PAYMENT_COMPLETED, "payment:1")
+
+
+@pytest.mark.asyncio
+async def test_claim_skips_locked_rows_and_takes_a_lease(transactions):
+    fake = transactions([event(1)])
+
+    claimed = await OutboxService._claim()
+
+    assert claimed == fake.claimed
+    sql = compiled(fake.statements[0])
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "attempts=(outbox.attempts + %(attempts_1)s)" in sql
+    assert "available_at=(now() + %(now_1)s)" in sql
+    assert "outbox.dispatched_at IS NULL AND outbox.dead_at IS NULL" in sql
+    assert fake.log == ["begin", "commit"]
+
+
+@pytest.mark.asyncio
+async def test_dispatch_publishes_outside_the_claim_transaction(transactions, monkeypatch):
+    fake = transactions([event(1), event(2)])
+
+    def publish(event_type, payload, idempotency_key):
+        fake.log.append(f"publish {idempotency_key}")
+    monkeypatch.setattr(OutboxService, "_publish", staticmethod(publish))
+
+    assert await OutboxService.dispatch_batch() == 2
+
+    assert fake.log == ["begin", "commit",
+                        f"publish {ORDER_PLACED}:1", f"publish {ORDER_PLACED}:2",
+                        "begin", "commit"]
+    assert len(fake.statements) == 2
+    sql = compiled(fake.statements[1])
+    assert "SET dispatched_at=now()" in sql
+    assert fake.statements[1].compile().params["id_1"] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_dispatch_backs_off_failed_events_and_dead_letters_exhausted_ones(transactions, monkeypatch):
+    fake = transactions([event(1, attempts=3), event(2, attempts=settings.OUTBOX_MAX_ATTEMPTS), event(3)])
+
+    def publish(event_type, payload, idempotency_key):
+        if idempotency_key != f"{ORDER_PLACED}:3":
+            raise ConnectionError("broker unavailable")
+    monkeypatch.setattr(OutboxService, "_publish", staticmethod(publish))
+
+    assert await OutboxService.dispatch_batch() == 3
+
+    dispatched, retried, dead = fake.statements[1:]
+    assert dispatched.compile().params["id_1"] == [3]
+
+    retried_sql = compiled(retried)
+    assert "available_at=(now() + %(now_1)s)" in retried_sql
+    assert "dead_at" not in retried_sql
+    params = retried.compile().params
+    assert params["now_1"].total_seconds() == 2 ** 3
+    assert (params["id_1"], params["last_error"]) == (1, "broker unavailable")
+
+    dead_sql = compiled(dead)
+    assert "dead_at=now()" in dead_sql
+    assert "available_at" not in dead_sql
+    assert dead.compile().params["id_1"] == 2
+
+
+@pytest.mark.asyncio
+async def test_dispatch_without_due_events_does_not_publish(transactions, monkeypatch):
+    fake = transactions([])
+    publish = MagicMock()
+    monkeypatch.setattr(OutboxService, "_publish", staticmethod(publish))
+
+    assert await OutboxService.dispatch_batch() == 0
+
+    publish.assert_not_called()
+    assert len(fake.statements) == 1
+
+
+@pytest.mark.asyncio
+async def test_stats_counts_pending_and_dead_events():
+    db = MagicMock()
+    result = MagicMock()
+    result.one.return_value = (4, 1)
+    db.execute = AsyncMock(return_value=result)
+
+    assert await OutboxService.stats(db) == {"pending": 4, "dead": 1}
+    sql = compiled(db.execute.await_args.args[0])
+    assert "FILTER (WHERE outbox.dispatched_at IS NULL AND outbox.dead_at IS NULL)" in sql
+    assert "FILTER (WHERE outbox.dead_at IS NOT NULL)" in sql
@@ -0,0 +1,49 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.utils.pagination import decode_cursor, encode_cursor
+
+
+def test_created_at_cursor_round_trip():
+    created_at = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    cursor = encode_cursor("created_at", created_at, 42, "next")
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor, "created_at") == (created_at, 42, "next")
+
+
+def test_price_cursor_round_trip():
+    cursor = encode_cursor("price", 19.99, 7, "prev")
+    key_value, row_id, direction = decode_cursor(cursor, "price")
+
+    assert key_value == 19.99
+    assert isinstance(key_value, float)
+    assert (row_id, direction) == (7, "prev")
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "", base64.urlsafe_b64encode(b"[1, 2]").decode()])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(cursor, "price")
+    assert exc_info.value.status_code == 400
+    assert exc_info.value.detail == "Invalid cursor."
+
+
+def test_cursor_for_another_sort_is_rejected():
+    cursor = encode_cursor("price", 10.0, 1, "next")
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(cursor, "created_at")
+    assert exc_info.value.status_code == 400
+
+
+def test_cursor_with_unknown_direction_is_rejected():
+    raw = json.dumps({"s": "price", "k": 10.0, "id": 1, "d": "sideways"}).encode()
+    cursor = base64.urlsafe_b64encode(raw).decode().rstrip("=")
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(cursor, "price")
+    assert exc_info.value.status_code == 400
+    assert exc_info.value.detail == "Cursor does not match the requested sort order."
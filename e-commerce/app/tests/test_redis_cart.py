@@ -0,0 +1,102 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import fakeredis.aioredis
+import pytest
+from fastapi import HTTPException
+
+from app.services import redis_cart_service
+from app.services.redis_cart_service import RedisCartService, CartLine, DIRTY_KEY
+
+USER_ID = 7
+
+
+@pytest.fixture
+def cart_db(monkeypatch):
+    """
+    cart_items 中已有的购物车行（price 为该行总价）
+    """
+    rows = [SimpleNamespace(product_id=5, quantity=2, price=20.0)]
+
+    @asynccontextmanager
+    async def session():
+        result = MagicMock()
+        result.all.return_value = list(rows)
+        db = MagicMock()
+        db.execute = AsyncMock(return_value=result)
+        yield db
+
+    monkeypatch.setattr(redis_cart_service, "AsyncSessionLocal", session)
+    return rows
+
+
+@pytest.fixture
+def redis(monkeypatch, cart_db):
+    connection = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(redis_cart_service, "redis_connection", connection)
+    return connection
+
+
+@pytest.mark.asyncio
+async def test_cart_is_loaded_from_the_database_once(redis, cart_db):
+    assert await RedisCartService.get_quantities(USER_ID) == {5: (2, 10.0)}
+
+    # 已载入后数据库中的变化不会覆盖Redis中的购物车
+    cart_db[0] = SimpleNamespace(product_id=5, quantity=9, price=90.0)
+    assert await RedisCartService.get_quantities(USER_ID) == {5: (2, 10.0)}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_adds_are_not_lost(redis):
+    await asyncio.gather(*(RedisCartService.apply(USER_ID, {5: ("add", 1, 10.0, 100)}) for _ in range(5)))
+
+    assert await RedisCartService.get_quantities(USER_ID) == {5: (7, 10.0)}
+    assert await redis.sismember(DIRTY_KEY, USER_ID)
+
+
+@pytest.mark.asyncio
+async def test_add_over_the_limit_rejects_the_whole_batch(redis):
+    exceeded = await RedisCartService.apply(USER_ID, {5: ("add", 3, 10.0, 4), 6: ("set", 1, 3.0, 0)})
+
+    assert exceeded == [5]
+    assert await RedisCartService.get_quantities(USER_ID) == {5: (2, 10.0)}
+
+
+@pytest.mark.asyncio
+async def test_set_overwrites_and_zero_removes_the_line(redis):
+    assert await RedisCartService.apply(USER_ID, {5: ("set", 0, 0, 0), 6: ("set", 4, 3.5, 0)}) == []
+
+    assert await RedisCartService.get_quantities(USER_ID) == {6: (4, 3.5)}
+    assert not await redis.hexists(RedisCartService.cart_key(USER_ID), "price:5")
+
+
+@pytest.mark.asyncio
+async def test_take_empties_the_cart_for_concurrent_checkouts(redis):
+    first, second = await asyncio.gather(RedisCartService.take(USER_ID), RedisCartService.take(USER_ID))
+
+    assert sorted([first, second], key=len) == [[], [CartLine(5, 2, 20.0)]]
+    assert await RedisCartService.get_quantities(USER_ID) == {}
+
+
+@pytest.mark.asyncio
+async def test_restore_merges_with_items_added_after_take(redis):
+    taken = await RedisCartService.take(USER_ID)
+    await RedisCartService.apply(USER_ID, {5: ("add", 1, 12.0, 100)})
+
+    await RedisCartService.restore(USER_ID, taken)
+
+    # 数量合并；单价保留期间加购时的快照
+    assert await RedisCartService.get_quantities(USER_ID) == {5: (3, 12.0)}
+
+
+@pytest.mark.asyncio
+async def test_unavailable_redis_is_reported_as_503(redis, monkeypatch):
+    broken = MagicMock()
+    broken.eval = AsyncMock(side_effect=ConnectionError("redis is down"))
+    monkeypatch.setattr(redis_cart_service, "redis_connection", broken)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await RedisCartService.apply(USER_ID, {5: ("add", 1, 10.0, 100)})
+    assert exc_info.value.status_code == 503
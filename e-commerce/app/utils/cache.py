@@ -0,0 +1,543 @@
+"""
+缓存工具类
+1. 基于标签版本号（generation）的缓存失效：
+   缓存键中带上相关标签的当前版本号，写操作只需 INCR 对应标签，
+   旧键不再被命中，由TTL自然回收，因此可以放心使用较长的TTL
+2. 防缓存击穿（cached_call）：
+   同一个键只有一个请求回源（进程内合并 + Redis锁跨worker合并），
+   过期后短时间内继续返回旧值，并按概率提前刷新（XFetch）
+3. 两级缓存：进程内LRU（L1）在前，Redis（L2）在后；
+   标签版本号也缓存在进程内，通过Redis发布/订阅在worker之间同步失效
+4. 缓存值以二进制帧存储（见 cache_codec），命中时可直接返回编码好的JSON响应体
+"""
+import json
+import math
+import time
+import random
+import asyncio
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from app.config.settings import settings
+from app.utils.local_cache import LocalCache
+from app.utils.cache_codec import (CacheEntry, CacheFrameCodec, JsonCodec, FRAME_HEADER, get_codec,
+                                   get_compression)
+from app.database.redis_session import redis_connection, redis_binary_connection
+from app.utils.distributed_lock import DistributedLock
+
+
+GENERATION_PREFIX = "cache:gen:"
+# 标签版本号读取失败（Redis不可用）时生成的缓存键带此前缀：与任何正常版本号的键都不相同，
+# 调用方据此判断键不能反映数据变化（例如不能用来生成ETag）
+UNVERSIONED_PREFIX = "unversioned:"
+INVALIDATION_CHANNEL = "cache:invalidate"
+# 本地版本号的兜底有效期：发布/订阅消息丢失时，最多这么久后重新从Redis读取
+LOCAL_GENERATION_TTL = 5
+CATALOG_TAG = "catalog"  # 全部商品（无分类过滤的列表、搜索）
+CATEGORY_TREE_TAG = "categories"  # 分类树
+RATINGS_TAG = "ratings"  # 商品评分聚合（按评分过滤的商品列表）
+
+
+def category_tag(category_id: int) -> str:
+    return f"category:{category_id}"
+
+
+def review_tag(product_id: int) -> str:
+    return f"reviews:product:{product_id}"
+
+
+def product_tags(*category_ids: Optional[int]) -> List[str]:
+    """
+    商品写操作需要失效的标签：全局目录 + 涉及的分类
+    """
+    tags = [CATALOG_TAG]
+    for category_id in category_ids:
+        if category_id and category_tag(category_id) not in tags:
+            tags.append(category_tag(category_id))
+    return tags
+
+
+class CacheStats:
+    """
+    缓存命中统计（进程内计数，每个worker独立）
+    事件：l1_hit（进程内命中）/ hit（Redis命中）/ miss / stale（返回旧值）/
+         refresh（回源）/ coalesced（合并等待）/ uncached（等不到其他worker的结果，回源但不写缓存）
+    """
+    EVENTS = ("l1_hit", "hit", "miss", "stale", "refresh", "coalesced", "uncached")
+
+    def __init__(self):
+        self.counters = Counter()
+
+    def record(self, namespace: str, event: str):
+        self.counters[f"{namespace}:{event}"] += 1
+
+    def hit(self, namespace: str):
+        self.record(namespace, "hit")
+
+    def miss(self, namespace: str):
+        self.record(namespace, "miss")
+
+    def invalidate(self, tag: str):
+        self.counters["invalidations"] += 1
+        self.counters[f"invalidations:{tag}"] += 1
+
+    def snapshot(self) -> Dict:
+        namespaces = {key.rsplit(":", 1)[0] for key in self.counters
+                      if key.rsplit(":", 1)[-1] in self.EVENTS}
+        result = {}
+        for namespace in sorted(namespaces):
+            l1_hits = self.counters[f"{namespace}:l1_hit"]
+            l2_hits = self.counters[f"{namespace}:hit"]  # 包含返回旧值的读取
+            misses = self.counters[f"{namespace}:miss"]
+            total = l1_hits + l2_hits + misses
+            l2_lookups = l2_hits + misses
+            result[namespace] = {
+                "l1_hits": l1_hits,
+                "l2_hits": l2_hits,
+                "misses": misses,
+                "stale": self.counters[f"{namespace}:stale"],
+                "refreshes": self.counters[f"{namespace}:refresh"],
+                "coalesced": self.counters[f"{namespace}:coalesced"],
+                "uncached": self.counters[f"{namespace}:uncached"],
+                "l1_hit_ratio": round(l1_hits / total, 4) if total else 0.0,
+                "l2_hit_ratio": round(l2_hits / l2_lookups, 4) if l2_lookups else 0.0,
+                "hit_ratio": round((l1_hits + l2_hits) / total, 4) if total else 0.0
+            }
+        return {
+            "namespaces": result,
+            "local_cache": local_cache.stats(),
+            "codec": frame_codec.describe(),
+            "invalidations": self.counters["invalidations"],
+            "invalidations_by_tag": {
+                key.split(":", 1)[1]: value for key, value in self.counters.items()
+                if key.startswith("invalidations:")
+            }
+        }
+
+
+cache_stats = CacheStats()
+local_cache = LocalCache(max_bytes=settings.LOCAL_CACHE_MAX_BYTES, max_ttl=settings.LOCAL_CACHE_MAX_TTL)
+frame_codec = CacheFrameCodec(
+    codec=get_codec(settings.CACHE_CODEC),
+    compression=get_compression(settings.CACHE_COMPRESSION),
+    compress_min_bytes=settings.CACHE_COMPRESS_MIN_BYTES
+)
+# 标签 -> (版本号, 过期时间)
+_local_generations: Dict[str, tuple] = {}
+
+# 失效墓碑键的后缀
+TOMBSTONE_SUFFIX = ":tombstone"
+# 读穿回填：KEYS 为 n 个缓存键和对应的 n 个墓碑键，ARGV 为 ttl 和 n 个值；返回写入的键的序号（从1开始）
+FILL_SCRIPT = """
+local n = #KEYS / 2
+local stored = {}
+for i = 1, n do
+  if redis.call('EXISTS', KEYS[n + i]) == 0 then
+    redis.call('SETEX', KEYS[i], ARGV[1], ARGV[i + 1])
+    table.insert(stored, i)
+  end
+end
+return stored
+"""
+
+
+async def get_generations(tags: Iterable[str]) -> List[Optional[int]]:
+    """
+    读取标签版本号：优先使用进程内副本，缺失时批量从Redis读取
+    Redis不可用时对应的版本号为 None（不写入进程内副本，下次重新读取）
+    """
+    tags = list(tags)
+    now = time.monotonic()
+    generations = {}
+    missing = []
+    for tag in tags:
+        entry = _local_generations.get(tag)
+        if entry is not None and entry[1] > now:
+            generations[tag] = entry[0]
+        else:
+            missing.append(tag)
+
+    if missing:
+        try:
+            values = await redis_connection.mget([f"{GENERATION_PREFIX}{tag}" for tag in missing])
+        except Exception:
+            for tag in missing:
+                generations[tag] = None
+        else:
+            for tag, value in zip(missing, values):
+                generations[tag] = int(value) if value else 0
+                _local_generations[tag] = (generations[tag], now + LOCAL_GENERATION_TTL)
+
+    return [generations[tag] for tag in tags]
+
+
+async def versioned_key(namespace: str, tags: Iterable[str], *parts) -> str:
+    """
+    生成带版本号的缓存键，例如 products:list:v3.7:page:1:size:20
+    版本号读取失败时返回带 UNVERSIONED_PREFIX 的键（见 is_versioned）
+    """
+    generations = await get_generations(tags)
+    version = ".".join("x" if generation is None else str(generation) for generation in generations)
+    key = ":".join([namespace, f"v{version}", *[str(part) for part in parts]])
+    if None in generations:
+        return f"{UNVERSIONED_PREFIX}{key}"
+    return key
+
+
+def is_versioned(key: str) -> bool:
+    """
+    缓存键是否带有真实的标签版本号（数据变化时一定会变化）
+    """
+    return not key.startswith(UNVERSIONED_PREFIX)
+
+
+async def invalidate_tags(*tags: str):
+    """
+    使标签下的所有缓存失效（版本号 +1），并通知其他worker
+    """
+    if not tags:
+        return
+    try:
+        async with redis_connection.pipeline(transaction=False) as pipe:
+            for tag in tags:
+                pipe.incr(f"{GENERATION_PREFIX}{tag}")
+            pipe.publish(INVALIDATION_CHANNEL, json.dumps({"tags": list(tags)}))
+            results = await pipe.execute()
+    except Exception:
+        for tag in tags:
+            _local_generations.pop(tag, None)
+        return
+
+    now = time.monotonic()
+    for tag, generation in zip(tags, results):
+        _local_generations[tag] = (int(generation), now + LOCAL_GENERATION_TTL)
+        cache_stats.invalidate(tag)
+
+
+async def invalidate_keys(*keys: str, tombstone_ttl: int = 0):
+    """
+    删除指定缓存键（Redis + 所有worker的进程内缓存）
+
+    Args:
+        tombstone_ttl: 大于0时同时写入墓碑，此后这段时间内 cache_set_many(guarded=True) 不回填这些键，
+            失效之前开始的读取不会把旧值写回缓存
+    """
+    if not keys:
+        return
+    for key in keys:
+        local_cache.delete(key)
+    try:
+        async with redis_connection.pipeline(transaction=False) as pipe:
+            pipe.delete(*keys)
+            if tombstone_ttl > 0:
+                for key in keys:
+                    pipe.setex(f"{key}{TOMBSTONE_SUFFIX}", tombstone_ttl, 1)
+            pipe.publish(INVALIDATION_CHANNEL, json.dumps({"keys": list(keys)}))
+            await pipe.execute()
+    except Exception:
+        pass
+
+
+def apply_invalidation_message(data: str):
+    try:
+        message = json.loads(data)
+    except (TypeError, ValueError):
+        return
+    # 版本号变化后旧键自然不再命中，只需丢弃本地版本号
+    for tag in message.get("tags", []):
+        _local_generations.pop(tag, None)
+    for key in message.get("keys", []):
+        local_cache.delete(key)
+
+
+async def run_invalidation_listener():
+    """
+    订阅失效消息，保持各worker进程内缓存与Redis一致（在应用生命周期内作为后台任务运行）
+    """
+    while True:
+        pubsub = redis_connection.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # 订阅期间可能错过的消息：清空本地版本号重新读取
+            _local_generations.clear()
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    apply_invalidation_message(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"缓存失效订阅中断，1秒后重连: {e}")
+            _local_generations.clear()
+            await asyncio.sleep(1)
+        finally:
+            try:
+                await pubsub.close()
+            except Exception:
+                pass
+
+
+async def cache_get(namespace: str, key: str) -> Optional[bytes]:
+    try:
+        value = await redis_binary_connection.get(key)
+    except Exception:
+        value = None
+    if value is None:
+        cache_stats.miss(namespace)
+    else:
+        cache_stats.hit(namespace)
+    return value
+
+
+async def cache_set(key: str, value: bytes, ttl: int):
+    try:
+        await redis_binary_connection.setex(key, ttl, value)
+    except Exception:
+        pass
+
+
+async def cache_get_many(namespace: str, keys: List[str]) -> Dict[str, Any]:
+    """
+    批量读取（L1 + 一次 MGET），只返回命中且未逻辑过期的键
+    """
+    now = time.time()
+    found = {}
+    remote_keys = []
+    for key in keys:
+        entry = local_cache.get(key)
+        if entry is not None:
+            cache_stats.record(namespace, "l1_hit")
+            found[key] = entry.value
+        else:
+            remote_keys.append(key)
+    if not remote_keys:
+        return found
+
+    try:
+        frames = await redis_binary_connection.mget(remote_keys)
+    except Exception:
+        frames = [None] * len(remote_keys)
+    for key, frame in zip(remote_keys, frames):
+        entry = frame_codec.decode(frame) if frame is not None else None
+        if entry is None or entry.exp <= now:
+            cache_stats.miss(namespace)
+            continue
+        cache_stats.hit(namespace)
+        _store_local(key, entry)
+        found[key] = entry.value
+    return found
+
+
+async def cache_set_many(items: Dict[str, Any], ttl: int, guarded: bool = False):
+    """
+    批量写入（一次pipeline），同时写入L1
+
+    Args:
+        guarded: 读穿回填时为 True：有墓碑（见 invalidate_keys）的键不写入，只有写入Redis的键才写入L1
+    """
+    if not items:
+        return
+    now = time.time()
+    if guarded:
+        keys = list(items)
+        encoded = [frame_codec.encode(items[key], now + ttl, 0) for key in keys]
+        try:
+            stored = await redis_binary_connection.eval(
+                FILL_SCRIPT, 2 * len(keys), *keys, *[f"{key}{TOMBSTONE_SUFFIX}" for key in keys],
+                ttl, *[frame for frame, _ in encoded])
+        except Exception:
+            return
+        for index in stored:
+            _store_local(keys[int(index) - 1], encoded[int(index) - 1][1])
+        return
+    try:
+        async with redis_binary_connection.pipeline(transaction=False) as pipe:
+            for key, value in items.items():
+                frame, entry = frame_codec.encode(value, now + ttl, 0)
+                pipe.setex(key, ttl, frame)
+                _store_local(key, entry)
+            await pipe.execute()
+    except Exception:
+        pass
+
+
+# 进程内正在回源的键 -> Future，同一进程的并发请求只回源一次
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+def _should_refresh_early(entry: CacheEntry, beta: float) -> bool:
+    """
+    XFetch：越接近过期、回源越慢，越可能提前刷新
+    """
+    return time.time() - entry.d * beta * math.log(1.0 - random.random()) >= entry.exp
+
+
+def _store_local(key: str, entry: CacheEntry):
+    # 进程内只保存未逻辑过期的值，过期后交给Redis层处理旧值/刷新
+    local_cache.set(key, entry, entry.size, entry.exp - time.time())
+
+
+async def _read_entry(namespace: str, key: str) -> Optional[CacheEntry]:
+    frame = await cache_get(namespace, key)
+    if frame is None:
+        return None
+    entry = frame_codec.decode(frame)
+    if entry is not None:
+        _store_local(key, entry)
+    return entry
+
+
+async def _load(loader: Callable[[], Awaitable[Any]], ttl: int, raw: bool):
+    start = time.time()
+    value = await loader()
+    # 需要直接输出响应体的调用方固定使用JSON编码，命中时无需转码
+    return frame_codec.encode(value, time.time() + ttl, round(time.time() - start, 4),
+                              codec=JsonCodec if raw else None)
+
+
+async def _load_and_store(key: str, loader: Callable[[], Awaitable[Any]], ttl: int, stale_ttl: int,
+                          raw: bool) -> CacheEntry:
+    frame, entry = await _load(loader, ttl, raw)
+    # 物理TTL = 逻辑TTL + 旧值可用窗口
+    await cache_set(key, frame, ttl + stale_ttl)
+    _store_local(key, entry)
+    return entry
+
+
+class _LoadAbandoned(Exception):
+    """回源的请求被取消（如客户端断开），合并等待的请求自己重新回源"""
+
+
+async def _single_flight(namespace: str, key: str, loader, ttl: int, stale_ttl: int,
+                         lock_timeout: int, raw: bool, stale: Optional[CacheEntry] = None,
+                         wait_timeout: float = 3.0) -> CacheEntry:
+    """
+    回源：进程内合并并发请求；跨worker通过Redis锁保证只有一个worker回源
+    未抢到锁时：有旧值返回旧值，否则等待其他worker写入缓存；
+    等待超时或Redis不可用时自己回源，但不写共享缓存（没有持有锁）
+    """
+    while (inflight := _inflight.get(key)) is not None:
+        if stale is not None:
+            cache_stats.record(namespace, "stale")
+            return stale
+        cache_stats.record(namespace, "coalesced")
+        try:
+            return await asyncio.shield(inflight)
+        except _LoadAbandoned:
+            continue
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    lock = DistributedLock(f"cache:{key}", timeout=lock_timeout, retry_times=1, retry_delay=0)
+    try:
+        if await lock.acquire():
+            try:
+                cache_stats.record(namespace, "refresh")
+                entry = await _load_and_store(key, loader, ttl, stale_ttl, raw)
+            finally:
+                await lock.release()
+            future.set_result(entry)
+            return entry
+
+        if stale is not None:
+            cache_stats.record(namespace, "stale")
+            future.set_result(stale)
+            return stale
+
+        # 其他worker正在回源，轮询等待结果
+        deadline = time.time() + wait_timeout
+        while time.time() < deadline:
+            await asyncio.sleep(0.05)
+            try:
+                frame = await redis_binary_connection.get(key)
+            except Exception:
+                break
+            entry = frame_codec.decode(frame) if frame is not None else None
+            if entry is not None:
+                cache_stats.record(namespace, "coalesced")
+                future.set_result(entry)
+                return entry
+
+        cache_stats.record(namespace, "uncached")
+        _, entry = await _load(loader, ttl, raw)
+        future.set_result(entry)
+        return entry
+    except asyncio.CancelledError:
+        # 只有本请求被取消：等待者收到 _LoadAbandoned 后自己回源，不会跟着被取消
+        if not future.done():
+            future.set_exception(_LoadAbandoned())
+            future.exception()
+        raise
+    except Exception as e:
+        if not future.done():
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+        raise
+    finally:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+
+
+async def cached_digest(key: str) -> Optional[str]:
+    """
+    缓存中JSON负载的摘要（十六进制），用于生成ETag：进程内命中时直接读取，否则只读取Redis中的帧头，不读取负载
+    缓存不存在、已逻辑过期或不是JSON编码时返回 None（调用方回源后按响应体计算）
+    """
+    entry = local_cache.get(key)
+    if entry is not None:
+        codec, exp, digest = entry.codec, entry.exp, entry.digest
+    else:
+        try:
+            header = await redis_binary_connection.getrange(key, 0, FRAME_HEADER.size - 1)
+        except Exception:
+            return None
+        header = CacheFrameCodec.decode_header(header)
+        if header is None:
+            return None
+        codec, _, exp, _, digest = header
+    if codec is not JsonCodec or time.time() >= exp:
+        return None
+    return digest.hex()
+
+
+async def cached_call(namespace: str, key: str, loader: Callable[[], Awaitable[Any]],
+                      ttl: int, stale_ttl: int = 60, beta: float = 1.0, lock_timeout: int = 10,
+                      raw: bool = False):
+    """
+    带防击穿保护的缓存读取
+
+    Args:
+        namespace: 统计用的命名空间
+        key: 缓存键（通常由 versioned_key 生成）
+        loader: 回源函数，返回可序列化的结果（dict/list/基本类型，datetime等按字符串保存）
+        ttl: 逻辑过期时间（秒）
+        stale_ttl: 逻辑过期后仍可返回旧值的时间（秒）
+        beta: 提前刷新系数，越大越早刷新，0表示不提前刷新
+        lock_timeout: 回源锁超时时间（秒）
+        raw: 为 True 时返回编码好的JSON字节，可直接作为响应体，不再反序列化
+
+    Returns:
+        loader 的结果（命中缓存时为反序列化后的值，进程内命中时为共享对象，调用方不应修改）；
+        raw=True 时为JSON字节
+    """
+    entry = await _get_entry(namespace, key, loader, ttl, stale_ttl, beta, lock_timeout, raw)
+    return entry.json_body() if raw else entry.value
+
+
+async def _get_entry(namespace: str, key: str, loader, ttl: int, stale_ttl: int, beta: float,
+                     lock_timeout: int, raw: bool) -> CacheEntry:
+    entry = local_cache.get(key)
+    if entry is not None and not (beta and _should_refresh_early(entry, beta)):
+        cache_stats.record(namespace, "l1_hit")
+        return entry
+
+    entry = await _read_entry(namespace, key)
+    if entry is None:
+        return await _single_flight(namespace, key, loader, ttl, stale_ttl, lock_timeout, raw)
+
+    expired = time.time() >= entry.exp
+    if not expired and not (beta and _should_refresh_early(entry, beta)):
+        return entry
+
+    # 已过期或被选中提前刷新：抢到锁的请求回源，其余请求继续返回旧值
+    return await _single_flight(namespace, key, loader, ttl, stale_ttl, lock_timeout, raw, stale=entry)
@@ -0,0 +1,264 @@
+"""
+缓存编解码
+缓存值以二进制帧写入Redis：帧头（编码/压缩方式 + 逻辑过期时间 + 回源耗时 + 负载摘要）+ 负载。
+帧头无需解码负载即可读取，命中时可以直接把JSON负载作为响应体返回给客户端；
+负载摘要用于生成ETag，协商缓存时只需读取帧头。
+
+编码：orjson（未安装时回退到标准库 json）/ msgpack（可选）
+压缩：超过阈值时使用 zlib / lz4（可选）
+"""
+import json
+import hashlib
+import struct
+import zlib
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import lz4.frame
+    LZ4_AVAILABLE = True
+except ImportError:
+    LZ4_AVAILABLE = False
+
+
+FRAME_MAGIC = 0xC2
+# magic, 编码/压缩标志, 逻辑过期时间, 回源耗时, 未压缩负载的SHA-1
+FRAME_HEADER = struct.Struct("!BBdf20s")
+
+
+def content_digest(body: bytes) -> bytes:
+    """
+    负载摘要（写入帧头；直接输出响应体时，与响应体的摘要相同）
+    """
+    return hashlib.sha1(body).digest()
+
+
+def _default(value: Any):
+    """
+    JSON/msgpack 无法直接处理的类型（与原先的 json.dumps(default=str) 行为保持一致）
+    日期时间和枚举按 orjson 的原生格式输出（ISO 8601 带 "T"、枚举取值），
+    安装和未安装 orjson 的worker对同一个值得到相同的字节（响应体和ETag一致）
+    """
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+
+class JsonCodec:
+    codec_id = 1
+    name = "json"
+    content_type = "application/json"
+
+    @staticmethod
+    def encode(value: Any) -> bytes:
+        if ORJSON_AVAILABLE:
+            return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+    @staticmethod
+    def decode(data: bytes) -> Any:
+        if ORJSON_AVAILABLE:
+            return orjson.loads(data)
+        return json.loads(data)
+
+
+class MsgpackCodec:
+    codec_id = 2
+    name = "msgpack"
+    content_type = "application/msgpack"
+
+    @staticmethod
+    def encode(value: Any) -> bytes:
+        return msgpack.packb(value, default=_default, datetime=False)
+
+    @staticmethod
+    def decode(data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+class NoCompression:
+    compression_id = 0
+    name = "none"
+
+    @staticmethod
+    def compress(data: bytes) -> bytes:
+        return data
+
+    @staticmethod
+    def decompress(data: bytes) -> bytes:
+        return data
+
+
+class ZlibCompression:
+    compression_id = 1
+    name = "zlib"
+
+    @staticmethod
+    def compress(data: bytes) -> bytes:
+        # 级别1：压缩率与CPU开销的折中，缓存场景更看重速度
+        return zlib.compress(data, 1)
+
+    @staticmethod
+    def decompress(data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class Lz4Compression:
+    compression_id = 2
+    name = "lz4"
+
+    @staticmethod
+    def compress(data: bytes) -> bytes:
+        return lz4.frame.compress(data)
+
+    @staticmethod
+    def decompress(data: bytes) -> bytes:
+        return lz4.frame.decompress(data)
+
+
+CODECS = {codec.codec_id: codec for codec in (JsonCodec, MsgpackCodec)}
+COMPRESSIONS = {compression.compression_id: compression
+                for compression in (NoCompression, ZlibCompression, Lz4Compression)}
+
+
+def get_codec(name: str):
+    """按名称选择编码，依赖未安装时回退到JSON"""
+    if name == "msgpack" and MSGPACK_AVAILABLE:
+        return MsgpackCodec
+    return JsonCodec
+
+
+def get_compression(name: str):
+    """按名称选择压缩算法，依赖未安装时回退到zlib"""
+    if name == "none":
+        return NoCompression
+    if name == "lz4" and LZ4_AVAILABLE:
+        return Lz4Compression
+    return ZlibCompression
+
+
+class CacheEntry:
+    """
+    解码后的缓存帧
+    body 为未压缩的编码负载，digest 为其摘要；value 在第一次访问时才反序列化，并在进程内缓存中复用
+    """
+    __slots__ = ("codec", "body", "exp", "d", "digest", "_value", "_decoded")
+
+    def __init__(self, codec, body: bytes, exp: float, d: float, digest: bytes):
+        self.codec = codec
+        self.body = body
+        self.exp = exp
+        self.d = d
+        self.digest = digest
+        self._value = None
+        self._decoded = False
+
+    @property
+    def value(self) -> Any:
+        if not self._decoded:
+            self._value = self.codec.decode(self.body)
+            self._decoded = True
+        return self._value
+
+    def json_body(self) -> bytes:
+        """
+        JSON格式的负载，可直接作为HTTP响应体
+        """
+        if self.codec is JsonCodec:
+            return self.body
+        return JsonCodec.encode(self.value)
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+
+class CacheFrameCodec:
+    """
+    缓存帧编解码器
+    """
+
+    def __init__(self, codec, compression, compress_min_bytes: int):
+        """
+        Args:
+            codec: 写入时使用的编码（读取时按帧头识别，切换编码不影响已有缓存）
+            compression: 写入时使用的压缩算法
+            compress_min_bytes: 负载超过该字节数时才压缩
+        """
+        self.codec = codec
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+
+    def encode(self, value: Any, exp: float, d: float, codec=None) -> Tuple[bytes, CacheEntry]:
+        """
+        Returns:
+            (写入Redis的帧, 对应的 CacheEntry)
+        """
+        codec = codec or self.codec
+        body = codec.encode(value)
+        compression = NoCompression
+        payload = body
+        if len(body) >= self.compress_min_bytes:
+            compression = self.compression
+            payload = compression.compress(body)
+        flags = (codec.codec_id << 4) | compression.compression_id
+        digest = content_digest(body)
+        frame = FRAME_HEADER.pack(FRAME_MAGIC, flags, exp, d, digest) + payload
+        return frame, CacheEntry(codec, body, exp, d, digest)
+
+    @staticmethod
+    def decode_header(frame: bytes) -> Optional[Tuple]:
+        """
+        只解析帧头（frame 可以只包含前 FRAME_HEADER.size 个字节），无法识别的数据返回 None
+
+        Returns:
+            (编码, 压缩算法, 逻辑过期时间, 回源耗时, 负载摘要)
+        """
+        if not frame or len(frame) < FRAME_HEADER.size or frame[0] != FRAME_MAGIC:
+            return None
+        _, flags, exp, d, digest = FRAME_HEADER.unpack_from(frame)
+        codec = CODECS.get(flags >> 4)
+        compression = COMPRESSIONS.get(flags & 0x0F)
+        if codec is None or compression is None:
+            return None
+        return codec, compression, exp, d, digest
+
+    @staticmethod
+    def decode(frame: bytes) -> Optional[CacheEntry]:
+        """
+        解析帧头并解压负载（不反序列化），无法识别的数据返回 None
+        """
+        header = CacheFrameCodec.decode_header(frame)
+        if header is None:
+            return None
+        codec, compression, exp, d, digest = header
+        try:
+            body = compression.decompress(frame[FRAME_HEADER.size:])
+        except Exception:
+            return None
+        return CacheEntry(codec, body, exp, d, digest)
+
+    def describe(self) -> Dict:
+        return {
+            "codec": self.codec.name,
+            "compression": self.compression.name,
+            "compress_min_bytes": self.compress_min_bytes
+        }
@@ -0,0 +1,53 @@
+"""
+HTTP缓存协商（ETag / If-None-Match）
+ETag 由带版本号的缓存键和响应体摘要生成：摘要保存在缓存帧头中（见 cache_codec），
+判断 304 时只读取帧头，不需要读取缓存内容或查询数据库；
+只用版本号时，Redis不可用（版本号读不到、失效写不进去）或版本号丢失后从0重新计数，
+内容已经变化的响应也会得到相同的ETag
+"""
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response, status
+
+
+# 允许浏览器/CDN缓存，但每次使用前都要重新验证（验证命中时只返回304）
+DEFAULT_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+
+
+def make_etag(*parts: str) -> str:
+    """
+    生成弱ETag（响应体可能被压缩等中间处理改写，使用弱校验）
+    """
+    digest = hashlib.sha1(":".join(str(part) for part in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _normalize(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    If-None-Match 使用弱比较，支持多个ETag和 *
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    expected = _normalize(etag)
+    return any(_normalize(tag) == expected for tag in if_none_match.split(","))
+
+
+def cache_headers(etag: str, cache_control: str = DEFAULT_CACHE_CONTROL) -> dict:
+    return {"ETag": etag, "Cache-Control": cache_control}
+
+
+def not_modified(request: Request, etag: str, cache_control: str = DEFAULT_CACHE_CONTROL) -> Optional[Response]:
+    """
+    请求携带的ETag与当前一致时返回304响应，否则返回 None
+    """
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag, cache_control))
+    return None
@@ -0,0 +1,152 @@
+"""
+幂等请求（Idempotency-Key）
+客户端为同一次下单/支付操作携带相同的 Idempotency-Key 请求头，重试和重复点击时：
+  - 首个请求执行业务逻辑，响应（状态码和响应体）写入Redis并保留 IDEMPOTENCY_TTL
+  - 并发的重复请求不再执行，等待首个请求完成后返回同一响应
+  - 之后的重放直接返回保存的响应，不访问数据库
+  - 同一个键用于不同的请求内容时返回 422
+5xx 或执行异常不保存结果并删除键，客户端可以用同一个键重试
+未携带请求头或Redis不可用时按普通请求处理
+"""
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.config.settings import settings
+from app.database.redis_session import redis_connection
+
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+KEY_PREFIX = "idempotency:"
+MAX_KEY_LENGTH = 255
+# 执行中标记的过期时间（秒），防止进程崩溃后键被永久占用
+IN_FLIGHT_TTL = 120
+# 等待执行中请求时的轮询间隔（秒）
+POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 0.5
+
+
+async def request_fingerprint(request: Request) -> str:
+    """
+    请求内容指纹：方法、路径、查询参数和请求体
+    """
+    body = await request.body()
+    digest = hashlib.sha1()
+    digest.update(f"{request.method} {request.url.path}?{request.url.query}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def _to_response(result: Any) -> Response:
+    if isinstance(result, Response):
+        return result
+    return JSONResponse(content=jsonable_encoder(result))
+
+
+def _replay(entry: dict) -> Response:
+    return Response(
+        content=entry["body"],
+        status_code=entry["status"],
+        media_type=entry.get("media_type") or "application/json",
+        headers={REPLAYED_HEADER: "true"})
+
+
+async def _run_and_store(redis_key: str, fingerprint: str, call: Callable[[], Awaitable[Any]]) -> Response:
+    try:
+        response = _to_response(await call())
+    except BaseException:
+        await _discard(redis_key)
+        raise
+
+    if response.status_code >= 500:
+        await _discard(redis_key)
+        return response
+
+    entry = {
+        "state": "done",
+        "fp": fingerprint,
+        "status": response.status_code,
+        "body": response.body.decode(),
+        "media_type": response.media_type,
+    }
+    try:
+        await redis_connection.set(redis_key, json.dumps(entry), ex=settings.IDEMPOTENCY_TTL)
+    except Exception:
+        pass
+    return response
+
+
+async def _discard(redis_key: str):
+    try:
+        await redis_connection.delete(redis_key)
+    except Exception:
+        pass
+
+
+async def idempotent(
+        request: Request,
+        scope: str,
+        idempotency_key: Optional[str],
+        call: Callable[[], Awaitable[Any]]) -> Response:
+    """
+    按幂等键执行一次请求
+
+    Args:
+        request: 当前请求（用于计算请求指纹）
+        scope: 键的作用域，如 "checkout:{user_id}"，不同用户/接口的键互不影响
+        idempotency_key: 客户端提供的 Idempotency-Key，为空时直接执行
+        call: 执行业务逻辑的协程函数，返回值可以是 Response 或可JSON序列化的对象
+
+    Returns:
+        首次执行或保存的响应
+
+    Raises:
+        HTTPException: 键过长（400）、同一个键对应不同请求（422）、等待执行中的请求超时（409）
+    """
+    if not idempotency_key:
+        return _to_response(await call())
+    if len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters long.")
+
+    redis_key = f"{KEY_PREFIX}{scope}:{idempotency_key}"
+    fingerprint = await request_fingerprint(request)
+    pending = json.dumps({"state": "pending", "fp": fingerprint})
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+    interval = POLL_INTERVAL
+
+    while True:
+        try:
+            acquired = await redis_connection.set(redis_key, pending, nx=True, ex=IN_FLIGHT_TTL)
+            stored = None if acquired else await redis_connection.get(redis_key)
+        except Exception:
+            # Redis不可用时退化为普通请求，由数据库约束兜底
+            return _to_response(await call())
+
+        if acquired:
+            return await _run_and_store(redis_key, fingerprint, call)
+
+        # stored 为空说明首个请求失败后删除了键，下一轮重新争抢执行权
+        if stored:
+            entry = json.loads(stored)
+            if entry["fp"] != fingerprint:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"{IDEMPOTENCY_HEADER} was already used for a different request.")
+            if entry["state"] == "done":
+                return _replay(entry)
+
+        if time.monotonic() >= deadline:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"A request with this {IDEMPOTENCY_HEADER} is still in progress.")
+        await asyncio.sleep(interval)
+        interval = min(interval * 2, MAX_POLL_INTERVAL)
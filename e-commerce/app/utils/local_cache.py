@@ -0,0 +1,74 @@
+"""
+进程内LRU缓存
+按字节数（而不只是条目数）限制容量，条目带过期时间
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class LocalCache:
+    """
+    进程内 LRU + TTL 缓存（非线程安全，仅在事件循环线程中使用）
+    """
+
+    def __init__(self, max_bytes: int, max_ttl: float):
+        """
+        Args:
+            max_bytes: 缓存总字节数上限，超出时淘汰最久未使用的条目
+            max_ttl: 单个条目的最长存活时间（秒）
+        """
+        self.max_bytes = max_bytes
+        self.max_ttl = max_ttl
+        self.current_bytes = 0
+        self.evictions = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, size, expires_at)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, _, expires_at = entry
+        if time.monotonic() >= expires_at:
+            self.delete(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, size: int, ttl: float):
+        """
+        Args:
+            key: 缓存键
+            value: 缓存值
+            size: 该条目占用的字节数（通常为序列化后的长度）
+            ttl: 过期时间（秒），超过 max_ttl 时按 max_ttl 处理
+        """
+        ttl = min(ttl, self.max_ttl)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+
+        self.delete(key)
+        self._data[key] = (value, size, time.monotonic() + ttl)
+        self.current_bytes += size
+
+        while self.current_bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._data.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.evictions += 1
+
+    def delete(self, key: str):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+
+    def clear(self):
+        self._data.clear()
+        self.current_bytes = 0
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._data),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions
+        }
@@ -1,5 +1,10 @@
-from sqlalchemy import and_, func
+import json
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, func, text, tuple_
 from sqlalchemy.future import select
+from sqlalchemy.dialects import postgresql
 from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -8,6 +13,16 @@ from app.models.category import Category
 from app.schemas.product import ProductFilter
 from app.schemas.wishlist import WishlistFilter
 from app.models.product import Product
+from app.models.product_stats import ProductStats
+from app.database.redis_session import redis_connection
+
+
+# 游标分页的排序键：(排序列, 默认方向)，id 作为唯一的次级排序键
+KEYSET_SORTS = {
+    "created_at": (Product.created_at, "desc"),
+    "price": (Product.price, "asc"),
+}
+CACHED_COUNT_TTL = 60  # 缓存总数1分钟
 
 async def apply_filters(db: AsyncSession, filters: ProductFilter):
     # Validate price range
@@ -48,6 +63,11 @@ async def apply_filters(db: AsyncSession, filters: ProductFilter):
 
     # Base query
     query = select(Product)
+    if filters.min_rating is not None:
+        # 评分聚合按主键关联，平均分 >= min_rating 等价于 rating_sum >= min_rating * rating_count
+        query = query.join(ProductStats, ProductStats.product_id == Product.id)
+        conditions.append(ProductStats.rating_count > 0)
+        conditions.append(ProductStats.rating_sum >= filters.min_rating * ProductStats.rating_count)
     if conditions:
         query = query.where(and_(*conditions))
 
@@ -81,6 +101,144 @@ async def apply_pagination(query, filters: ProductFilter, db: AsyncSession):
         "pages": (total + filters.size - 1) // filters.size  # total pages
     }
 
+def encode_cursor(sort_by: str, key_value, row_id: int, direction: str) -> str:
+    """
+    生成不透明的游标：base64(JSON{排序键, 排序值, id, 翻页方向})
+    """
+    if isinstance(key_value, datetime):
+        key_value = key_value.isoformat()
+    payload = {"s": sort_by, "k": key_value, "id": row_id, "d": direction}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort_by: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        key_value = payload["k"]
+        if sort_by == "created_at":
+            key_value = datetime.fromisoformat(key_value)
+        else:
+            key_value = float(key_value)
+        row_id = int(payload["id"])
+        direction = payload["d"]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor."
+        )
+
+    if payload.get("s") != sort_by or direction not in ("next", "prev"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor does not match the requested sort order."
+        )
+
+    return key_value, row_id, direction
+
+async def estimate_count(query, db: AsyncSession) -> int:
+    """
+    使用 PostgreSQL 执行计划中的行数估计代替 COUNT(*)
+    """
+    compiled = query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    result = await db.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}"))
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+async def exact_count(query, db: AsyncSession) -> int:
+    count_query = select(func.count()).select_from(query.subquery())
+    total_result = await db.execute(count_query)
+    return total_result.scalar_one()
+
+async def cached_count(query, db: AsyncSession, cache_key: str) -> int:
+    """
+    精确总数，但结果在Redis中缓存 CACHED_COUNT_TTL 秒
+    """
+    key = f"count:{cache_key}"
+    try:
+        cached = await redis_connection.get(key)
+        if cached is not None:
+            return int(cached)
+    except Exception:
+        pass
+
+    total = await exact_count(query, db)
+
+    try:
+        await redis_connection.setex(key, CACHED_COUNT_TTL, total)
+    except Exception:
+        pass
+
+    return total
+
+async def resolve_total(query, db: AsyncSession, total_mode: str, cache_key: str = None):
+    if total_mode == "none":
+        return None
+    if total_mode == "estimated":
+        return await estimate_count(query, db)
+    if total_mode == "cached" and cache_key:
+        return await cached_count(query, db, cache_key)
+    return await exact_count(query, db)
+
+async def apply_keyset_pagination(query, filters, db: AsyncSession, count_cache_key: str = None):
+    """
+    游标（keyset）分页：WHERE (sort_key, id) < (:k, :id) ORDER BY sort_key, id LIMIT size + 1
+    无论翻到第几页，代价都只与 size 有关
+    """
+    if filters.size < 1 or filters.size > 100:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination parameters. Size must be between 1 and 100."
+        )
+
+    total = await resolve_total(query, db, filters.total_mode, count_cache_key)
+
+    sort_column, order = KEYSET_SORTS[filters.sort_by]
+    direction = "next"
+    if filters.cursor:
+        key_value, row_id, direction = decode_cursor(filters.cursor, filters.sort_by)
+        boundary = tuple_(sort_column, Product.id)
+        # 降序时"下一页"是更小的值；向前翻页则比较方向相反
+        if (order == "desc") == (direction == "next"):
+            query = query.where(boundary < tuple_(key_value, row_id))
+        else:
+            query = query.where(boundary > tuple_(key_value, row_id))
+
+    if (order == "desc") == (direction == "next"):
+        query = query.order_by(sort_column.desc(), Product.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), Product.id.asc())
+
+    # 多取一条用于判断是否还有更多数据
+    result = await db.execute(query.limit(filters.size + 1))
+    items = list(result.scalars().all())
+    has_more = len(items) > filters.size
+    items = items[:filters.size]
+    if direction == "prev":
+        items.reverse()
+
+    def cursor_for(item, cursor_direction):
+        return encode_cursor(filters.sort_by, getattr(item, filters.sort_by), item.id, cursor_direction)
+
+    next_cursor = prev_cursor = None
+    if items:
+        if direction == "next":
+            next_cursor = cursor_for(items[-1], "next") if has_more else None
+            prev_cursor = cursor_for(items[0], "prev") if filters.cursor else None
+        else:
+            next_cursor = cursor_for(items[-1], "next")
+            prev_cursor = cursor_for(items[0], "prev") if has_more else None
+
+    return {
+        "items": items,
+        "total": total,
+        "size": filters.size,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor
+    }
+
 async def apply_wishlist_filters(filters: WishlistFilter, current_user):
   if (filters.min_price and filters.max_price) and (filters.min_price > filters.max_price):
     raise HTTPException(
@@ -0,0 +1,90 @@
+"""
+缓存编解码基准测试：每页商品数量不同情况下的编码/解码耗时和体积
+运行方式：python -m benchmarks.cache_codec_benchmark --sizes 10 20 50 100
+
+对比：
+  legacy       改造前：json.dumps(default=str) 写入，命中时 json.loads 得到dict
+  <codec>      新的帧编码（可选zlib/lz4压缩），命中时完整反序列化
+  <codec> raw  命中时只解析帧头、解压，直接把JSON字节作为响应体
+不需要数据库和Redis。
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from app.utils.cache_codec import (CacheFrameCodec, JsonCodec, MsgpackCodec, NoCompression, ZlibCompression,
+                                   Lz4Compression, MSGPACK_AVAILABLE, LZ4_AVAILABLE, ORJSON_AVAILABLE)
+
+
+RUNS = 2000
+
+
+def make_page(size: int) -> dict:
+    """构造与 ProductService.get_all_products 缓存结构相同的一页数据"""
+    now = datetime.now()
+    items = [
+        {
+            "id": i,
+            "name": f"无线蓝牙耳机 Model {i}",
+            "description": "主动降噪，30小时续航，支持快充和多设备连接。" * 3,
+            "price": 199.0 + i,
+            "stock": 50 + i % 7,
+            "category_id": 1 + i % 12,
+            "image_url": f"https://picsum.photos/seed/{i}/400/400",
+            "created_at": now - timedelta(minutes=i),
+            "updated_at": now,
+        }
+        for i in range(size)
+    ]
+    return {"items": items, "total": 10000, "page": 1, "size": size, "pages": 10000 // size}
+
+
+def timeit(fn) -> float:
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        fn()
+    return (time.perf_counter() - start) / RUNS * 1_000_000
+
+
+def bench_legacy(page: dict):
+    raw = json.dumps({"v": page, "exp": 0, "d": 0}, default=str)
+    encode = timeit(lambda: json.dumps({"v": page, "exp": 0, "d": 0}, default=str))
+    decode = timeit(lambda: json.loads(raw)["v"])
+    return encode, decode, len(raw.encode())
+
+
+def bench_frame(frame_codec: CacheFrameCodec, page: dict):
+    frame, _ = frame_codec.encode(page, 0, 0)
+    encode = timeit(lambda: frame_codec.encode(page, 0, 0))
+    decode = timeit(lambda: frame_codec.decode(frame).value)
+    raw_hit = timeit(lambda: frame_codec.decode(frame).json_body())
+    return encode, decode, raw_hit, len(frame)
+
+
+def run(sizes, compress_min_bytes: int):
+    variants = [("json", JsonCodec, NoCompression), ("json+zlib", JsonCodec, ZlibCompression)]
+    if LZ4_AVAILABLE:
+        variants.append(("json+lz4", JsonCodec, Lz4Compression))
+    if MSGPACK_AVAILABLE:
+        variants.append(("msgpack", MsgpackCodec, NoCompression))
+        variants.append(("msgpack+zlib", MsgpackCodec, ZlibCompression))
+
+    print(f"orjson: {ORJSON_AVAILABLE}, msgpack: {MSGPACK_AVAILABLE}, lz4: {LZ4_AVAILABLE}")
+    print(f"{'page':>6}  {'variant':<14}{'encode us':>11}{'decode us':>11}{'raw hit us':>12}{'bytes':>9}")
+    for size in sizes:
+        page = make_page(size)
+        encode, decode, length = bench_legacy(page)
+        print(f"{size:>6}  {'legacy':<14}{encode:>11.1f}{decode:>11.1f}{'-':>12}{length:>9}")
+        for name, codec, compression in variants:
+            frame_codec = CacheFrameCodec(codec, compression, compress_min_bytes)
+            encode, decode, raw_hit, length = bench_frame(frame_codec, page)
+            print(f"{size:>6}  {name:<14}{encode:>11.1f}{decode:>11.1f}{raw_hit:>12.1f}{length:>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cache codec benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 20, 50, 100])
+    parser.add_argument("--compress-min-bytes", type=int, default=4096)
+    args = parser.parse_args()
+    run(args.sizes, args.compress_min_bytes)
@@ -0,0 +1,127 @@
+"""
+下单并发基准测试：N 个买家同时抢购同一个热门商品
+运行方式：python -m benchmarks.checkout_benchmark --buyers 1000 --stock 300 --concurrency 50
+
+对比：
+  naive    先 SELECT 库存再 UPDATE 成计算后的值（无锁读-改-写），用于演示超卖
+  atomic   OrderItemService.checkout：事务内一条条件 UPDATE ... FROM (VALUES ...) 预留库存
+输出每秒成功订单数、成功/失败数以及超卖数量（atomic 必须为0）。
+
+下单会真正提交事务，因此测试数据在结束后显式删除。
+需要 DATABASE_URL 指向已执行迁移的 PostgreSQL 数据库。
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from app.database.session import engine, transaction
+from app.services.order_item_service import OrderItemService
+
+
+async def setup(buyers: int, stock: int, run_id: str):
+    async with transaction() as db:
+        vendor_id = (await db.execute(text(
+            "INSERT INTO users (email, password, role, created_at, updated_at) "
+            "VALUES (:email, 'x', 'vendor', now(), now()) RETURNING id"
+        ), {"email": f"checkout-benchmark-vendor-{run_id}@example.com"})).scalar_one()
+        product_id = (await db.execute(text(
+            "INSERT INTO products (name, description, price, stock, vendor_id, is_active, view_count, created_at, updated_at) "
+            "VALUES ('秒杀商品', 'checkout benchmark', 99, :stock, :vendor_id, true, 0, now(), now()) RETURNING id"
+        ), {"stock": stock, "vendor_id": vendor_id})).scalar_one()
+        buyer_ids = (await db.execute(text(
+            "INSERT INTO users (email, password, role, created_at, updated_at) "
+            "SELECT 'checkout-benchmark-' || :run_id || '-' || g || '@example.com', 'x', 'customer', now(), now() "
+            "FROM generate_series(1, :buyers) AS g RETURNING id"
+        ), {"run_id": run_id, "buyers": buyers})).scalars().all()
+    return vendor_id, product_id, list(buyer_ids)
+
+
+async def fill_carts(product_id: int, buyer_ids, stock: int):
+    async with transaction() as db:
+        await db.execute(text("UPDATE products SET stock = :stock, is_active = true WHERE id = :id"),
+                         {"stock": stock, "id": product_id})
+        await db.execute(text(
+            "INSERT INTO cart_items (user_id, product_id, quantity, price) "
+            "SELECT unnest(CAST(:buyer_ids AS integer[])), :product_id, 1, 99"
+        ), {"buyer_ids": buyer_ids, "product_id": product_id})
+
+
+async def naive_checkout(user_id: int, product_id: int) -> bool:
+    """改造前的读-改-写（去掉了Redis锁），并发时会基于过期的库存写入"""
+    async with transaction() as db:
+        stock = (await db.execute(text("SELECT stock FROM products WHERE id = :id"), {"id": product_id})).scalar_one()
+        if stock < 1:
+            return False
+        await db.execute(text("UPDATE products SET stock = :stock WHERE id = :id"), {"stock": stock - 1, "id": product_id})
+        await db.execute(text("DELETE FROM cart_items WHERE user_id = :user_id"), {"user_id": user_id})
+        return True
+
+
+async def atomic_checkout(user_id: int, product_id: int) -> bool:
+    try:
+        async with transaction() as tx:
+            await OrderItemService.checkout(tx, user_id)
+        return True
+    except HTTPException:
+        return False
+
+
+async def run_variant(name: str, checkout, product_id: int, buyer_ids, stock: int, concurrency: int):
+    await fill_carts(product_id, buyer_ids, stock)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def buyer(user_id: int) -> bool:
+        async with semaphore:
+            return await checkout(user_id, product_id)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[buyer(user_id) for user_id in buyer_ids])
+    elapsed = time.perf_counter() - start
+
+    async with transaction() as db:
+        final_stock = (await db.execute(text("SELECT stock FROM products WHERE id = :id"),
+                                        {"id": product_id})).scalar_one()
+        await db.execute(text("DELETE FROM cart_items WHERE product_id = :id"), {"id": product_id})
+
+    sold = sum(results)
+    # 超卖：成功的订单数超过了初始库存实际减少的数量
+    oversell = sold - (stock - final_stock)
+    print(f"{name:<8}{sold:>8}{len(results) - sold:>10}{final_stock:>8}{oversell:>10}{sold / elapsed:>14.1f}")
+    return oversell
+
+
+async def cleanup(vendor_id: int, product_id: int, buyer_ids):
+    async with transaction() as db:
+        await db.execute(text("DELETE FROM order_items WHERE product_id = :id"), {"id": product_id})
+        await db.execute(text("DELETE FROM orders WHERE user_id = ANY(CAST(:ids AS integer[]))"), {"ids": buyer_ids})
+        await db.execute(text("DELETE FROM cart_items WHERE product_id = :id"), {"id": product_id})
+        await db.execute(text("DELETE FROM products WHERE id = :id"), {"id": product_id})
+        await db.execute(text("DELETE FROM users WHERE id = ANY(CAST(:ids AS integer[]))"),
+                         {"ids": buyer_ids + [vendor_id]})
+
+
+async def run(buyers: int, stock: int, concurrency: int):
+    run_id = uuid.uuid4().hex[:8]
+    vendor_id, product_id, buyer_ids = await setup(buyers, stock, run_id)
+    try:
+        print(f"{buyers} buyers, stock {stock}, concurrency {concurrency}")
+        print(f"{'variant':<8}{'sold':>8}{'rejected':>10}{'stock':>8}{'oversell':>10}{'orders/sec':>14}")
+        await run_variant("naive", naive_checkout, product_id, buyer_ids, stock, concurrency)
+        oversell = await run_variant("atomic", atomic_checkout, product_id, buyer_ids, stock, concurrency)
+        assert oversell == 0, "atomic checkout oversold"
+    finally:
+        await cleanup(vendor_id, product_id, buyer_ids)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hot SKU checkout benchmark")
+    parser.add_argument("--buyers", type=int, default=1000)
+    parser.add_argument("--stock", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.buyers, args.stock, args.concurrency))
@@ -0,0 +1,85 @@
+"""
+查询向量缓存基准测试：每1000次对话的查询编码CPU时间
+运行方式：python -m benchmarks.embedding_cache_benchmark --chats 1000 --distinct 200
+
+对比：
+  uncached  每次对话都调用 EmbeddingService.encode_single
+  cached    EmbeddingCache.embed（进程内LRU；加 --redis 时同时使用Redis二级缓存）
+查询按 Zipf 分布从 --distinct 个不同查询中抽取（少数热门查询占大多数请求），
+并随机改变大小写和空白，验证规范化后仍能命中。
+输出 CPU 时间（process_time，包含模型推理的所有线程）、每1000次对话节省的CPU秒数和命中率。
+
+需要安装 sentence-transformers；只加载模型，不访问数据库。
+"""
+import argparse
+import random
+import time
+
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_service import EmbeddingService, DEFAULT_MODEL_NAME
+
+
+BASE_QUERIES = [
+    "性价比最高的手机", "cheap headphones", "蓝牙耳机", "wireless keyboard", "轻薄笔记本",
+    "降噪耳机推荐", "gaming mouse", "智能手表", "4k monitor", "机械键盘",
+]
+
+
+def make_queries(chats: int, distinct: int, seed: int):
+    rng = random.Random(seed)
+    pool = [f"{BASE_QUERIES[i % len(BASE_QUERIES)]} {i // len(BASE_QUERIES) or ''}".strip()
+            for i in range(distinct)]
+    weights = [1 / (rank + 1) for rank in range(distinct)]
+    queries = []
+    for query in rng.choices(pool, weights=weights, k=chats):
+        # 用户输入的大小写和空白各不相同
+        if rng.random() < 0.3:
+            query = query.upper()
+        if rng.random() < 0.3:
+            query = f"  {query.replace(' ', '  ')} "
+        queries.append(query)
+    return queries
+
+
+def measure(name: str, queries, embed) -> float:
+    start_cpu, start_wall = time.process_time(), time.perf_counter()
+    for query in queries:
+        embed(query)
+    cpu, wall = time.process_time() - start_cpu, time.perf_counter() - start_wall
+    per_1k = cpu / len(queries) * 1000
+    print(f"{name:<10}{cpu:>12.3f}{wall:>12.3f}{per_1k:>16.3f}")
+    return per_1k
+
+
+def run(chats: int, distinct: int, use_redis: bool, dtype: str, seed: int):
+    service = EmbeddingService()
+    service.encode_single("warm up")
+    queries = make_queries(chats, distinct, seed)
+    cache = EmbeddingCache(f"benchmark:{DEFAULT_MODEL_NAME}", max_bytes=64 * 1024 * 1024, ttl=600,
+                           dtype=dtype, use_redis=use_redis)
+
+    print(f"{chats} chats, {distinct} distinct queries, dtype {dtype}, redis {'on' if use_redis else 'off'}")
+    print(f"{'variant':<10}{'cpu (s)':>12}{'wall (s)':>12}{'cpu s / 1k':>16}")
+    uncached = measure("uncached", queries, service.encode_single)
+    cached = measure("cached", queries, lambda query: cache.embed(query, service.encode_single))
+
+    stats = cache.stats()
+    print(f"hit ratio {stats['hit_ratio']:.2%} (l1 {stats['l1_hits']}, l2 {stats['l2_hits']}, miss {stats['misses']})")
+    print(f"CPU saved per 1k chats: {uncached - cached:.3f}s ({(1 - cached / uncached):.1%})")
+
+    if use_redis:
+        client = cache._redis()
+        keys = list(client.scan_iter(match="emb:benchmark:*"))
+        if keys:
+            client.delete(*keys)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query embedding cache benchmark")
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--distinct", type=int, default=200)
+    parser.add_argument("--dtype", choices=["float16", "float32"], default="float16")
+    parser.add_argument("--redis", action="store_true", help="也使用Redis二级缓存")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    run(args.chats, args.distinct, args.redis, args.dtype, args.seed)
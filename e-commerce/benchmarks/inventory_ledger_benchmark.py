@@ -0,0 +1,117 @@
+"""
+秒杀库存预留基准测试：同一个热门商品上的并发预留
+运行方式：python -m benchmarks.inventory_ledger_benchmark --requests 5000 --stock 1000 --concurrency 100
+
+对比：
+  database  InventoryService.reserve_stock：事务内条件 UPDATE，所有请求排队等待同一行的行锁
+  ledger    InventoryLedgerService.reserve：Redis Lua 脚本原子扣减，不访问数据库
+输出每秒预留次数、成功/失败数，并校验成功数不超过库存。
+
+只测量库存预留本身（不含购物车和订单写入），测试数据在结束后删除。
+需要 DATABASE_URL 指向已执行迁移的 PostgreSQL 数据库，以及可用的 Redis。
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from app.database.session import AsyncSessionLocal, engine, transaction
+from app.database.redis_session import redis_connection
+from app.services.inventory_service import InventoryService
+from app.services.inventory_ledger_service import InventoryLedgerService, RESERVATION_PREFIX
+
+# 预留记录按订单ID登记，使用足够大的ID避免与真实订单冲突
+ORDER_ID_BASE = 10 ** 12
+
+
+async def setup(stock: int, run_id: str):
+    async with transaction() as db:
+        vendor_id = (await db.execute(text(
+            "INSERT INTO users (email, password, role, created_at, updated_at) "
+            "VALUES (:email, 'x', 'vendor', now(), now()) RETURNING id"
+        ), {"email": f"ledger-benchmark-vendor-{run_id}@example.com"})).scalar_one()
+        product_id = (await db.execute(text(
+            "INSERT INTO products (name, description, price, stock, vendor_id, is_active, view_count, created_at, updated_at) "
+            "VALUES ('秒杀商品', 'ledger benchmark', 99, :stock, :vendor_id, true, 0, now(), now()) RETURNING id"
+        ), {"stock": stock, "vendor_id": vendor_id})).scalar_one()
+    return vendor_id, product_id
+
+
+async def database_reserve(product_id: int, order_id: int) -> bool:
+    try:
+        async with transaction() as tx:
+            await InventoryService.reserve_stock(tx, {product_id: 1})
+        return True
+    except HTTPException:
+        return False
+
+
+async def ledger_reserve(product_id: int, order_id: int) -> bool:
+    try:
+        await InventoryLedgerService.reserve(order_id, {product_id: 1})
+        return True
+    except HTTPException:
+        return False
+
+
+async def run_variant(name: str, reserve, product_id: int, requests: int, stock: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def buyer(order_id: int) -> bool:
+        async with semaphore:
+            return await reserve(product_id, order_id)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[buyer(ORDER_ID_BASE + i) for i in range(requests)])
+    elapsed = time.perf_counter() - start
+
+    sold = sum(results)
+    print(f"{name:<10}{sold:>8}{len(results) - sold:>10}{requests / elapsed:>16.1f}")
+    assert sold <= stock, f"{name} oversold"
+
+
+async def cleanup(vendor_id: int, product_id: int, requests: int):
+    async with redis_connection.pipeline(transaction=False) as pipe:
+        for i in range(requests):
+            pipe.zrem("inventory:reservations", ORDER_ID_BASE + i)
+            pipe.delete(f"{RESERVATION_PREFIX}{ORDER_ID_BASE + i}")
+        await pipe.execute()
+    async with AsyncSessionLocal() as db:
+        try:
+            await InventoryLedgerService.disable(db, product_id)
+        except HTTPException:
+            pass
+        await db.execute(text("DELETE FROM products WHERE id = :id"), {"id": product_id})
+        await db.execute(text("DELETE FROM users WHERE id = :id"), {"id": vendor_id})
+        await db.commit()
+
+
+async def run(requests: int, stock: int, concurrency: int):
+    run_id = uuid.uuid4().hex[:8]
+    vendor_id, product_id = await setup(stock, run_id)
+    try:
+        print(f"{requests} reservations, stock {stock}, concurrency {concurrency}")
+        print(f"{'variant':<10}{'sold':>8}{'rejected':>10}{'requests/sec':>16}")
+        await run_variant("database", database_reserve, product_id, requests, stock, concurrency)
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(text("UPDATE products SET stock = :stock, is_active = true WHERE id = :id"),
+                             {"stock": stock, "id": product_id})
+            await db.commit()
+            await InventoryLedgerService.enable(db, product_id)
+        await run_variant("ledger", ledger_reserve, product_id, requests, stock, concurrency)
+    finally:
+        await cleanup(vendor_id, product_id, requests)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flash-sale inventory reservation benchmark")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--stock", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.stock, args.concurrency))
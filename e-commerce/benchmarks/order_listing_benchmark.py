@@ -0,0 +1,139 @@
+"""
+订单列表基准测试：旧路径（selectinload 全部订单 + 每个订单查询商家商品） vs 新路径（游标分页 + order_items.vendor_id 过滤）
+运行方式：python -m benchmarks.order_listing_benchmark --sizes 10000 100000 1000000
+
+在一个事务内用 generate_series 生成测试订单（每单3个订单项），测试结束后回滚，不会留下数据。
+旧路径会把所有订单加载到内存，订单数超过 --legacy-max 时跳过。
+需要 DATABASE_URL 指向已执行迁移的 PostgreSQL 数据库。
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from types import SimpleNamespace
+
+from sqlalchemy import text
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.config.settings import settings
+from app.models import Order, OrderItem
+from app.models.product import Product
+from app.schemas.user import Role
+from app.schemas.order import OrderFilter
+from app.services.order_service import OrderService
+from app.utils.pagination import encode_cursor
+
+
+PAGE_SIZE = 20
+RUNS = 5
+
+
+async def legacy_list(db: AsyncSession, user, filters):
+    """改造前的实现：加载全部订单及订单项；商家在循环中为每个订单查询自己的商品ID"""
+    query = select(Order).options(selectinload(Order.order_items))
+    if user.role == Role.vendor:
+        query = (query.join(OrderItem, OrderItem.order_id == Order.id)
+                 .join(Product, OrderItem.product_id == Product.id)
+                 .where(Product.vendor_id == user.id).distinct())
+    orders = (await db.execute(query)).scalars().all()
+    result = []
+    for order in orders:
+        items = order.order_items
+        if user.role == Role.vendor:
+            vendor_product_ids = {row[0] for row in (await db.execute(
+                select(Product.id).where(Product.vendor_id == user.id))).all()}
+            items = [item for item in items if item.product_id in vendor_product_ids]
+        result.append((order.id, order.total_amount, [(item.id, item.product_id) for item in items]))
+    return result
+
+
+async def keyset_list(db: AsyncSession, user, filters):
+    return await OrderService._list_orders_page(db, user, filters, [])
+
+
+async def seed_orders(db: AsyncSession, count: int):
+    user_ids = (await db.execute(text(
+        "INSERT INTO users (email, password, role, created_at, updated_at) VALUES "
+        "('order-benchmark-customer@example.com', 'x', 'customer', now(), now()), "
+        "('order-benchmark-vendor@example.com', 'x', 'vendor', now(), now()), "
+        "('order-benchmark-other@example.com', 'x', 'vendor', now(), now()) RETURNING id"
+    ))).scalars().all()
+    customer_id, vendor_id, other_vendor_id = user_ids
+
+    # 10% 的商品属于被测商家
+    product_ids = (await db.execute(text("""
+        INSERT INTO products (name, description, price, stock, vendor_id, is_active, view_count, created_at, updated_at)
+        SELECT 'order benchmark ' || g, 'order benchmark', 10 + g, 100,
+               CASE WHEN g % 10 = 0 THEN :vendor_id ELSE :other_vendor_id END, true, 0, now(), now()
+        FROM generate_series(1, 100) AS g RETURNING id
+    """), {"vendor_id": vendor_id, "other_vendor_id": other_vendor_id})).scalars().all()
+
+    await db.execute(text("""
+        INSERT INTO orders (user_id, total_amount, order_status, created_at, updated_at)
+        SELECT :customer_id, 30 + g % 500, 'paid', now() - (g || ' seconds')::interval, now()
+        FROM generate_series(1, :count) AS g
+    """), {"customer_id": customer_id, "count": count})
+    await db.execute(text("""
+        INSERT INTO order_items (order_id, product_id, vendor_id, quantity, price)
+        SELECT line.order_id, p.id, p.vendor_id, 1, 10
+        FROM (
+            SELECT o.id AS order_id, (CAST(:product_ids AS integer[]))[1 + (o.id * 7 + i * 13) % 100] AS product_id
+            FROM orders o CROSS JOIN generate_series(1, 3) AS i
+            WHERE o.user_id = :customer_id
+        ) AS line
+        JOIN products p ON p.id = line.product_id
+    """), {"product_ids": product_ids, "customer_id": customer_id})
+    await db.execute(text("ANALYZE orders"))
+    await db.execute(text("ANALYZE order_items"))
+
+    middle_id = (await db.execute(text(
+        "SELECT id FROM orders WHERE user_id = :customer_id ORDER BY id OFFSET :offset LIMIT 1"
+    ), {"customer_id": customer_id, "offset": count // 2})).scalar_one()
+    return SimpleNamespace(id=1, role=Role.admin), SimpleNamespace(id=vendor_id, role=Role.vendor), middle_id
+
+
+async def measure(fn, db: AsyncSession, user, filters) -> float:
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        await fn(db, user, filters)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+async def run(sizes, legacy_max: int):
+    engine = create_async_engine(settings.DATABASE_URL, echo=False)
+    try:
+        for count in sizes:
+            async with engine.connect() as conn:
+                transaction = await conn.begin()
+                db = AsyncSession(bind=conn)
+                try:
+                    print(f"\n== {count} orders ==")
+                    start = time.perf_counter()
+                    admin, vendor, middle_id = await seed_orders(db, count)
+                    print(f"seeded in {time.perf_counter() - start:.1f}s")
+                    print(f"{'user':<8}{'page':<8}{'legacy ms':>12}{'keyset ms':>12}")
+                    first = OrderFilter(size=PAGE_SIZE)
+                    deep = OrderFilter(size=PAGE_SIZE, cursor=encode_cursor("id", middle_id, middle_id, "next"))
+                    for user in (admin, vendor):
+                        legacy = await measure(legacy_list, db, user, first) if count <= legacy_max else None
+                        for name, filters in (("first", first), ("middle", deep)):
+                            keyset = await measure(keyset_list, db, user, filters)
+                            legacy_text = f"{legacy:>12.1f}" if legacy is not None else f"{'skipped':>12}"
+                            print(f"{user.role.value:<8}{name:<8}{legacy_text}{keyset:>12.1f}")
+                finally:
+                    await db.close()
+                    await transaction.rollback()
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Order listing benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--legacy-max", type=int, default=10_000)
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.legacy_max))
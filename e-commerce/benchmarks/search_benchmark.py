@@ -0,0 +1,103 @@
+"""
+商品搜索基准测试：旧路径（ILIKE + 全量加载 + 内存分页） vs 新路径（全文检索 + SQL分页）
+运行方式：python -m benchmarks.search_benchmark --sizes 10000 100000 1000000
+
+在一个事务内用 generate_series 生成测试商品，测试结束后回滚，不会留下数据。
+需要 DATABASE_URL 指向已执行迁移的 PostgreSQL 数据库。
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import and_, or_, text
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.config.settings import settings
+from app.models.product import Product
+from app.services.search_engine import PostgresSearchEngine
+
+
+QUERIES = ["耳机", "wireless", "bluetooth keyboard", "不存在的商品"]
+PAGE_SIZE = 20
+RUNS = 5
+
+
+async def legacy_search(db: AsyncSession, search_query: str, page: int, size: int):
+    """改造前的实现：ILIKE 扫描，取回全部匹配行后在Python中切片"""
+    search_term = f"%{search_query}%"
+    query = select(Product).where(
+        and_(
+            Product.is_active == True,
+            or_(Product.name.ilike(search_term), Product.description.ilike(search_term))
+        )
+    ).order_by(Product.created_at.desc())
+    all_products = (await db.execute(query)).scalars().all()
+    start = (page - 1) * size
+    return all_products[start:start + size], len(all_products)
+
+
+async def seed_products(db: AsyncSession, count: int):
+    vendor_id = (await db.execute(text(
+        "INSERT INTO users (email, password, role, created_at, updated_at) "
+        "VALUES ('search-benchmark@example.com', 'x', 'vendor', now(), now()) RETURNING id"
+    ))).scalar_one()
+
+    await db.execute(text("""
+        INSERT INTO products (name, description, price, stock, vendor_id, is_active, view_count, created_at, updated_at)
+        SELECT
+            (ARRAY['手机', '耳机', '笔记本电脑', '机械键盘', '鼠标', '显示器', '相机', '音箱'])[1 + g % 8] || ' ' || g,
+            (ARRAY['wireless bluetooth headphones', 'mechanical keyboard with rgb', 'ultra thin laptop',
+                   'noise cancelling earbuds', '4k monitor', 'mirrorless camera'])[1 + g % 6] || ' model ' || g,
+            10 + (g % 1000),
+            1 + (g % 50),
+            :vendor_id,
+            true,
+            0,
+            now() - (g || ' seconds')::interval,
+            now()
+        FROM generate_series(1, :count) AS g
+    """), {"vendor_id": vendor_id, "count": count})
+    await db.execute(text("ANALYZE products"))
+
+
+async def measure(fn, db: AsyncSession, search_query: str, page: int) -> float:
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        await fn(db, search_query, page, PAGE_SIZE)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+async def run(sizes):
+    engine = create_async_engine(settings.DATABASE_URL, echo=False)
+    try:
+        for count in sizes:
+            async with engine.connect() as conn:
+                transaction = await conn.begin()
+                db = AsyncSession(bind=conn)
+                try:
+                    print(f"\n== {count} products ==")
+                    start = time.perf_counter()
+                    await seed_products(db, count)
+                    print(f"seeded in {time.perf_counter() - start:.1f}s")
+                    print(f"{'query':<24}{'page':>6}{'legacy ms':>12}{'fts ms':>10}{'speedup':>10}")
+                    for search_query in QUERIES:
+                        for page in (1, 50):
+                            legacy = await measure(legacy_search, db, search_query, page)
+                            new = await measure(PostgresSearchEngine.search, db, search_query, page)
+                            print(f"{search_query:<24}{page:>6}{legacy:>12.1f}{new:>10.1f}{legacy / max(new, 0.001):>9.1f}x")
+                finally:
+                    await db.close()
+                    await transaction.rollback()
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Product search benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes))
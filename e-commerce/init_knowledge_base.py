@@ -5,53 +5,40 @@
 import asyncio
 from app.database.session import get_db
 from app.services.knowledge_base_service import KnowledgeBaseService
-from app.services.vector_store_service import VectorStoreService
+from app.services.rag_resources import get_vector_store
 
 
-async def init_knowledge_base(rebuild: bool = False):
+async def init_knowledge_base(rebuild: bool = False, full_scan: bool = False):
     """
     初始化知识库
     
     Args:
         rebuild: 是否重建（删除旧数据）
+        full_scan: 是否逐个核对向量库中的文档，删除数据库中已不存在的文档（一致性检查）
     """
     print("=" * 50)
     print("开始构建知识库...")
     print("=" * 50)
     
-    # 初始化向量数据库
-    vector_store = VectorStoreService()
+    # 使用进程内共享的向量数据库（在应用中由管理接口触发时，与对话请求共用同一个模型）
+    # 管理接口在事件循环上以任务运行本函数，加载模型和访问向量库都放到线程中执行
+    vector_store = await asyncio.to_thread(get_vector_store)
     
     if rebuild:
-        print("正在删除旧的知识库...")
-        vector_store.delete_collection()
-        # 重新初始化
-        vector_store = VectorStoreService()
+        # 清空集合在同步锁内进行（见 KnowledgeBaseService.sync），不会与正在运行的同步交错
+        print("将删除旧的知识库并全量同步...")
     
     # 获取数据库连接
     async for db in get_db():
         try:
-            # 提取所有数据
-            print("\n1. 正在提取商品数据...")
-            products = await KnowledgeBaseService.extract_all_products(db)
-            print(f"   提取到 {len(products)} 个商品")
-            
-            print("\n2. 正在提取评论数据...")
-            reviews = await KnowledgeBaseService.extract_all_reviews(db)
-            print(f"   提取到 {len(reviews)} 条评论")
-            
-            # 构建知识文档
-            print("\n3. 正在构建知识文档...")
-            documents = await KnowledgeBaseService.build_knowledge_documents(db)
-            print(f"   共 {len(documents)} 个知识文档")
-            
-            # 添加到向量数据库
-            print("\n4. 正在生成向量并存储到向量数据库...")
-            vector_store.add_documents(documents, batch_size=50)
+            # 增量同步：只为新增或变化的文档生成向量，删除已下架/已删除的文档
+            print("\n1. 正在同步商品和评论...")
+            result = await KnowledgeBaseService.sync(db, vector_store, rebuild=rebuild, full_scan=full_scan)
+            print(f"   候选文档 {result['candidates']} 个，写入 {result['upserted']} 个，删除 {result['deleted']} 个")
             
             # 显示统计信息
-            print("\n5. 知识库构建完成！")
-            info = vector_store.get_collection_info()
+            print("\n2. 知识库构建完成！")
+            info = await asyncio.to_thread(vector_store.get_collection_info)
             print(f"   集合名称: {info['name']}")
             print(f"   文档数量: {info['count']}")
             print(f"   状态: {info['status']}")
@@ -71,5 +58,6 @@ async def init_knowledge_base(rebuild: bool = False):
 if __name__ == "__main__":
     import sys
     rebuild = "--rebuild" in sys.argv
-    asyncio.run(init_knowledge_base(rebuild=rebuild))
+    full_scan = "--full-scan" in sys.argv
+    asyncio.run(init_knowledge_base(rebuild=rebuild, full_scan=full_scan))
 